@@ -3,7 +3,7 @@ import os
 from argparse import Namespace
 from collections import namedtuple
 from pathlib import Path
-from typing import Any, NamedTuple, Tuple, Union
+from typing import Any, Dict, List, NamedTuple, Tuple, Union
 
 from PyQt5.QtCore import QFile, QFileInfo
 from qgis.core import (
@@ -314,10 +314,13 @@ class MapBuildController(MapBuildControllerUtils):
         self.exporter.setParams(dlg, data, debugMode)
         return self.exporter
 
-    def run(self):
+    def run(self) -> List[Dict]:
         # TODO: run in a different thread
         # TODO: better layers / composition cleanup
-        """Runs the specified MapBuilder according to dlg / json preferences"""
+        """Runs the specified MapBuilder according to dlg / json preferences
+        Returns:
+            A list with the export status of each product (see getProductStatus)
+        """
         dlgCfg = self.setupDlgCfg(self.dlg)
         MapBuilderUtils().cleanProject(self.debugMode)
         productType, productName, productVersion, versionFolder = self.getProductType(
@@ -337,7 +340,7 @@ class MapBuildController(MapBuildControllerUtils):
                     "Erro",
                     f"Não foi inserido um arquivo ou pasta de JSON para produto solicitado.",
                 )
-            return
+            return []
         if dlgCfg.exportFolder == "":
             if is_headless:
                 print("Não foi inserida uma pasta de saída para o produto solicitado.")
@@ -347,9 +350,10 @@ class MapBuildController(MapBuildControllerUtils):
                     "Erro",
                     f"Não foi inserida uma pasta de saída para o produto solicitado.",
                 )
-            return
+            return []
         if "Carta Ortoimagem OM" in dlgCfg.productType:
             self.qptDlg()
+        productStatus = []
         for jsonPath in dlgCfg.jsonFilePaths:
             self.setColorPalette()
             jsonData = self.readJson(jsonPath)
@@ -366,6 +370,13 @@ class MapBuildController(MapBuildControllerUtils):
                         "Adicione a chave e tente novamente.",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(
+                        jsonPath,
+                        False,
+                        "A chave tipo_produto não foi encontrada no json de entrada.",
+                    )
+                )
                 continue
             if not self.debugMode and not jsonStructure.validate_dict(
                 jsonData, product_type=jsonData["tipo_produto"]
@@ -400,6 +411,13 @@ class MapBuildController(MapBuildControllerUtils):
                         "Corrija o json e tente novamente.",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(
+                        jsonPath,
+                        False,
+                        f"Há erros de validação no json de entrada. Faltam as seguintes chaves obrigatórias: {missingKeyText}.",
+                    )
+                )
                 continue
             filePathError = jsonStructure.validate_file_paths(jsonData)
             if filePathError != "":
@@ -412,6 +430,9 @@ class MapBuildController(MapBuildControllerUtils):
                         f"Erro: {filePathError}" "",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(jsonPath, False, f"Erro: {filePathError}")
+                )
                 continue
             if (
                 productName != "Carta Especial"
@@ -429,6 +450,13 @@ class MapBuildController(MapBuildControllerUtils):
                         "Escolha corretamente o produto ou altere o json de entrada e tente novamente.",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(
+                        jsonPath,
+                        False,
+                        "O tipo de produto escolhido não corresponde à chave tipo_produto do json.",
+                    )
+                )
                 continue
             if (
                 "versao_produto" in jsonData
@@ -446,6 +474,13 @@ class MapBuildController(MapBuildControllerUtils):
                         "Escolha corretamente o produto ou altere o json de entrada e tente novamente.",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(
+                        jsonPath,
+                        False,
+                        "O tipo de produto escolhido não corresponde à chave versao_produto do json.",
+                    )
+                )
                 continue
             jsonData.update(
                 {
@@ -471,6 +506,11 @@ class MapBuildController(MapBuildControllerUtils):
                         "Verifique as configurações de conexão no json e as informações de usuário e senha e tente novamente.",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(
+                        jsonPath, False, "Conexão inválida com o banco de dados."
+                    )
+                )
                 continue
             if not self.validateProductTypeAgainstDatabaseMetadata(
                 abstractDb, jsonData
@@ -487,6 +527,13 @@ class MapBuildController(MapBuildControllerUtils):
                         "Escolha corretamente o produto ou altere o json de entrada e tente novamente.",
                     )
                 exportResult = False
+                productStatus.append(
+                    self.getProductStatus(
+                        jsonPath,
+                        False,
+                        "O tipo de produto em exportação não corresponde à modelagem do banco de dados.",
+                    )
+                )
                 continue
             del abstractDb
             builder = self.getProductBuilder(productType, versionFolder)
@@ -513,16 +560,19 @@ class MapBuildController(MapBuildControllerUtils):
             exporter = self.getExporter(dlgCfg, jsonData, self.debugMode)
             exportResult, exportMessage = exporter.export(composition)
             builder.removeLayers(self.debugMode)
+            productStatus.append(
+                self.getProductStatus(jsonPath, exportResult, exportMessage)
+            )
 
         messageType = "Informação"
         if not builder:
             if dlgCfg.instance == "headless":
                 print("Não há cartas a serem exportadas")
-                return
+                return productStatus
             QMessageBox.warning(
                 self.dlg, messageType, "Não há cartas a serem exportadas"
             )
-            return
+            return productStatus
         builder.cleanProject(self.debugMode)
         messageType = "Informação" if exportResult == True else "Erro"
         msg = (
@@ -532,8 +582,26 @@ class MapBuildController(MapBuildControllerUtils):
         )
         if dlgCfg.instance == "headless":
             print(msg)
-            return
+            return productStatus
         QMessageBox.warning(self.dlg, messageType, msg)
+        return productStatus
+
+    def getProductStatus(
+        self, jsonPath: Union[str, Path], exportResult: bool, message: str
+    ) -> Dict:
+        """Builds the export status record of a product
+        Args:
+            jsonPath: path of the product json
+            exportResult: whether the product was exported
+            message: error message (empty on success)
+        Returns:
+            A dict with the keys json, success and message
+        """
+        return {
+            "json": str(jsonPath),
+            "success": bool(exportResult),
+            "message": message,
+        }
 
     def validateProductTypeAgainstDatabaseMetadata(self, abstractDb, jsonData):
         if jsonData["tipo_produto"] == "Carta Ortoimagem OM":
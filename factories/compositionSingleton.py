@@ -11,7 +11,7 @@ from qgis.core import (
 )
 from qgis.PyQt.QtCore import QPointF
 from qgis.PyQt.QtXml import QDomDocument
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from ..config.configDefaults import ConfigDefaults
 
 
@@ -44,14 +44,45 @@ class CompositionSingleton:
     def getComposition(self, jsonData: Dict) -> QgsPrintLayout:
         """Returns the desired composition based on product type and scale.
         Also creates the composition if it does not exist and holds it in self.compositions for future reusability.
+        The returned composition is shared, so it must be cloned before being modified.
         Args:
             jsonData (dict): product info
         Returns:
             The QgsPrintLayout associated to the request
         """
         productType = jsonData.get("productType")
-        composition = self.createComposition(productType, jsonData)
-        return composition
+        compositionKey = self.getCompositionKey(jsonData)
+        if compositionKey not in self.compositions:
+            self.compositions[compositionKey] = self.createComposition(
+                productType, jsonData
+            )
+        return self.compositions[compositionKey]
+
+    def getCompositionKey(self, jsonData: Dict) -> Tuple:
+        """Returns the key of the assembled composition in self.compositions. It holds
+        everything that changes the template: product type, version, scale, license and
+        the qpt overrides of the json.
+        Args:
+            jsonData (dict): product info
+        Returns:
+            A hashable tuple
+        """
+        productType = jsonData.get("productType")
+        scale = (
+            jsonData.get("scale")
+            if productType != "omMap"
+            else jsonData.get("omTemplateType")
+        )
+        return (
+            productType,
+            jsonData.get("versionFolder"),
+            scale,
+            jsonData.get("licenca_produto"),
+            jsonData.get("cabecalho"),
+            jsonData.get("projeto"),
+            jsonData.get("direitos_reproducao"),
+            jsonData.get("acesso_informacao"),
+        )
 
     def createComposition(self, productType: str, jsonData: Dict) -> QgsPrintLayout:
         productType = jsonData.get("productType")
@@ -1,21 +1,28 @@
+import hashlib
+import json
+import os
 from builtins import abs, range, round, str
 from math import floor
+from pathlib import Path
+from uuid import uuid4
 
 from qgis.core import (
     Qgis,
+    QgsApplication,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransform,
+    QgsExpression,
+    QgsFeature,
     QgsFillSymbol,
     QgsGeometry,
-    QgsGeometryGeneratorSymbolLayer,
     QgsInvertedPolygonRenderer,
     QgsLineSymbol,
     QgsMapLayer,
     QgsPalLayerSettings,
     QgsPoint,
+    QgsPointXY,
     QgsProject,
     QgsPropertyCollection,
-    QgsRenderContext,
     QgsRuleBasedLabeling,
     QgsRuleBasedRenderer,
     QgsSimpleFillSymbolLayer,
@@ -31,6 +38,16 @@ from qgis.PyQt.QtGui import QColor, QFont
 
 
 class GridAndLabelCreator(QObject):
+    # grades já calculadas ficam em disco entre as execuções e os processos
+    gridCacheFolder = (
+        Path(QgsApplication.qgisSettingsDirPath())
+        / "ferramentas_edicao"
+        / "cache"
+        / "grid"
+    )
+    gridCacheMaxEntries = 5000
+    gridCacheVersion = 1
+
     def __init__(self, parent=None):
         super(GridAndLabelCreator, self).__init__()
 
@@ -57,19 +74,15 @@ class GridAndLabelCreator(QObject):
         p2 = QgsPoint(x_geo + px * u + dx, y_geo + py * t + dy)
         p1.transform(trLLUTM)
         p2.transform(trLLUTM)
-        properties = {"color": color.name()}
-        line_temp = QgsLineSymbol.createSimple(properties)
-        line_temp.setWidth(linwidth_geo)
-        symb = QgsGeometryGeneratorSymbolLayer.create(properties)
-        symb.setSymbolType(Qgis.SymbolType.Line)
-        symb.setSubSymbol(line_temp)
-
-        symb.setGeometryExpression(
-            "transform(make_line(make_point({}, {}), make_point({}, {})), 'EPSG:{}', @map_crs)".format(
-                p1.x(), p1.y(), p2.x(), p2.y(), utmSRID
-            )
-        )
-        return symb
+        return self.createGridLine(p1.x(), p1.y(), p2.x(), p2.y(), linwidth_geo, color)
+
+    def createGridLine(self, x1, y1, x2, y2, width, color):
+        """Returns a grid line, in the UTM CRS, with its symbology"""
+        return {
+            "coordinates": [x1, y1, x2, y2],
+            "width": width,
+            "color": color.name(),
+        }
 
     def gridLinesymbolMaker(
         self,
@@ -106,8 +119,7 @@ class GridAndLabelCreator(QObject):
         grid_spacing,
         trUTMLL,
         trLLUTM,
-        grid_symb,
-        properties,
+        grid_lines,
         UTM_num_x,
         UTM_num_y,
         t,
@@ -118,12 +130,7 @@ class GridAndLabelCreator(QObject):
         color,
     ):
         test_line = [None] * 2
-        properties = {"color": color.name()}
-        line_temp = QgsLineSymbol.createSimple(properties)
-        line_temp.setWidth(linwidth_utm)
-        symb = QgsGeometryGeneratorSymbolLayer.create(properties)
-        symb.setSymbolType(Qgis.SymbolType.Line)
-        symb.setSubSymbol(line_temp)
+        grid_line = None
 
         # Test First And Last Grid Lines
         # Vertical
@@ -172,57 +179,52 @@ class GridAndLabelCreator(QObject):
                 mid_point = test_line[0].intersection(test_grid).vertexAt(0)
                 mid_point.transform(trLLUTM)
                 if auxPointlist[0].x() > auxPointlist[1].x():
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})), 'EPSG:{}', @map_crs)".format(
-                            auxPointlist[2].x(),
-                            auxPointlist[2].y(),
-                            mid_point.x(),
-                            mid_point.y(),
-                            layer_bound,
-                        )
+                    grid_line = self.createGridLine(
+                        auxPointlist[2].x(),
+                        auxPointlist[2].y(),
+                        mid_point.x(),
+                        mid_point.y(),
+                        linwidth_utm,
+                        color,
                     )
                 else:
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})), 'EPSG:{}', @map_crs)".format(
-                            mid_point.x(),
-                            mid_point.y(),
-                            auxPointlist[3].x(),
-                            auxPointlist[3].y(),
-                            layer_bound,
-                        )
+                    grid_line = self.createGridLine(
+                        mid_point.x(),
+                        mid_point.y(),
+                        auxPointlist[3].x(),
+                        auxPointlist[3].y(),
+                        linwidth_utm,
+                        color,
                     )
             elif test_line[1].intersects(test_grid):
                 mid_point = test_line[1].intersection(test_grid).vertexAt(0)
                 mid_point.transform(trLLUTM)
                 if auxPointlist[0].x() < auxPointlist[1].x():
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                            auxPointlist[2].x(),
-                            auxPointlist[2].y(),
-                            mid_point.x(),
-                            mid_point.y(),
-                            layer_bound,
-                        )
-                    )
-                else:
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                            mid_point.x(),
-                            mid_point.y(),
-                            auxPointlist[3].x(),
-                            auxPointlist[3].y(),
-                            layer_bound,
-                        )
-                    )
-            else:
-                symb.setGeometryExpression(
-                    "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
+                    grid_line = self.createGridLine(
                         auxPointlist[2].x(),
                         auxPointlist[2].y(),
+                        mid_point.x(),
+                        mid_point.y(),
+                        linwidth_utm,
+                        color,
+                    )
+                else:
+                    grid_line = self.createGridLine(
+                        mid_point.x(),
+                        mid_point.y(),
                         auxPointlist[3].x(),
                         auxPointlist[3].y(),
-                        layer_bound,
+                        linwidth_utm,
+                        color,
                     )
+            else:
+                grid_line = self.createGridLine(
+                    auxPointlist[2].x(),
+                    auxPointlist[2].y(),
+                    auxPointlist[3].x(),
+                    auxPointlist[3].y(),
+                    linwidth_utm,
+                    color,
                 )
 
         # Horizontal
@@ -271,57 +273,52 @@ class GridAndLabelCreator(QObject):
                 mid_point = test_line[0].intersection(test_grid).vertexAt(0)
                 mid_point.transform(trLLUTM)
                 if auxPointlist[0].y() > auxPointlist[1].y():
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                            auxPointlist[2].x(),
-                            auxPointlist[2].y(),
-                            mid_point.x(),
-                            mid_point.y(),
-                            layer_bound,
-                        )
+                    grid_line = self.createGridLine(
+                        auxPointlist[2].x(),
+                        auxPointlist[2].y(),
+                        mid_point.x(),
+                        mid_point.y(),
+                        linwidth_utm,
+                        color,
                     )
                 else:
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                            mid_point.x(),
-                            mid_point.y(),
-                            auxPointlist[3].x(),
-                            auxPointlist[3].y(),
-                            layer_bound,
-                        )
+                    grid_line = self.createGridLine(
+                        mid_point.x(),
+                        mid_point.y(),
+                        auxPointlist[3].x(),
+                        auxPointlist[3].y(),
+                        linwidth_utm,
+                        color,
                     )
             elif test_line[1].intersects(test_grid):
                 mid_point = test_line[1].intersection(test_grid).vertexAt(0)
                 mid_point.transform(trLLUTM)
                 if auxPointlist[0].y() < auxPointlist[1].y():
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                            auxPointlist[2].x(),
-                            auxPointlist[2].y(),
-                            mid_point.x(),
-                            mid_point.y(),
-                            layer_bound,
-                        )
-                    )
-                else:
-                    symb.setGeometryExpression(
-                        "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                            mid_point.x(),
-                            mid_point.y(),
-                            auxPointlist[3].x(),
-                            auxPointlist[3].y(),
-                            layer_bound,
-                        )
-                    )
-            else:
-                symb.setGeometryExpression(
-                    "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
+                    grid_line = self.createGridLine(
                         auxPointlist[2].x(),
                         auxPointlist[2].y(),
+                        mid_point.x(),
+                        mid_point.y(),
+                        linwidth_utm,
+                        color,
+                    )
+                else:
+                    grid_line = self.createGridLine(
+                        mid_point.x(),
+                        mid_point.y(),
                         auxPointlist[3].x(),
                         auxPointlist[3].y(),
-                        layer_bound,
+                        linwidth_utm,
+                        color,
                     )
+            else:
+                grid_line = self.createGridLine(
+                    auxPointlist[2].x(),
+                    auxPointlist[2].y(),
+                    auxPointlist[3].x(),
+                    auxPointlist[3].y(),
+                    linwidth_utm,
+                    color,
                 )
 
         # Inner Grid Lines
@@ -340,14 +337,13 @@ class GridAndLabelCreator(QObject):
                 trLLUTM,
                 True,
             )
-            symb.setGeometryExpression(
-                "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                    auxPointlist[2].x(),
-                    auxPointlist[2].y(),
-                    auxPointlist[3].x(),
-                    auxPointlist[3].y(),
-                    layer_bound,
-                )
+            grid_line = self.createGridLine(
+                auxPointlist[2].x(),
+                auxPointlist[2].y(),
+                auxPointlist[3].x(),
+                auxPointlist[3].y(),
+                linwidth_utm,
+                color,
             )
 
         # Horizontal
@@ -365,18 +361,18 @@ class GridAndLabelCreator(QObject):
                 trLLUTM,
                 False,
             )
-            symb.setGeometryExpression(
-                "transform(make_line(make_point({}, {}), make_point({}, {})),'EPSG:{}', @map_crs)".format(
-                    auxPointlist[2].x(),
-                    auxPointlist[2].y(),
-                    auxPointlist[3].x(),
-                    auxPointlist[3].y(),
-                    layer_bound,
-                )
+            grid_line = self.createGridLine(
+                auxPointlist[2].x(),
+                auxPointlist[2].y(),
+                auxPointlist[3].x(),
+                auxPointlist[3].y(),
+                linwidth_utm,
+                color,
             )
 
-        grid_symb.appendSymbolLayer(symb)
-        return grid_symb
+        if grid_line is not None:
+            grid_lines.append(grid_line)
+        return grid_lines
 
     def grid_labeler(
         self,
@@ -403,45 +399,19 @@ class GridAndLabelCreator(QObject):
         pgrid = QgsPoint(pgrid.x() + dx, pgrid.y() + dy)
         if layer_bound.crs().isGeographic() == True:
             pgrid.transform(trUTMLL)
-        # Label Format Settings
-        settings = QgsPalLayerSettings()
-        settings.placement = (
-            1 if Qgis.QGIS_VERSION_INT <= 32600 else Qgis.LabelPlacement.OverPoint
-        )
-        settings.isExpression = True
-        textprop = QgsTextFormat()
-        textprop.setColor(llcolor)
-        textprop.setSizeUnit(
-            4 if Qgis.QGIS_VERSION_INT <= 32600 else Qgis.RenderUnit.Points
-        )
-        textprop.setSize(fSize * 2.8346)
-        textprop.setFont(QFont(fontType))
-        textprop.setLineHeight(1)
-        settings.setFormat(textprop)
-        settings.fieldName = expression_str
-
-        # Label Position
-        settings.geometryGeneratorEnabled = True
-        settings.geometryGenerator = "make_point({}, {})".format(pgrid.x(), pgrid.y())
-        datadefined = QgsPropertyCollection()
-        datadefined.property(20).setExpressionString("True")
-        datadefined.property(20).setActive(True)
-        datadefined.property(15).setExpressionString("True")
-        datadefined.property(15).setActive(True)
-        datadefined.property(77).setExpressionString("2")
-        datadefined.property(77).setActive(True)
-
-        # Creating and Activating Labeling Rule
-        settings.setDataDefinedProperties(datadefined)
-        rule = QgsRuleBasedLabeling.Rule(settings)
-        rule.setDescription(desc)
-        rule.setActive(True)
-
-        return rule
+        return {
+            "x": pgrid.x(),
+            "y": pgrid.y(),
+            "description": desc,
+            "size": fSize * 2.8346,
+            "font": QFont(fontType),
+            "color": QColor(llcolor),
+            "expression": expression_str,
+        }
 
     def utm_grid_labeler(
         self,
-        root_rule,
+        grid_labels,
         x_UTM,
         y_UTM,
         x_geo,
@@ -575,8 +545,8 @@ class GridAndLabelCreator(QObject):
                     trUTMLL,
                     discourage_placement=discourage_placement,
                 )
-                root_rule.appendChild(rule_fake)
-                return root_rule
+                grid_labels.append(rule_fake)
+                return grid_labels
 
         # Labeling grid's horizontal lines
         else:
@@ -654,8 +624,8 @@ class GridAndLabelCreator(QObject):
                     trUTMLL,
                     discourage_placement=discourage_placement,
                 )
-                root_rule.appendChild(rule_fake)
-                return root_rule
+                grid_labels.append(rule_fake)
+                return grid_labels
 
         ctrl_uni = {
             0: "\u2070",
@@ -717,7 +687,7 @@ class GridAndLabelCreator(QObject):
                 trUTMLL,
                 discourage_placement=discourage_placement,
             )
-            root_rule.appendChild(ruleUTM2)
+            grid_labels.append(ruleUTM2)
             ruleUTM3 = self.grid_labeler(
                 plac_hem.x(),
                 plac_hem.y(),
@@ -737,7 +707,7 @@ class GridAndLabelCreator(QObject):
                 trUTMLL,
                 discourage_placement=discourage_placement,
             )
-            root_rule.appendChild(ruleUTM3)
+            grid_labels.append(ruleUTM3)
 
         dxS = 0
         if any(spec_lbl in desc for spec_lbl in ("Bot", "Left", "Up")):
@@ -771,8 +741,8 @@ class GridAndLabelCreator(QObject):
             trUTMLL,
             discourage_placement=discourage_placement,
         )
-        root_rule.appendChild(ruleUTM)
-        return root_rule
+        grid_labels.append(ruleUTM)
+        return grid_labels
 
     def conv_dec_gms(
         self,
@@ -814,7 +784,7 @@ class GridAndLabelCreator(QObject):
     def geoGridcreator(
         self,
         utmSRID,
-        grid_symb,
+        grid_lines,
         extentsGeo,
         px,
         py,
@@ -827,7 +797,7 @@ class GridAndLabelCreator(QObject):
     ):
         for u in range(1, (geo_number_x + 2)):
             for t in range(0, (geo_number_y + 2)):
-                symb_cross = self.crossLinegenerator(
+                grid_line = self.crossLinegenerator(
                     utmSRID,
                     extentsGeo[0],
                     extentsGeo[1],
@@ -841,10 +811,10 @@ class GridAndLabelCreator(QObject):
                     linwidth_geo,
                     color,
                 )
-                grid_symb.appendSymbolLayer(symb_cross)
+                grid_lines.append(grid_line)
         for u in range(0, (geo_number_x + 2)):
             for t in range(1, (geo_number_y + 2)):
-                symb_cross = self.crossLinegenerator(
+                grid_line = self.crossLinegenerator(
                     utmSRID,
                     extentsGeo[0],
                     extentsGeo[1],
@@ -858,10 +828,10 @@ class GridAndLabelCreator(QObject):
                     linwidth_geo,
                     color,
                 )
-                grid_symb.appendSymbolLayer(symb_cross)
+                grid_lines.append(grid_line)
         for u in range(0, (geo_number_x + 1)):
             for t in range(0, (geo_number_y + 2)):
-                symb_cross = self.crossLinegenerator(
+                grid_line = self.crossLinegenerator(
                     utmSRID,
                     extentsGeo[0],
                     extentsGeo[1],
@@ -875,10 +845,10 @@ class GridAndLabelCreator(QObject):
                     linwidth_geo,
                     color,
                 )
-                grid_symb.appendSymbolLayer(symb_cross)
+                grid_lines.append(grid_line)
         for u in range(0, (geo_number_x + 2)):
             for t in range(0, (geo_number_y + 1)):
-                symb_cross = self.crossLinegenerator(
+                grid_line = self.crossLinegenerator(
                     utmSRID,
                     extentsGeo[0],
                     extentsGeo[1],
@@ -892,9 +862,9 @@ class GridAndLabelCreator(QObject):
                     linwidth_geo,
                     color,
                 )
-                grid_symb.appendSymbolLayer(symb_cross)
+                grid_lines.append(grid_line)
 
-        return grid_symb
+        return grid_lines
 
     def geoGridlabelPlacer(
         self,
@@ -913,7 +883,7 @@ class GridAndLabelCreator(QObject):
         layer_bound,
         trUTMLL,
     ):
-        root_rule = QgsRuleBasedLabeling.Rule(QgsPalLayerSettings())
+        grid_labels = []
 
         # Upper
         for u in range(0, geo_number_x + 2):
@@ -948,7 +918,7 @@ class GridAndLabelCreator(QObject):
                     layer_bound,
                     trUTMLL,
                 )
-                root_rule.appendChild(ruletemp)
+                grid_labels.append(ruletemp)
             else:
                 ruletemp = self.grid_labeler(
                     extentsGeo[0],
@@ -977,7 +947,7 @@ class GridAndLabelCreator(QObject):
                     layer_bound,
                     trUTMLL,
                 )
-                root_rule.appendChild(ruletemp)
+                grid_labels.append(ruletemp)
         # Bottom
         for b in range(0, geo_number_x + 2):
             ruletemp = self.grid_labeler(
@@ -1007,7 +977,7 @@ class GridAndLabelCreator(QObject):
                 layer_bound,
                 trUTMLL,
             )
-            root_rule.appendChild(ruletemp)
+            grid_labels.append(ruletemp)
         # Right
         for r in range(0, geo_number_y + 2):
             ruletemp = self.grid_labeler(
@@ -1037,7 +1007,7 @@ class GridAndLabelCreator(QObject):
                 layer_bound,
                 trUTMLL,
             )
-            root_rule.appendChild(ruletemp)
+            grid_labels.append(ruletemp)
         # Left
         for l in range(0, geo_number_y + 2):
             ruletemp = self.grid_labeler(
@@ -1067,13 +1037,13 @@ class GridAndLabelCreator(QObject):
                 layer_bound,
                 trUTMLL,
             )
-            root_rule.appendChild(ruletemp)
+            grid_labels.append(ruletemp)
 
-        return root_rule
+        return grid_labels
 
     def utmGridlabelPlacer(
         self,
-        root_rule,
+        grid_labels,
         grid_spacing,
         extentsGeo,
         extentsUTM,
@@ -1095,9 +1065,8 @@ class GridAndLabelCreator(QObject):
     ):
         if grid_spacing > 0:
             # Bottom
-            ruletest = QgsRuleBasedLabeling.Rule(QgsPalLayerSettings())
             ruletest = self.utm_grid_labeler(
-                ruletest,
+                [],
                 extentsUTM[0],
                 extentsUTM[1],
                 0,
@@ -1123,15 +1092,14 @@ class GridAndLabelCreator(QObject):
                 geo_bb_or,
                 layer_bound,
             )
-            rulechild = ruletest.children()[0]
-            if rulechild.settings().fieldName == "fail":
+            if ruletest[0]["expression"] == "fail":
                 rangeUD = range(2, UTM_num_x + 1)
             else:
                 rangeUD = range(1, UTM_num_x + 1)
 
             for u in rangeUD:
-                root_rule = self.utm_grid_labeler(
-                    root_rule,
+                grid_labels = self.utm_grid_labeler(
+                    grid_labels,
                     extentsUTM[0],
                     extentsUTM[1],
                     0,
@@ -1161,8 +1129,8 @@ class GridAndLabelCreator(QObject):
             # Upper
             rangeUD = range(1, UTM_num_x + 1)
             for u in rangeUD:
-                root_rule = self.utm_grid_labeler(
-                    root_rule,
+                grid_labels = self.utm_grid_labeler(
+                    grid_labels,
                     extentsUTM[0],
                     extentsUTM[3],
                     0,
@@ -1190,9 +1158,8 @@ class GridAndLabelCreator(QObject):
                 )
 
             # Left
-            ruletest = QgsRuleBasedLabeling.Rule(QgsPalLayerSettings())
             ruletest = self.utm_grid_labeler(
-                ruletest,
+                [],
                 extentsUTM[0],
                 extentsUTM[1],
                 extentsGeo[0],
@@ -1218,8 +1185,7 @@ class GridAndLabelCreator(QObject):
                 geo_bb_or,
                 layer_bound,
             )
-            rulechild = ruletest.children()[0]
-            if rulechild.settings().fieldName == "fail":
+            if ruletest[0]["expression"] == "fail":
                 rangeLat = range(2, UTM_num_y + 1)
             else:
                 rangeLat = range(1, UTM_num_y + 1)
@@ -1230,8 +1196,8 @@ class GridAndLabelCreator(QObject):
                 else:
                     extra_dist = 0
                 discorage_placement = u in (minRange, maxRange)
-                root_rule = self.utm_grid_labeler(
-                    root_rule,
+                grid_labels = self.utm_grid_labeler(
+                    grid_labels,
                     extentsUTM[0],
                     extentsUTM[1],
                     extentsGeo[0],
@@ -1262,8 +1228,8 @@ class GridAndLabelCreator(QObject):
             # Right
             rangeLat = range(1, UTM_num_y + 1)
             for u in rangeLat:
-                root_rule = self.utm_grid_labeler(
-                    root_rule,
+                grid_labels = self.utm_grid_labeler(
+                    grid_labels,
                     extentsUTM[2],
                     extentsUTM[1],
                     extentsGeo[2],
@@ -1290,24 +1256,18 @@ class GridAndLabelCreator(QObject):
                     layer_bound,
                 )
 
-        return root_rule
+        return grid_labels
 
-    def apply_masks(self, layer_bound):
+    def apply_masks(self, grid_lines_layer):
         layers = QgsProject.instance().mapLayers().values()
         mask_dict = {}
 
         # Creating symbol layer reference list
         grid_symbol_ref_list = []
-        renderer = layer_bound.renderer()
-        grid_symbol_rule_id = renderer.rootRule().children()[0].ruleKey()
-        layer_id = layer_bound.id()
-        symbol_list = renderer.symbols(QgsRenderContext())
-        symbol_layer_list = symbol_list[0].symbolLayers()
-        for smb in range(1, len(symbol_layer_list)):
-            idx_list = []
-            idx_list.append(smb)
-            idx_list.append(0)
-            symbol_id = QgsSymbolLayerId(grid_symbol_rule_id, idx_list)
+        renderer = grid_lines_layer.renderer()
+        layer_id = grid_lines_layer.id()
+        for rule in renderer.rootRule().children():
+            symbol_id = QgsSymbolLayerId(rule.ruleKey(), 0)
             temp = QgsSymbolLayerReference(layer_id, symbol_id)
             grid_symbol_ref_list.append(temp)
 
@@ -1381,6 +1341,132 @@ class GridAndLabelCreator(QObject):
         utm_grid_buffer_color,
         masks_check,
     ):
+        """Loading Grid From Cache Or Computing It"""
+        grid_params = {
+            "spacing": spacing,
+            "crossX": crossX,
+            "crossY": crossY,
+            "scale": scale,
+            "fontSize": fontSize,
+            "font": font,
+            "fontLL": fontLL,
+            "llcolor": llcolor,
+            "linwidth_geo": linwidth_geo,
+            "linwidth_utm": linwidth_utm,
+            "linwidth_buffer_geo": linwidth_buffer_geo,
+            "linwidth_buffer_utm": linwidth_buffer_utm,
+            "geo_grid_color": geo_grid_color,
+            "utm_grid_color": utm_grid_color,
+            "geo_grid_buffer_color": geo_grid_buffer_color,
+            "utm_grid_buffer_color": utm_grid_buffer_color,
+        }
+        cache_key = self.getGridCacheKey(
+            feature_geometry, layer_bound.crs().authid(), utmSRID, grid_params
+        )
+        cached_grid = self.loadGridFromCache(cache_key)
+        if cached_grid is not None:
+            grid_lines, grid_labels = cached_grid
+        else:
+            grid_lines, grid_labels = self.computeGrid(
+                QgsGeometry(feature_geometry), layer_bound, utmSRID, **grid_params
+            )
+            self.saveGridToCache(cache_key, grid_lines, grid_labels)
+
+        """ Rendering UTM and Geographic Grid """
+        grid_lines_layer = self.createGridLinesLayer(
+            layer_bound.name() + "_grid_lines", utmSRID, grid_lines
+        )
+
+        # The grid is drawn by grid_lines_layer, so the bound feature is not drawn
+        properties = {"style": "no", "outline_style": "no"}
+        symb_new = QgsRuleBasedRenderer.Rule(QgsFillSymbol.createSimple(properties))
+        symb_new.setFilterExpression('"' + str(id_attr) + '" = ' + str(id_value))
+        symb_new.setLabel("layer")
+
+        # Appending rules to symbol root rule
+        root_symbol_rule = QgsRuleBasedRenderer.Rule(None)
+        root_symbol_rule.setFilterExpression("")
+        root_symbol_rule.appendChild(symb_new)
+
+        # Applying New Renderer
+        render_base = QgsRuleBasedRenderer(root_symbol_rule)
+        layer_bound.setRenderer(render_base)
+
+        """Rendering outside area"""
+        # Duplicating original layer
+        layers_names = [i.name() for i in QgsProject.instance().mapLayers().values()]
+        if (layer_bound.name() + "_outside") not in layers_names:
+            outside_bound_layer = QgsVectorLayer(
+                layer_bound.source(),
+                layer_bound.name() + "_outside",
+                layer_bound.providerType(),
+            )
+            if layer_bound.providerType() == "memory":
+                feats = [feat for feat in layer_bound.getFeatures()]
+                outside_bound_layer_data = outside_bound_layer.dataProvider()
+                outside_bound_layer_data.addFeatures(feats)
+            QgsProject.instance().addMapLayer(outside_bound_layer)
+        else:
+            outside_bound_layer = QgsProject.instance().mapLayersByName(
+                layer_bound.name() + "_outside"
+            )[0]
+
+        # Creating Rule Based Renderer (Rule For The Other Features)
+        properties = {"color": "white"}
+        ext_grid_symb = QgsFillSymbol.createSimple(properties)
+        symb_out = QgsSimpleFillSymbolLayer()
+        symb_out.setFillColor(QColor("white"))
+        symb_out.setStrokeWidth(linwidth_utm)
+        ext_grid_symb.changeSymbolLayer(0, symb_out)
+        rule_out = QgsRuleBasedRenderer.Rule(ext_grid_symb)
+        rule_out.setFilterExpression('"' + str(id_attr) + '" = ' + str(id_value))
+        rule_out.setLabel("outside")
+
+        root_symbol_rule_out = QgsRuleBasedRenderer.Rule(None)
+        root_symbol_rule_out.appendChild(rule_out)
+
+        render_base_out = QgsRuleBasedRenderer(root_symbol_rule_out)
+        new_renderer = QgsInvertedPolygonRenderer.convertFromRenderer(render_base_out)
+        outside_bound_layer.setRenderer(new_renderer)
+
+        """ Activating Labels """
+        grid_labels_layer = self.createGridLabelsLayer(
+            layer_bound.name() + "_grid_labels", layer_bound.crs(), grid_labels
+        )
+        layer_bound.setLabelsEnabled(False)
+
+        if masks_check:
+            self.apply_masks(grid_lines_layer)
+
+        layer_bound.triggerRepaint()
+
+        return grid_lines_layer, grid_labels_layer
+
+    def computeGrid(
+        self,
+        feature_geometry,
+        layer_bound,
+        utmSRID,
+        spacing,
+        crossX,
+        crossY,
+        scale,
+        fontSize,
+        font,
+        fontLL,
+        llcolor,
+        linwidth_geo,
+        linwidth_utm,
+        linwidth_buffer_geo,
+        linwidth_buffer_utm,
+        geo_grid_color,
+        utm_grid_color,
+        geo_grid_buffer_color,
+        utm_grid_buffer_color,
+    ):
+        """Computes the grid lines and labels of feature_geometry. Only plain values
+        are returned, so the result can be stored on the grid cache.
+        """
         """Getting Input Data For Grid Generation"""
         linwidth_buffer_utm += linwidth_utm
         linwidth_buffer_geo += linwidth_geo
@@ -1413,9 +1499,8 @@ class GridAndLabelCreator(QObject):
         # oriented_geo_bb = str(feature_bbox_or).replace(',','').replace('>','').replace('((','').replace('))','')
         oriented_geo_bb = feature_geometry.boundingBox()
 
-        # Defining UTM Grid Symbology Type
-        properties = {"color": "black"}
-        grid_symb = QgsFillSymbol.createSimple(properties)
+        # Grid lines are computed once and stored on a memory layer
+        grid_lines = []
 
         """ Creating UTM Grid """
         extentsUTM = (
@@ -1441,13 +1526,12 @@ class GridAndLabelCreator(QObject):
             if linwidth_buffer_utm != linwidth_utm:
                 # Generating Buffer Vertical Lines
                 for x in range(1, UTM_num_x + 1):
-                    grid_symb = self.utm_Symb_Generator(
+                    grid_lines = self.utm_Symb_Generator(
                         utmSRID,
                         grid_spacing,
                         trUTMLL,
                         trLLUTM,
-                        grid_symb,
-                        properties,
+                        grid_lines,
                         UTM_num_x,
                         UTM_num_y,
                         x,
@@ -1460,13 +1544,12 @@ class GridAndLabelCreator(QObject):
 
                 # Generating Buffer Horizontal Lines
                 for y in range(1, UTM_num_y + 1):
-                    grid_symb = self.utm_Symb_Generator(
+                    grid_lines = self.utm_Symb_Generator(
                         utmSRID,
                         grid_spacing,
                         trUTMLL,
                         trLLUTM,
-                        grid_symb,
-                        properties,
+                        grid_lines,
                         UTM_num_x,
                         UTM_num_y,
                         0,
@@ -1479,13 +1562,12 @@ class GridAndLabelCreator(QObject):
 
             # Generating Vertical Lines
             for x in range(1, UTM_num_x + 1):
-                grid_symb = self.utm_Symb_Generator(
+                grid_lines = self.utm_Symb_Generator(
                     utmSRID,
                     grid_spacing,
                     trUTMLL,
                     trLLUTM,
-                    grid_symb,
-                    properties,
+                    grid_lines,
                     UTM_num_x,
                     UTM_num_y,
                     x,
@@ -1498,13 +1580,12 @@ class GridAndLabelCreator(QObject):
 
             # Generating Horizontal Lines
             for y in range(1, UTM_num_y + 1):
-                grid_symb = self.utm_Symb_Generator(
+                grid_lines = self.utm_Symb_Generator(
                     utmSRID,
                     grid_spacing,
                     trUTMLL,
                     trLLUTM,
-                    grid_symb,
-                    properties,
+                    grid_lines,
                     UTM_num_x,
                     UTM_num_y,
                     0,
@@ -1519,9 +1600,9 @@ class GridAndLabelCreator(QObject):
         px = (round(extentsGeo[2], 6) - round(extentsGeo[0], 6)) / (geo_number_x + 1)
         py = (round(extentsGeo[3], 6) - round(extentsGeo[1], 6)) / (geo_number_y + 1)
         if linwidth_buffer_geo != linwidth_geo:
-            grid_symb = self.geoGridcreator(
+            grid_lines = self.geoGridcreator(
                 utmSRID,
-                grid_symb,
+                grid_lines,
                 extentsGeo,
                 px,
                 py,
@@ -1532,9 +1613,9 @@ class GridAndLabelCreator(QObject):
                 linwidth_buffer_geo,
                 geo_grid_buffer_color,
             )
-        grid_symb = self.geoGridcreator(
+        grid_lines = self.geoGridcreator(
             utmSRID,
-            grid_symb,
+            grid_lines,
             extentsGeo,
             px,
             py,
@@ -1546,68 +1627,13 @@ class GridAndLabelCreator(QObject):
             geo_grid_color,
         )
 
-        """ Rendering UTM and Geographic Grid """
-        # Changing UTM Grid Color
-        grid_symb.deleteSymbolLayer(0)
-
-        # Creating Rule Based Renderer (Rule For The Selected Feature, Root Rule)
-        symb_new = QgsRuleBasedRenderer.Rule(grid_symb)
-        symb_new.setFilterExpression('"' + str(id_attr) + '" = ' + str(id_value))
-        symb_new.setLabel("layer")
-
-        # Appending rules to symbol root rule
-        root_symbol_rule = QgsRuleBasedRenderer.Rule(None)
-        root_symbol_rule.setFilterExpression("")
-        root_symbol_rule.appendChild(symb_new)
-
-        # Applying New Renderer
-        render_base = QgsRuleBasedRenderer(root_symbol_rule)
-        layer_bound.setRenderer(render_base)
-
-        """Rendering outside area"""
-        # Duplicating original layer
-        layers_names = [i.name() for i in QgsProject.instance().mapLayers().values()]
-        if (layer_bound.name() + "_outside") not in layers_names:
-            outside_bound_layer = QgsVectorLayer(
-                layer_bound.source(),
-                layer_bound.name() + "_outside",
-                layer_bound.providerType(),
-            )
-            if layer_bound.providerType() == "memory":
-                feats = [feat for feat in layer_bound.getFeatures()]
-                outside_bound_layer_data = outside_bound_layer.dataProvider()
-                outside_bound_layer_data.addFeatures(feats)
-            QgsProject.instance().addMapLayer(outside_bound_layer)
-        else:
-            outside_bound_layer = QgsProject.instance().mapLayersByName(
-                layer_bound.name() + "_outside"
-            )[0]
-
-        # Creating Rule Based Renderer (Rule For The Other Features)
-        properties = {"color": "white"}
-        ext_grid_symb = QgsFillSymbol.createSimple(properties)
-        symb_out = QgsSimpleFillSymbolLayer()
-        symb_out.setFillColor(QColor("white"))
-        symb_out.setStrokeWidth(linwidth_utm)
-        ext_grid_symb.changeSymbolLayer(0, symb_out)
-        rule_out = QgsRuleBasedRenderer.Rule(ext_grid_symb)
-        rule_out.setFilterExpression('"' + str(id_attr) + '" = ' + str(id_value))
-        rule_out.setLabel("outside")
-
-        root_symbol_rule_out = QgsRuleBasedRenderer.Rule(None)
-        root_symbol_rule_out.appendChild(rule_out)
-
-        render_base_out = QgsRuleBasedRenderer(root_symbol_rule_out)
-        new_renderer = QgsInvertedPolygonRenderer.convertFromRenderer(render_base_out)
-        outside_bound_layer.setRenderer(new_renderer)
-
         """ Labeling Geo Grid """
         dx = [2.0, -11.0, -8.0, -3.6]
         dx = [i * scale * fSize / 1.5 for i in dx]
         dy = [1.7, -3.8, -0.8, -0.8]
         dy = [i * scale * fSize / 1.5 for i in dy]
 
-        root_rule = self.geoGridlabelPlacer(
+        grid_labels = self.geoGridlabelPlacer(
             extentsGeo,
             px,
             py,
@@ -1634,8 +1660,8 @@ class GridAndLabelCreator(QObject):
         dy1 = [2.15, 1.2]
         dy1 = [i * scale * fSize / 1.5 for i in dy1]
 
-        root_rule = self.utmGridlabelPlacer(
-            root_rule,
+        grid_labels = self.utmGridlabelPlacer(
+            grid_labels,
             grid_spacing,
             extentsGeo,
             extentsUTM,
@@ -1656,14 +1682,194 @@ class GridAndLabelCreator(QObject):
             layer_bound,
         )
 
-        """ Activating Labels """
-        rules = QgsRuleBasedLabeling(root_rule)
-        layer_bound.setLabeling(rules)
-        layer_bound.setLabelsEnabled(True)
+        return grid_lines, self.evaluateGridLabels(grid_labels)
 
-        if masks_check:
-            self.apply_masks(layer_bound)
+    def evaluateGridLabels(self, grid_labels):
+        """Evaluates the label expressions, dropping the labels of fields that do not
+        exist ("fail"), which were never rendered.
+        """
+        evaluated_labels = []
+        for grid_label in grid_labels:
+            if grid_label["expression"] == "fail":
+                continue
+            evaluated_labels.append(
+                {
+                    "x": grid_label["x"],
+                    "y": grid_label["y"],
+                    "text": QgsExpression(grid_label["expression"]).evaluate(),
+                    "size": grid_label["size"],
+                    "font": grid_label["font"].toString(),
+                    "color": grid_label["color"].name(),
+                }
+            )
+        return evaluated_labels
+
+    def getGridCacheKey(self, feature_geometry, label_crs, utmSRID, grid_params):
+        """Builds the key of a grid on the cache from the sheet extent, the CRSs and
+        the style params. Colors are keyed by their names and fonts by their
+        descriptions, so the key is the same across runs and processes.
+        """
+        key_data = {
+            "version": self.gridCacheVersion,
+            "extent": hashlib.sha256(bytes(feature_geometry.asWkb())).hexdigest(),
+            "label_crs": label_crs,
+            "epsg": str(utmSRID),
+            "params": {
+                key: self.getGridCacheKeyValue(value)
+                for key, value in grid_params.items()
+            },
+        }
+        # sem default, um tipo não serializável falha em vez de usar o id do objeto
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+    def getGridCacheKeyValue(self, value):
+        if isinstance(value, QColor):
+            return value.name(QColor.HexArgb)
+        if isinstance(value, QFont):
+            return value.toString()
+        return value
+
+    def loadGridFromCache(self, cache_key):
+        """Returns the grid lines and labels of a cached grid, or None if it is not on
+        the cache. Read entries are touched, so the least recently used ones are the
+        first to be evicted.
+        """
+        cache_path = self.gridCacheFolder / f"{cache_key}.json"
+        try:
+            with open(cache_path, "r") as f:
+                cached_grid = json.load(f)
+            cache_path.touch()
+        except (OSError, ValueError):
+            return None
+        return cached_grid["lines"], cached_grid["labels"]
+
+    def saveGridToCache(self, cache_key, grid_lines, grid_labels):
+        # o arquivo é escrito à parte e renomeado, pois outros processos podem lê-lo
+        tmp_path = self.gridCacheFolder / f"{cache_key}.{uuid4().hex}.tmp"
+        try:
+            self.gridCacheFolder.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump({"lines": grid_lines, "labels": grid_labels}, f)
+            os.replace(tmp_path, self.gridCacheFolder / f"{cache_key}.json")
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            return
+        self.evictGridCache(keep_key=cache_key)
+
+    def evictGridCache(self, keep_key=None):
+        """Removes the least recently used grids until the cache holds at most
+        gridCacheMaxEntries grids. The keep_key entry, which is in use, is kept.
+        """
+        entries = sorted(
+            self.gridCacheFolder.glob("*.json"), key=lambda x: x.stat().st_mtime
+        )
+        for path in entries[: max(len(entries) - self.gridCacheMaxEntries, 0)]:
+            if path.stem == keep_key:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
 
-        layer_bound.triggerRepaint()
+    def createGridLinesLayer(self, name, utmSRID, grid_lines):
+        """Creates a memory layer holding the grid lines, in the UTM CRS, with one
+        plain line symbol per (width, color) pair. Symbol levels keep the drawing
+        order of the pairs, so buffer lines stay below the grid lines.
+        """
+        layer = QgsVectorLayer(
+            "LineString?crs=EPSG:{}&field=style:integer".format(utmSRID),
+            name,
+            "memory",
+        )
+        styles = []
+        feats = []
+        for grid_line in grid_lines:
+            style = (grid_line["width"], grid_line["color"])
+            if style not in styles:
+                styles.append(style)
+            x1, y1, x2, y2 = grid_line["coordinates"]
+            feat = QgsFeature(layer.fields())
+            feat.setGeometry(
+                QgsGeometry.fromPolylineXY([QgsPointXY(x1, y1), QgsPointXY(x2, y2)])
+            )
+            feat["style"] = styles.index(style)
+            feats.append(feat)
+        layer.dataProvider().addFeatures(feats)
 
-        return
+        root_symbol_rule = QgsRuleBasedRenderer.Rule(None)
+        for idx, (width, color) in enumerate(styles):
+            line_symb = QgsLineSymbol.createSimple({"color": color})
+            line_symb.setWidth(width)
+            line_symb.symbolLayer(0).setRenderingPass(idx)
+            rule = QgsRuleBasedRenderer.Rule(line_symb)
+            rule.setFilterExpression('"style" = {}'.format(idx))
+            root_symbol_rule.appendChild(rule)
+        renderer = QgsRuleBasedRenderer(root_symbol_rule)
+        renderer.setUsingSymbolLevels(True)
+        layer.setRenderer(renderer)
+        return layer
+
+    def createGridLabelsLayer(self, name, crs, grid_labels):
+        """Creates a memory layer holding the grid label anchors, in crs, with their
+        texts. Labels sharing size, font and color share a labeling rule.
+        """
+        layer = QgsVectorLayer(
+            "Point?crs={}&field=label:string&field=format:integer".format(crs.authid()),
+            name,
+            "memory",
+        )
+        formats = []
+        feats = []
+        for grid_label in grid_labels:
+            label_format = (
+                grid_label["size"],
+                grid_label["font"],
+                grid_label["color"],
+            )
+            if label_format not in formats:
+                formats.append(label_format)
+            feat = QgsFeature(layer.fields())
+            feat.setGeometry(
+                QgsGeometry.fromPointXY(QgsPointXY(grid_label["x"], grid_label["y"]))
+            )
+            feat["label"] = grid_label["text"]
+            feat["format"] = formats.index(label_format)
+            feats.append(feat)
+        layer.dataProvider().addFeatures(feats)
+
+        root_rule = QgsRuleBasedLabeling.Rule(QgsPalLayerSettings())
+        for idx, (size, font, color) in enumerate(formats):
+            # Label Format Settings
+            settings = QgsPalLayerSettings()
+            settings.placement = (
+                1 if Qgis.QGIS_VERSION_INT <= 32600 else Qgis.LabelPlacement.OverPoint
+            )
+            textprop = QgsTextFormat()
+            textprop.setColor(QColor(color))
+            textprop.setSizeUnit(
+                4 if Qgis.QGIS_VERSION_INT <= 32600 else Qgis.RenderUnit.Points
+            )
+            textprop.setSize(size)
+            label_font = QFont()
+            label_font.fromString(font)
+            textprop.setFont(label_font)
+            textprop.setLineHeight(1)
+            settings.setFormat(textprop)
+            settings.fieldName = "label"
+            datadefined = QgsPropertyCollection()
+            datadefined.property(20).setExpressionString("True")
+            datadefined.property(20).setActive(True)
+            datadefined.property(15).setExpressionString("True")
+            datadefined.property(15).setActive(True)
+            datadefined.property(77).setExpressionString("2")
+            datadefined.property(77).setActive(True)
+            settings.setDataDefinedProperties(datadefined)
+
+            # Creating and Activating Labeling Rule
+            rule = QgsRuleBasedLabeling.Rule(settings)
+            rule.setFilterExpression('"format" = {}'.format(idx))
+            rule.setActive(True)
+            root_rule.appendChild(rule)
+        layer.setLabeling(QgsRuleBasedLabeling(root_rule))
+        layer.setLabelsEnabled(True)
+        return layer
@@ -3,7 +3,6 @@ from qgis.PyQt.QtCore import QCoreApplication
 from math import sqrt
 from qgis.core import (
     QgsGeometry,
-    QgsSpatialIndex,
     QgsFeature,
     QgsCoordinateReferenceSystem,
     QgsVectorLayer,
@@ -14,6 +13,7 @@ from qgis.core import (
     QgsCoordinateTransformContext,
     QgsUnitTypes,
 )
+from ..tools.buttons.utils.spatialIndexRegistry import getLayerSpatialIndex
 
 # Captura a feição da camada de entrada mais próxima da posicao e cria a feição na camada de destino,
 # as camadas ja predefinidas dependem da funcao chamada
@@ -75,9 +75,7 @@ def createRoadLabel(pos: QgsGeometry, srcLyr, dstLyr, attrNameLane, scale, produ
 
 
 def getNearestFeat(pos: QgsGeometry, lyr: QgsVectorLayer, tolerance) -> QgsFeature:
-    spatialIndex = QgsSpatialIndex(
-        lyr.getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-    )
+    spatialIndex = getLayerSpatialIndex(lyr)
     closestSpatialID = spatialIndex.nearestNeighbor(pos, maxDistance=2 * tolerance)
     request = QgsFeatureRequest().setFilterFids(closestSpatialID)
     closestFeat = lyr.getFeatures(request)
@@ -6,7 +6,6 @@ from PyQt5.QtCore import QVariant
 from PyQt5.QtGui import QColor
 from qgis.core import (
     QgsCoordinateReferenceSystem,
-    QgsCoordinateTransform,
     QgsDistanceArea,
     QgsFeatureRequest,
     QgsGeometry,
@@ -30,6 +29,10 @@ from ....interfaces.iComponent import IComponent
 
 
 class Division(ComponentUtils, IComponent):
+    # Limits layers and pole of inaccessibility results shared by every product
+    limitsStore = dict()
+    poleOfInaccessibilityCache = dict()
+
     def __init__(self, *args, **kwargs):
         self.itemname_tableMunicipios = "label_divisao_municipios"
         self.maxCountiesToDisplay = 27
@@ -58,8 +61,22 @@ class Division(ComponentUtils, IComponent):
 
         isInternational = data.get("territorio_internacional")
 
-        # Inserting necessary layers
+        # Getting map extents
+        gridBound = mapAreaFeature.geometry().boundingBox()
 
+        # Get map extent for intersections
+        # TODO: Check possible refactor on getExtent
+        outerExtents = self.getExtent(gridBound, mapAreaFeature, data)
+        if (mapItem := composition.itemById("map_divisao")) is not None:
+            mapItem.setExtent(outerExtents)
+            self.scale = mapItem.scale()
+        else:
+            self.scale = 1
+
+        # Inserting necessary layers
+        # The margin keeps every feature drawn if the map item adjusts its extent
+        clipExtent = QgsRectangle(outerExtents)
+        clipExtent.grow(max(outerExtents.width(), outerExtents.height()))
         (
             layerCountyArea,
             layerCountyLine,
@@ -67,7 +84,7 @@ class Division(ComponentUtils, IComponent):
             layerCountryArea,
             layerCountryLine,
             layerOcean,
-        ) = self.createLayersGroup()
+        ) = self.createLayersGroup(clipExtent)
         mapIDsToBeDisplayed.extend(
             [
                 layerCountyArea.id(),
@@ -78,20 +95,8 @@ class Division(ComponentUtils, IComponent):
                 layerCountryLine.id(),
             ]
         )
-
-        # Getting map extents
-        gridBound = mapAreaFeature.geometry().boundingBox()
         gridRectangleLayer = self.createGridRectangle(gridBound, "divisionMapArea")
         mapIDsToBeDisplayed.append(gridRectangleLayer.id())
-
-        # Get map extent for intersections
-        # TODO: Check possible refactor on getExtent
-        outerExtents = self.getExtent(gridBound, mapAreaFeature, data)
-        if (mapItem := composition.itemById("map_divisao")) is not None:
-            mapItem.setExtent(outerExtents)
-            self.scale = mapItem.scale()
-        else:
-            self.scale = 1
         (
             orderedCountiesByCentroidDistance,
             orderedCountiesNamesByArea,
@@ -136,35 +141,33 @@ class Division(ComponentUtils, IComponent):
         self.updateComposition(composition, outerExtents, layersToShow)
         return mapIDsToBeDisplayed
 
-    def createLayersGroup(self):
+    def createLayersGroup(self, clipExtent: QgsRectangle = None):
         """
         Creates QgsVectorLayer and sets up its style for classes: County, State, Contry and Ocean.
         Layers with Limites suffix are used for displaying purposes only.
+        Only the features that intersect clipExtent (if given) are copied from the limits store.
         """
-
-        uriPath = self.shpFolder / "Municipios_2020.shp"
-        stylePath = self.styleFolder / "municipio.qml"
-        layerCountyArea = self.loadShapeLayer(uriPath, stylePath, "counties")
-
-        uriPath = self.shpFolder / "Limites_Municipios_2020.shp"
-        stylePath = self.styleFolder / "municipio_l.qml"
-        layerCountyLine = self.loadShapeLayer(uriPath, stylePath, "countiesLimits")
-
-        uriPath = self.shpFolder / "Limites_Estados_2020.shp"
-        stylePath = self.styleFolder / "estados_l.qml"
-        layerStateLine = self.loadShapeLayer(uriPath, stylePath, "statesLimits")
-
-        uriPath = self.shpFolder / "Paises_2020.shp"
-        stylePath = self.styleFolder / "paises.qml"
-        layerCountryArea = self.loadShapeLayer(uriPath, stylePath, "countries")
-
-        uriPath = self.shpFolder / "Limites_Paises_2020.shp"
-        stylePath = self.styleFolder / "paises_l.qml"
-        layerCountryLine = self.loadShapeLayer(uriPath, stylePath, "countriesLimits")
-
-        uriPath = self.shpFolder / "Oceano_2020.shp"
-        stylePath = self.styleFolder / "oceano.qml"
-        layerOcean = self.loadShapeLayer(uriPath, stylePath, "ocean")
+        layerCountyArea = self.loadLimitsLayer(
+            "Municipios_2020.shp", "municipio.qml", "counties", clipExtent
+        )
+        layerCountyLine = self.loadLimitsLayer(
+            "Limites_Municipios_2020.shp",
+            "municipio_l.qml",
+            "countiesLimits",
+            clipExtent,
+        )
+        layerStateLine = self.loadLimitsLayer(
+            "Limites_Estados_2020.shp", "estados_l.qml", "statesLimits", clipExtent
+        )
+        layerCountryArea = self.loadLimitsLayer(
+            "Paises_2020.shp", "paises.qml", "countries", clipExtent
+        )
+        layerCountryLine = self.loadLimitsLayer(
+            "Limites_Paises_2020.shp", "paises_l.qml", "countriesLimits", clipExtent
+        )
+        layerOcean = self.loadLimitsLayer(
+            "Oceano_2020.shp", "oceano.qml", "ocean", clipExtent
+        )
 
         return (
             layerCountyArea,
@@ -175,6 +178,30 @@ class Division(ComponentUtils, IComponent):
             layerOcean,
         )
 
+    def loadLimitsLayer(
+        self, shpName: str, styleName: str, lyrName: str, clipExtent: QgsRectangle
+    ) -> QgsVectorLayer:
+        """
+        Returns a styled memory copy of a limits shapefile, clipped to clipExtent.
+        The shapefile is read and spatially indexed only once and then kept in Division.limitsStore,
+        which is shared by every product.
+        """
+        uriPath = self.shpFolder / shpName
+        if uriPath not in Division.limitsStore:
+            limitsLayer = self.loadShapeLayer(uriPath, None, lyrName)
+            if limitsLayer is None:
+                return None
+            limitsLayer.dataProvider().createSpatialIndex()
+            Division.limitsStore[uriPath] = limitsLayer
+        request = QgsFeatureRequest()
+        if clipExtent is not None:
+            request.setFilterRect(clipExtent)
+        layer = Division.limitsStore[uriPath].materialize(request)
+        layer.setName(lyrName)
+        layer.loadNamedStyle(str(self.styleFolder / styleName))
+        layer.triggerRepaint()
+        return layer
+
     def getExtent(self, gridBound, selected_feature, data):
         if data.get("poligono"):
             extents = QgsRectangle(gridBound)
@@ -202,22 +229,22 @@ class Division(ComponentUtils, IComponent):
         self, countyFeature: QgsFeature, outerExtentsGeometry, data
     ):
         """
-        Uses poleOfInaccessibility to decide the renderization of countyFeature if it intersects outerExtentsGeometry
+        Uses poleOfInaccessibility to decide the renderization of countyFeature if it intersects outerExtentsGeometry.
+        Results are kept in Division.poleOfInaccessibilityCache by (county, extent).
         """
-        epsg = data.get("epsg")
+        cacheKey = (countyFeature["featid"], outerExtentsGeometry.asWkt())
+        if cacheKey in Division.poleOfInaccessibilityCache:
+            return Division.poleOfInaccessibilityCache[cacheKey]
         intersectionGeometry = countyFeature.geometry().intersection(
             outerExtentsGeometry
         )
-        crsSrc = QgsCoordinateReferenceSystem("EPSG:4326")  # WGS 84
-        crsExtents = QgsCoordinateReferenceSystem(f"EPSG:{epsg}")
-        transform = QgsCoordinateTransform(crsSrc, crsExtents, QgsProject.instance())
-        # intersectionGeometry.transform(transform)
         pointGeom, radius = intersectionGeometry.poleOfInaccessibility(0.0001)
         point = (
             pointGeom.asPoint() if not intersectionGeometry.isEmpty() else QgsPointXY()
         )
         if intersectionGeometry.isEmpty():
             radius = 0
+        Division.poleOfInaccessibilityCache[cacheKey] = (point, radius)
         return point, radius
 
     # def convertPolygonToMultilineGeometry(self, geom):
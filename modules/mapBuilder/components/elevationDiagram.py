@@ -1,5 +1,7 @@
+import hashlib
 import json
 import os
+import shutil
 import processing
 from pathlib import Path
 from typing import List
@@ -11,6 +13,7 @@ from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtCore import QVariant
 from ...processings.makeGrid import getSirgasAuthIdByPointLatLong
 from qgis.core import (
+    QgsApplication,
     QgsCoordinateReferenceSystem,
     QgsFeature,
     QgsLayerTreeGroup,
@@ -36,6 +39,16 @@ from .componentUtils import ComponentUtils
 
 
 class ElevationDiagram(ComponentUtils, IComponent):
+    # fatiamentos já calculados ficam em disco entre as execuções
+    slicingCacheFolder = (
+        Path(QgsApplication.qgisSettingsDirPath())
+        / "ferramentas_edicao"
+        / "cache"
+        / "elevationDiagram"
+    )
+    slicingCacheMaxSize = 2 * 1024**3
+    slicingCacheVersion = 1
+
     def __init__(self, *args, **kwargs):
         self.stylesFolder = (
             Path(__file__).parent.parent / "resources" / "styles" / "elevationDiagram"
@@ -184,30 +197,24 @@ class ElevationDiagram(ComponentUtils, IComponent):
         if epsg is not None:
             epsgId = QgsCoordinateReferenceSystem(f"EPSG:{epsg}")
             raster_mde.setCrs(epsgId)
-        raster_mde = self.getRasterMDE(raster_mde, epsg, epsgId)
-        elevationSlicingRasterLyr = self.createTerrainLayer()
         slicingParams = tag_mde_elevacao.get("param_diagrama_elevacao", {})
-        (
-            processingOutput,
-            classThresholdDict,
-            nClasses,
-        ) = self.getTerrainSlicingFromProcessing(
+        cacheKey = self.getSlicingCacheKey(
+            raster_mde_path,
+            epsg,
             geographicBoundsLyr,
             areaWithoutDataLyr,
             waterBodiesLyr,
-            raster_mde,
             slicingParams,
         )
-        if nClasses == 1:
-            slicingParams.update(
-                {
-                    "contour_interval": 1,
-                }
-            )
+        cachedSlicing = self.loadSlicingFromCache(cacheKey)
+        if cachedSlicing is not None:
+            slicingRasterPath, classThresholdDict = cachedSlicing
+        else:
+            raster_mde = self.getRasterMDE(raster_mde, epsg, epsgId)
             (
                 processingOutput,
                 classThresholdDict,
-                nClasses,
+                _,
             ) = self.getTerrainSlicingFromProcessing(
                 geographicBoundsLyr,
                 areaWithoutDataLyr,
@@ -215,8 +222,13 @@ class ElevationDiagram(ComponentUtils, IComponent):
                 raster_mde,
                 slicingParams,
             )
+            if isinstance(raster_mde, str):
+                gdal.Unlink(raster_mde)
+            slicingRasterPath = processingOutput["OUTPUT_RASTER"]
+            self.saveSlicingToCache(cacheKey, slicingRasterPath, classThresholdDict)
+        nClasses = len(classThresholdDict.keys())
         elevationSlicingRasterLyr = self.createLayerRaster(
-            rasterPath=processingOutput["OUTPUT_RASTER"],
+            rasterPath=slicingRasterPath,
             stylePath=str(
                 self.stylesFolder
                 / f"edicao_raster_fatiamento_terreno_{nClasses}_classes.qml"
@@ -224,7 +236,7 @@ class ElevationDiagram(ComponentUtils, IComponent):
         )
         QgsProject.instance().addMapLayer(elevationSlicingRasterLyr, False)
         elevationSlicingContourRasterLyr = self.createLayerRaster(
-            rasterPath=processingOutput["OUTPUT_RASTER"],
+            rasterPath=slicingRasterPath,
             stylePath=str(
                 self.stylesFolder / f"edicao_raster_curvas_diagrama_elevacao.qml"
             ),
@@ -238,30 +250,153 @@ class ElevationDiagram(ComponentUtils, IComponent):
             classThresholdDict,
         )
 
+    def getSlicingCacheKey(
+        self,
+        raster_mde_path,
+        epsg,
+        geographicBoundsLyr,
+        areaWithoutDataLyr,
+        waterBodiesLyr,
+        slicingParams,
+    ):
+        """Builds the key of a slicing on the cache. The DEM is identified by its path,
+        size and modification time, so a changed file yields a new key.
+        Args:
+            raster_mde_path: path of the DEM
+            epsg: EPSG code of the DEM
+            geographicBoundsLyr: layer with the map area
+            areaWithoutDataLyr: layer with the areas without information
+            waterBodiesLyr: layer with the water bodies
+            slicingParams: param_diagrama_elevacao tag of the json
+        Returns:
+            The key as a hex digest, or None if the DEM is not a local file
+        """
+        try:
+            mdeStat = os.stat(raster_mde_path)
+        except (OSError, TypeError):
+            return None
+        keyData = {
+            "version": self.slicingCacheVersion,
+            "mde": [
+                os.path.abspath(raster_mde_path),
+                mdeStat.st_size,
+                mdeStat.st_mtime_ns,
+                epsg,
+            ],
+            "extent": [
+                feat.geometry().asWkt() for feat in geographicBoundsLyr.getFeatures()
+            ],
+            "params": slicingParams,
+            "masks": [
+                self.getLayerChecksum(lyr)
+                for lyr in (areaWithoutDataLyr, waterBodiesLyr)
+            ],
+        }
+        return hashlib.sha256(
+            json.dumps(keyData, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def getLayerChecksum(self, layer):
+        """Returns a checksum of the geometries of layer that does not depend on the
+        feature order, or None if there is no layer.
+        """
+        if layer is None:
+            return None
+        geometryDigests = sorted(
+            hashlib.sha256(bytes(feat.geometry().asWkb())).hexdigest()
+            for feat in layer.getFeatures()
+        )
+        return hashlib.sha256("".join(geometryDigests).encode()).hexdigest()
+
+    def loadSlicingFromCache(self, cacheKey):
+        """Returns the raster path and the class threshold dict of a cached slicing, or
+        None if it is not on the cache. The raster is copied to a temporary file of
+        this run, since the cached one may be evicted while its layers are loaded.
+        Read entries are touched, so the least recently used ones are the first to
+        be evicted.
+        """
+        if cacheKey is None:
+            return None
+        rasterPath = self.slicingCacheFolder / f"{cacheKey}.tif"
+        jsonPath = self.slicingCacheFolder / f"{cacheKey}.json"
+        if not rasterPath.exists() or not jsonPath.exists():
+            return None
+        try:
+            with open(jsonPath, "r") as f:
+                classThresholdDict = json.load(f)
+            runRasterPath = QgsProcessingUtils.generateTempFilename(f"{cacheKey}.tif")
+            shutil.copyfile(rasterPath, runRasterPath)
+            for path in (rasterPath, jsonPath):
+                path.touch()
+        except (ValueError, OSError):
+            return None
+        return runRasterPath, classThresholdDict
+
+    def saveSlicingToCache(self, cacheKey, rasterPath, classThresholdDict):
+        if cacheKey is None:
+            return
+        # os arquivos são escritos à parte e renomeados, pois outros processos podem
+        # lê-los. O json é renomeado por último e marca a entrada como completa
+        tmpId = uuid4().hex
+        tmpRasterPath = self.slicingCacheFolder / f"{cacheKey}.{tmpId}.tif.tmp"
+        tmpJsonPath = self.slicingCacheFolder / f"{cacheKey}.{tmpId}.json.tmp"
+        try:
+            self.slicingCacheFolder.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(rasterPath, tmpRasterPath)
+            with open(tmpJsonPath, "w") as f:
+                json.dump(classThresholdDict, f)
+            os.replace(tmpRasterPath, self.slicingCacheFolder / f"{cacheKey}.tif")
+            os.replace(tmpJsonPath, self.slicingCacheFolder / f"{cacheKey}.json")
+        except OSError:
+            for path in (tmpRasterPath, tmpJsonPath):
+                path.unlink(missing_ok=True)
+            return
+        self.evictSlicingCache(keepKey=cacheKey)
+
+    def evictSlicingCache(self, keepKey=None):
+        """Removes the least recently used slicings until the cache fits on
+        slicingCacheMaxSize bytes. The keepKey entry, which is in use, is kept.
+        """
+        entries = dict()
+        for path in self.slicingCacheFolder.iterdir():
+            # arquivos .tmp são entradas ainda sendo escritas por outro processo
+            if path.suffix not in (".tif", ".json"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                # removido ou renomeado por outro processo
+                continue
+            size, lastUse = entries.get(path.stem, (0, 0))
+            entries[path.stem] = (size + stat.st_size, max(lastUse, stat.st_mtime))
+        totalSize = sum(size for size, _ in entries.values())
+        for key, (size, _) in sorted(entries.items(), key=lambda x: x[1][1]):
+            if totalSize <= self.slicingCacheMaxSize:
+                break
+            if key == keepKey:
+                continue
+            try:
+                for suffix in (".json", ".tif"):
+                    (self.slicingCacheFolder / f"{key}{suffix}").unlink(missing_ok=True)
+            except OSError:
+                continue
+            totalSize -= size
+
     def getRasterMDE(self, raster_mde, epsg, epsgId):
-        raster_mde = (
-            raster_mde
-            if int(epsg) in (4674, 4326)
-            else processing.run(
-                "gdal:warpreproject",
-                {
-                    "INPUT": raster_mde,
-                    "SOURCE_CRS": epsgId,
-                    "TARGET_CRS": QgsCoordinateReferenceSystem("EPSG:4674"),
-                    "RESAMPLING": 0,
-                    "NODATA": None,
-                    "TARGET_RESOLUTION": None,
-                    "OPTIONS": "",
-                    "DATA_TYPE": 0,
-                    "TARGET_EXTENT": None,
-                    "TARGET_EXTENT_CRS": None,
-                    "MULTITHREADING": True,
-                    "EXTRA": "",
-                    "OUTPUT": "TEMPORARY_OUTPUT",
-                },
-            )["OUTPUT"]
-        )
-        return raster_mde
+        if int(epsg) in (4674, 4326):
+            return raster_mde
+        # VRT em memória: a reprojeção só é feita nos blocos lidos pelo recorte
+        warpedMDE = f"/vsimem/mde_{str(uuid4().hex)}.vrt"
+        gdal.Warp(
+            warpedMDE,
+            raster_mde.source(),
+            format="VRT",
+            srcSRS=epsgId.authid(),
+            dstSRS="EPSG:4674",
+            resampleAlg="near",
+            multithread=True,
+        )
+        return warpedMDE
 
     def getTerrainSlicingFromProcessing(
         self,
@@ -72,8 +72,12 @@ class Map(ComponentUtils, IComponent):
         gridLayer, mapExtentsTransformed = self.createLayerForGrid(
             mapAreaLayer, mapAreaFeature, data
         )
-        self.applyStyleGridLayer(gridLayer, gridGenerator, defaults, data)
+        gridLinesLayer, gridLabelsLayer = self.applyStyleGridLayer(
+            gridLayer, gridGenerator, defaults, data
+        )
         instance.addMapLayer(gridLayer, False)
+        instance.addMapLayer(gridLinesLayer, False)
+        instance.addMapLayer(gridLabelsLayer, False)
 
         # Setting up aux_label, which is reprojected to mapLayers
         crs = next(iter(layers)).crs()
@@ -96,12 +100,22 @@ class Map(ComponentUtils, IComponent):
             (
                 copy.id(),
                 copyLabel.id(),
+                gridLabelsLayer.id(),
+                gridLinesLayer.id(),
                 gridLayer.id(),
                 maskLayer.id(),
                 *[x.id() for x in layers],
             )
         )
-        layersToComposition = [gridLayer, maskLayer, copy, copyLabel, *layers]
+        layersToComposition = [
+            gridLabelsLayer,
+            gridLinesLayer,
+            gridLayer,
+            maskLayer,
+            copy,
+            copyLabel,
+            *layers,
+        ]
         self.updateComposition(
             composition,
             mapAreaExtents,
@@ -165,18 +179,21 @@ class Map(ComponentUtils, IComponent):
         gridGenerator: GridAndLabelCreator,
         gridOpts: dict,
         data: dict,
-    ) -> None:
+    ) -> tuple[QgsVectorLayer, QgsVectorLayer]:
         """Applies the grid styling on grid layer
         Args:
             gridLayer(QgsVectorLayer): The layer where the style will be applied
             gridGenerator(GridAndLabelCreator): the instance of GridAndLabelCreator
             gridOpts (dict): holds the GridAndLabelCreator parameters
             data (dict): map info
+        Returns:
+            gridLinesLayer (QgsVectorLayer): memory layer holding the grid lines
+            gridLabelsLayer (QgsVectorLayer): memory layer holding the grid labels
         """
         gridCrs = gridLayer.crs().authid()
         srid = gridCrs.replace("EPSG:", "")
         gridGeometry = next(gridLayer.getFeatures()).geometry()
-        gridGenerator.styleCreator(
+        gridLinesLayer, gridLabelsLayer = gridGenerator.styleCreator(
             feature_geometry=gridGeometry,
             layer_bound=gridLayer,
             utmSRID=srid,
@@ -187,6 +204,7 @@ class Map(ComponentUtils, IComponent):
             **gridOpts,
         )
         gridLayer.triggerRepaint()
+        return gridLinesLayer, gridLabelsLayer
 
     def createMaskLayer(self, mapExtents: QgsFeature) -> QgsVectorLayer:
         """Creates a mask ("donut-like") layer to hide map contents.
@@ -22,9 +22,11 @@
 """
 
 from uuid import uuid4
+from functools import partial
+import concurrent.futures
+import math
 import numpy as np
 import json
-import processing
 from osgeo import gdal, ogr
 from DsgTools.core.DSGToolsProcessingAlgs.algRunner import AlgRunner
 from PyQt5.QtCore import QCoreApplication
@@ -36,13 +38,14 @@ from qgis.core import (
     QgsProcessingParameterNumber,
     QgsProcessingParameterRasterDestination,
     QgsProcessingParameterRasterLayer,
-    QgsProcessingUtils,
     QgsProject,
     QgsProcessingParameterFileDestination,
     QgsVectorFileWriter,
 )
 from scipy import signal
 
+from .processingUtils import ProcessingUtils
+
 
 class BuildElevationDiagram(QgsProcessingAlgorithm):
 
@@ -51,8 +54,11 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
     GEOGRAPHIC_BOUNDARY = "GEOGRAPHIC_BOUNDARY"
     AREA_WITHOUT_INFORMATION_POLYGONS = "AREA_WITHOUT_INFORMATION_POLYGONS"
     WATER_BODIES_POLYGONS = "WATER_BODIES_POLYGONS"
+    TILE_SIZE = "TILE_SIZE"
+    N_PROCESSES = "N_PROCESSES"
     OUTPUT_RASTER = "OUTPUT_RASTER"
     OUTPUT_JSON = "OUTPUT_JSON"
+    MEDIAN_KERNEL_SIZE = 15
 
     def initAlgorithm(self, config=None):
         self.addParameter(
@@ -98,6 +104,26 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
             )
         )
 
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.TILE_SIZE,
+                self.tr("Tile size in pixels (0 processes the whole raster at once)"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                defaultValue=0,
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.N_PROCESSES,
+                self.tr("Number of processes for the median filter"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=1,
+            )
+        )
+
         self.addParameter(
             QgsProcessingParameterRasterDestination(
                 self.OUTPUT_RASTER, self.tr("Output Elevation Diagram")
@@ -122,19 +148,80 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
         waterBodiesLyr = self.parameterAsVectorLayer(
             parameters, self.WATER_BODIES_POLYGONS, context
         )
+        tileSize = self.parameterAsInt(parameters, self.TILE_SIZE, context)
+        nProcesses = self.parameterAsInt(parameters, self.N_PROCESSES, context)
+        if nProcesses > 1 and not ProcessingUtils().canStartProcesses():
+            feedback.pushInfo(
+                self.tr(
+                    "Running the median filter in a single process, since this "
+                    "process can not start worker processes."
+                )
+            )
+            nProcesses = 1
         outputRaster = self.parameterAsOutputLayer(
             parameters, self.OUTPUT_RASTER, context
         )
         outputJsonPath = self.parameterAsFileOutput(
             parameters, self.OUTPUT_JSON, context
         )
+        geoBoundsLyr = self.parameterAsVectorLayer(
+            parameters, self.GEOGRAPHIC_BOUNDARY, context
+        )
         algRunner = AlgRunner()
         multiStepFeedback = QgsProcessingMultiStepFeedback(9, feedback)
+        # os rasters e vetores intermediários ficam em memória; somente o raster de
+        # saída é escrito em disco
+        vsimemFolder = f"/vsimem/elevation_diagram_{str(uuid4().hex)}"
+        try:
+            slicingThresholdDict = self.buildSlicing(
+                inputRaster.source(),
+                geoBoundsLyr,
+                geoBoundsSource,
+                areaWithoutInformationLyr,
+                waterBodiesLyr,
+                threshold,
+                tileSize,
+                nProcesses,
+                outputRaster,
+                vsimemFolder,
+                algRunner,
+                context,
+                multiStepFeedback,
+            )
+        finally:
+            gdal.RmdirRecursive(vsimemFolder)
+
+        if slicingThresholdDict is None or multiStepFeedback.isCanceled():
+            return {}
+
+        with open(outputJsonPath, "w") as f:
+            f.write(json.dumps(slicingThresholdDict))
+
+        return {
+            "OUTPUT_RASTER": outputRaster,
+            "OUTPUT_JSON": outputJsonPath,
+        }
+
+    def buildSlicing(
+        self,
+        inputRaster,
+        geoBoundsLyr,
+        geoBoundsSource,
+        areaWithoutInformationLyr,
+        waterBodiesLyr,
+        threshold,
+        tileSize,
+        nProcesses,
+        outputRaster,
+        vsimemFolder,
+        algRunner,
+        context,
+        multiStepFeedback,
+    ):
         currentStep = 0
         multiStepFeedback.setCurrentStep(currentStep)
-
         bufferedBounds = algRunner.runBuffer(
-            inputLayer=parameters[self.GEOGRAPHIC_BOUNDARY],
+            inputLayer=geoBoundsLyr,
             distance=1e-2 if geoBoundsSource.sourceCrs().isGeographic() else 1110,
             context=context,
             feedback=multiStepFeedback,
@@ -145,82 +232,121 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
         clippedRasterWithBufferedBounds = self.runClipRasterLayer(
             inputRaster,
             mask=bufferedBounds,
-            context=context,
-            feedback=multiStepFeedback,
             noData=-9999,
-            outputRaster=QgsProcessingUtils.generateTempFilename(
-                f"clipped_with_bounds_{str(uuid4().hex)}.tif"
-            ),
+            outputRaster=f"{vsimemFolder}/clipped_with_bounds.tif",
         )
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
-        rasterAfterMedianFilter = QgsProcessingUtils.generateTempFilename(
-            f"median_raster_{str(uuid4().hex)}.tif"
-        )
-        self.buildRasterWithMedianFilter(
-            inputRaster=clippedRasterWithBufferedBounds,
-            outputRaster=rasterAfterMedianFilter,
-        )
+        # o raster filtrado tem a mesma grade do raster recortado com o buffer, então
+        # a grade do recorte final já é conhecida e as máscaras podem ser
+        # rasterizadas enquanto o filtro da mediana é executado
+        clipGrid = self.runClipRasterLayer(
+            clippedRasterWithBufferedBounds,
+            mask=geoBoundsLyr,
+            noData=-9999,
+            outputRaster=f"{vsimemFolder}/clip_grid.vrt",
+            outputFormat="VRT",
+        )
+        maskFeaturesList = [
+            self.writeMaskFeatures(vectorLyr, f"{vsimemFolder}/{maskName}.geojson")
+            for vectorLyr, maskName in (
+                (areaWithoutInformationLyr, "area_without_information"),
+                (waterBodiesLyr, "water_body"),
+            )
+        ]
+        rasterAfterMedianFilter = f"{vsimemFolder}/median_raster.tif"
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+            maskFutures = [
+                executor.submit(
+                    self.buildNodataMaskRaster,
+                    clipGrid,
+                    maskFeatures,
+                    f"{vsimemFolder}/mask_{i}.tif",
+                )
+                for i, maskFeatures in enumerate(maskFeaturesList)
+            ]
+            self.buildRasterWithMedianFilter(
+                inputRaster=clippedRasterWithBufferedBounds,
+                outputRaster=rasterAfterMedianFilter,
+                tileSize=tileSize,
+                nProcesses=nProcesses,
+            )
+            maskRasterList = [future.result() for future in maskFutures]
 
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
         clippedRaster = self.runClipRasterLayer(
             rasterAfterMedianFilter,
-            mask=parameters[self.GEOGRAPHIC_BOUNDARY],
-            context=context,
-            feedback=multiStepFeedback,
+            mask=geoBoundsLyr,
             noData=-9999,
-            outputRaster=QgsProcessingUtils.generateTempFilename(
-                f"clip_{str(uuid4().hex)}.tif"
-            ),
-        )
-        currentStep += 1
-
-        clippedRasterLyr = QgsProcessingUtils.mapLayerFromString(clippedRaster, context)
-
-        multiStepFeedback.setCurrentStep(currentStep)
-        areaWithoutInformationNpArray = self.buildNumpyNodataMask(
-            rasterLyr=clippedRasterLyr, vectorLyr=areaWithoutInformationLyr
-        )
-        currentStep += 1
-
-        multiStepFeedback.setCurrentStep(currentStep)
-        waterBodyNpArray = self.buildNumpyNodataMask(
-            rasterLyr=clippedRasterLyr, vectorLyr=waterBodiesLyr
+            outputRaster=f"{vsimemFolder}/clip.tif",
         )
         currentStep += 1
 
         multiStepFeedback.setCurrentStep(currentStep)
+        if tileSize > 0:
+            return self.findSlicingThresholdDictByBlocks(
+                clippedRaster,
+                outputRaster,
+                maskRasterList,
+                threshold,
+                tileSize,
+                feedback=multiStepFeedback,
+            )
+        areaWithoutInformationNpArray, waterBodyNpArray = [
+            self.buildNumpyNodataMask(maskRaster) for maskRaster in maskRasterList
+        ]
         slicingThresholdDict, npRaster, ds = self.findSlicingThresholdDict(
-            clippedRaster, areaWithoutInformationNpArray, waterBodyNpArray, threshold
+            clippedRaster,
+            areaWithoutInformationNpArray,
+            waterBodyNpArray,
+            threshold,
         )
 
         self.writeOutputRaster(outputRaster, npRaster, ds)
-
-        currentStep += 1
-
-        with open(outputJsonPath, "w") as f:
-            f.write(json.dumps(slicingThresholdDict))
-
-        return {
-            "OUTPUT_RASTER": outputRaster,
-            "OUTPUT_JSON": outputJsonPath,
-        }
+        return slicingThresholdDict
 
     def writeOutputRaster(self, outputRaster, npRaster, ds, outputType=gdal.GDT_Int32):
-        driver = gdal.GetDriverByName("GTiff")
-        out_ds = driver.Create(
-            outputRaster, npRaster.shape[1], npRaster.shape[0], 1, outputType
+        out_ds = self.createOutputRaster(
+            outputRaster, npRaster.shape[1], npRaster.shape[0], ds, outputType
         )
-        out_ds.SetProjection(ds.GetProjection())
-        out_ds.SetGeoTransform(ds.GetGeoTransform())
-        out_ds.GetRasterBand(1).SetNoDataValue(-9999)
         band = out_ds.GetRasterBand(1)
         band.WriteArray(npRaster)
         band.FlushCache()
         band.ComputeStatistics(False)
         out_ds = None
 
+    def createOutputRaster(
+        self, outputRaster, xSize, ySize, ds, outputType=gdal.GDT_Int32
+    ):
+        driver = gdal.GetDriverByName("GTiff")
+        out_ds = driver.Create(outputRaster, xSize, ySize, 1, outputType)
+        out_ds.SetProjection(ds.GetProjection())
+        out_ds.SetGeoTransform(ds.GetGeoTransform())
+        out_ds.GetRasterBand(1).SetNoDataValue(-9999)
+        return out_ds
+
+    def iterateBlockWindows(self, xSize, ySize, tileSize, halo=0, tileHeight=None):
+        """
+        Yields the (xOff, yOff, xSize, ySize) window of each tile of a raster and
+        the window to be read, which is the tile grown by halo pixels inside the
+        raster bounds. Tiles are squares unless tileHeight is given.
+        """
+        tileHeight = tileSize if tileHeight is None else tileHeight
+        for yOff in range(0, ySize, tileHeight):
+            for xOff in range(0, xSize, tileSize):
+                tileXSize = min(tileSize, xSize - xOff)
+                tileYSize = min(tileHeight, ySize - yOff)
+                readXOff = max(xOff - halo, 0)
+                readYOff = max(yOff - halo, 0)
+                readWindow = (
+                    readXOff,
+                    readYOff,
+                    min(xOff + tileXSize + halo, xSize) - readXOff,
+                    min(yOff + tileYSize + halo, ySize) - readYOff,
+                )
+                yield (xOff, yOff, tileXSize, tileYSize), readWindow
+
     def findSlicingThresholdDict(
         self, inputRaster, areaWithoutInformationNpArray, waterBodyNpArray, threshold
     ):
@@ -233,24 +359,149 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
             npRaster + areaWithoutInformationNpArray + waterBodyNpArray
         )  # performs clipping in raster
         npRaster_without_nodata = npRaster[~np.isnan(npRaster)]  # removes nodata values
-        minValue = np.amin(npRaster_without_nodata) // 1
-        maxValue = np.amax(npRaster_without_nodata) // 1
-        if minValue == 0 and maxValue > 2:
-            minValue = 1
+        histogram = self.buildHistogram(npRaster_without_nodata)
+        minValue, maxValue = self.getMinAndMaxValues(histogram)
         classDict, outputRaster = self.compute_slicing(
-            npRaster, npRaster_without_nodata, minValue, maxValue, threshold
+            npRaster, histogram, minValue, maxValue, threshold
         )
 
         return classDict, outputRaster, ds
 
+    def findSlicingThresholdDictByBlocks(
+        self, inputRaster, outputRaster, maskRasterList, threshold, tileSize, feedback
+    ):
+        """
+        Same as findSlicingThresholdDict followed by writeOutputRaster, but reading
+        the raster tile by tile. The first pass accumulates the elevation histogram
+        of the tiles and the second one classifies each tile and writes it to the
+        output raster, so the memory usage depends on the tile size only. Returns None
+        when canceled.
+        """
+        ds = gdal.Open(inputRaster)
+        band = ds.GetRasterBand(1)
+        maskDsList = [gdal.Open(mask) for mask in maskRasterList if mask is not None]
+        windowList = [
+            window
+            for window, _ in self.iterateBlockWindows(
+                ds.RasterXSize, ds.RasterYSize, tileSize
+            )
+        ]
+        step = 50 / len(windowList)
+        histogram = (np.array([], dtype=int), np.array([], dtype=np.int64))
+        for current, window in enumerate(windowList):
+            if feedback is not None and feedback.isCanceled():
+                return None
+            npRaster = self.readMaskedBlock(band, maskDsList, window)
+            histogram = self.mergeHistograms(
+                histogram, self.buildHistogram(npRaster[~np.isnan(npRaster)])
+            )
+            if feedback is not None:
+                feedback.setProgress(current * step)
+        minValue, maxValue = self.getMinAndMaxValues(histogram)
+        threshold, classDict = self.computeSlicingClasses(histogram, minValue, maxValue)
+        out_ds = self.createOutputRaster(
+            outputRaster, ds.RasterXSize, ds.RasterYSize, ds
+        )
+        outBand = out_ds.GetRasterBand(1)
+        for current, window in enumerate(windowList):
+            if feedback is not None and feedback.isCanceled():
+                # o raster parcialmente classificado não é retornado
+                out_ds = None
+                return None
+            npRaster = self.readMaskedBlock(band, maskDsList, window)
+            outBand.WriteArray(
+                self.classifyRaster(npRaster, classDict, threshold),
+                window[0],
+                window[1],
+            )
+            if feedback is not None:
+                feedback.setProgress(50 + current * step)
+        outBand.FlushCache()
+        outBand.ComputeStatistics(False)
+        out_ds = None
+        return classDict
+
+    def readMaskedBlock(self, band, maskDsList, window):
+        """
+        Reads a window of the DEM band as a float array with nan on nodata values
+        and on the pixels burned on the masks.
+        """
+        xOff, yOff, xSize, ySize = window
+        npRaster = band.ReadAsArray(xOff, yOff, xSize, ySize).astype(float)
+        npRaster[npRaster < 0] = np.nan
+        for maskDs in maskDsList:
+            # o raster de máscara pode ter uma linha ou coluna a menos que o MDE
+            maskXSize = max(min(xSize, maskDs.RasterXSize - xOff), 0)
+            maskYSize = max(min(ySize, maskDs.RasterYSize - yOff), 0)
+            if maskXSize == 0 or maskYSize == 0:
+                continue
+            maskBlock = maskDs.GetRasterBand(1).ReadAsArray(
+                xOff, yOff, maskXSize, maskYSize
+            )
+            npRaster[:maskYSize, :maskXSize][maskBlock == 255] = np.nan
+        return npRaster
+
+    def buildHistogram(self, npRaster_without_nodata):
+        """
+        Returns the unique floored elevation values and their pixel counts.
+        """
+        return np.unique(
+            np.floor(npRaster_without_nodata).astype(int), return_counts=True
+        )
+
+    def mergeHistograms(self, histogram, otherHistogram):
+        values = np.concatenate([histogram[0], otherHistogram[0]])
+        counts = np.concatenate([histogram[1], otherHistogram[1]])
+        uniqueValues, inverse = np.unique(values, return_inverse=True)
+        return uniqueValues, np.bincount(inverse, weights=counts).astype(np.int64)
+
+    def binHistogram(self, histogram, threshold):
+        """
+        Groups the histogram of floored elevations into bins of threshold meters.
+        The histogram values are sorted, so the bins are contiguous runs of it.
+        """
+        binnedValues = threshold * np.floor_divide(histogram[0], threshold)
+        binStarts = np.flatnonzero(np.r_[True, binnedValues[1:] != binnedValues[:-1]])
+        return binnedValues[binStarts], np.add.reduceat(histogram[1], binStarts)
+
+    def getBinnedHistogram(self, histogram, threshold, binnedHistogramDict):
+        """
+        Returns the bin values, the cumulative area percentage and the area
+        percentage of each bin of threshold meters, computed once per threshold
+        and kept on binnedHistogramDict.
+        """
+        if threshold not in binnedHistogramDict:
+            uniqueValues, uniqueCount = self.binHistogram(histogram, threshold)
+            validPixelCount = histogram[1].sum()
+            binnedHistogramDict[threshold] = (
+                uniqueValues,
+                np.cumsum(uniqueCount) / validPixelCount,
+                uniqueCount / validPixelCount,
+            )
+        return binnedHistogramDict[threshold]
+
+    def getMinAndMaxValues(self, histogram):
+        minValue, maxValue = histogram[0][0], histogram[0][-1]
+        if minValue == 0 and maxValue > 2:
+            minValue = 1
+        return minValue, maxValue
+
     def compute_slicing(
         self,
         npRaster,
-        npRaster_without_nodata,
+        histogram,
         minValue,
         maxValue,
         threshold,
         numberOfElevationBands=None,
+    ):
+        threshold, classDict = self.computeSlicingClasses(
+            histogram, minValue, maxValue, numberOfElevationBands
+        )
+        return classDict, self.classifyRaster(npRaster, classDict, threshold)
+
+    def computeSlicingClasses(
+        self, histogram, minValue, maxValue, numberOfElevationBands=None
     ):
         numberOfElevationBands = (
             self.getNumberOfElevationBands(maxValue - minValue)
@@ -258,12 +509,14 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
             else numberOfElevationBands
         )
         threshold = 10 if numberOfElevationBands > 2 else 1
+        # as buscas de limiares reaproveitam o histograma agrupado de cada intervalo
+        binnedHistogramDict = dict()
         threshold, classDict = self.computeClassDict(
             threshold,
-            npRaster,
-            npRaster_without_nodata,
+            histogram,
             minValue,
             numberOfElevationBands,
+            binnedHistogramDict,
         )
         if any(abs(b - a) < 10 for _, (a, b) in classDict.items()):
             currentNumberOfElevationBands = numberOfElevationBands - 1
@@ -274,10 +527,10 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
             ):
                 newThreshold, newClassDict = self.computeClassDict(
                     threshold,
-                    npRaster,
-                    npRaster_without_nodata,
+                    histogram,
                     minValue,
                     currentNumberOfElevationBands,
+                    binnedHistogramDict,
                 )
                 if newClassDict == classDict and newThreshold == threshold:
                     classDict = newClassDict
@@ -286,7 +539,18 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
                 else:
                     classDict = newClassDict
                     threshold = newThreshold
+        if len(classDict) == 1 and threshold != 1:
+            # com uma única classe, tenta novamente com intervalo de 1 metro
+            threshold, classDict = self.computeClassDict(
+                1,
+                histogram,
+                minValue,
+                numberOfElevationBands,
+                binnedHistogramDict,
+            )
+        return threshold, classDict
 
+    def classifyRaster(self, npRaster, classDict, threshold):
         outputRaster = np.zeros_like(npRaster, dtype=np.int32)
         outputRaster[np.isnan(npRaster)] = -9999
         for i, (minB, maxB) in classDict.items():
@@ -296,35 +560,27 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
                 outputRaster[
                     np.where((minB < npRaster) & (npRaster <= maxB + threshold))
                 ] = int(i)
-        return classDict, outputRaster
+        return outputRaster
 
     def computeClassDict(
         self,
         threshold,
-        npRaster,
-        npRaster_without_nodata,
+        histogram,
         minValue,
         numberOfElevationBands,
+        binnedHistogramDict=None,
     ):
-        npRaster_without_nodata = threshold * np.floor(
-            npRaster_without_nodata / threshold
-        ).astype(int)
-        nodataRasterPixelCount = np.count_nonzero(np.isnan(npRaster))
+        binnedHistogramDict = (
+            dict() if binnedHistogramDict is None else binnedHistogramDict
+        )
         if numberOfElevationBands == 2 and threshold != 1:
             threshold = 1
-            npRaster_without_nodata = threshold * np.floor(
-                npRaster[~np.isnan(npRaster)] / threshold
-            ).astype(int)
         areaRatioList = self.getAreaRatioList(numberOfElevationBands)
-        uniqueValues, uniqueCount = np.unique(
-            npRaster_without_nodata, return_counts=True
-        )
-        cumulativePercentage = np.cumsum(uniqueCount) / (
-            npRaster.shape[0] * npRaster.shape[1] - nodataRasterPixelCount
-        )
-        areaPercentageValues = uniqueCount / (
-            npRaster.shape[0] * npRaster.shape[1] - nodataRasterPixelCount
-        )
+        (
+            uniqueValues,
+            cumulativePercentage,
+            areaPercentageValues,
+        ) = self.getBinnedHistogram(histogram, threshold, binnedHistogramDict)
         if any(areaPercentageValues >= 0.48):
             """
             The MTM spec states that if there is an elevation slice that covers more than
@@ -332,19 +588,11 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
             """
             if numberOfElevationBands > 2:
                 threshold = 1
-                npRaster_without_nodata = threshold * np.floor(
-                    npRaster[~np.isnan(npRaster)] / threshold
-                ).astype(int)
-                areaRatioList = self.getAreaRatioList(numberOfElevationBands)
-                uniqueValues, uniqueCount = np.unique(
-                    npRaster_without_nodata, return_counts=True
-                )
-                cumulativePercentage = np.cumsum(uniqueCount) / (
-                    npRaster.shape[0] * npRaster.shape[1] - nodataRasterPixelCount
-                )
-                areaPercentageValues = uniqueCount / (
-                    npRaster.shape[0] * npRaster.shape[1] - nodataRasterPixelCount
-                )
+                (
+                    uniqueValues,
+                    cumulativePercentage,
+                    areaPercentageValues,
+                ) = self.getBinnedHistogram(histogram, threshold, binnedHistogramDict)
             idx = np.argmax(cumulativePercentage >= 0.5)
             if idx == 0:
                 classDict = {
@@ -398,90 +646,150 @@ class BuildElevationDiagram(QgsProcessingAlgorithm):
             return 4
 
     def runClipRasterLayer(
-        self, inputRaster, mask, context, feedback=None, outputRaster=None, noData=None
+        self, inputRaster, mask, outputRaster, noData=None, outputFormat="GTiff"
     ):
-        outputRaster = "TEMPORARY_OUTPUT" if outputRaster is None else outputRaster
-        output = processing.run(
-            "gdal:cliprasterbymasklayer",
-            {
-                "INPUT": inputRaster,
-                "MASK": mask,
-                "SOURCE_CRS": None,
-                "TARGET_CRS": None,
-                "TARGET_EXTENT": None,
-                "NODATA": noData,
-                "ALPHA_BAND": False,
-                "CROP_TO_CUTLINE": True,
-                "KEEP_RESOLUTION": False,
-                "SET_RESOLUTION": False,
-                "X_RESOLUTION": None,
-                "Y_RESOLUTION": None,
-                "MULTITHREADING": False,
-                "OPTIONS": "",
-                "DATA_TYPE": 0,
-                "EXTRA": "",
-                "OUTPUT": outputRaster,
-            },
-            # context=context,
-            feedback=feedback,
-        )
-        return output["OUTPUT"]
-
-    def buildRasterWithMedianFilter(self, inputRaster, outputRaster):
-        ds = gdal.Open(inputRaster)
-        npRaster = np.array(ds.GetRasterBand(1).ReadAsArray())
-        npRaster = signal.medfilt2d(npRaster, kernel_size=15)
-        self.writeOutputRaster(outputRaster, npRaster, ds, outputType=gdal.GDT_Float32)
+        """
+        Clips inputRaster with the polygons of mask, cropping it to their extent. The
+        mask is written as a GeoJSON next to outputRaster, so both can live on a
+        /vsimem/ folder.
+        """
+        maskPath = f"{outputRaster}_mask.geojson"
+        self.writeVectorLayer(mask, maskPath, "GeoJSON")
+        gdal.Warp(
+            outputRaster,
+            inputRaster,
+            format=outputFormat,
+            cutlineDSName=maskPath,
+            cropToCutline=True,
+            dstNodata=noData,
+        )
+        return outputRaster
 
-    def buildNumpyNodataMask(self, rasterLyr, vectorLyr):
-        _out = QgsProcessingUtils.generateTempFilename(f"clip_{str(uuid4().hex)}.tif")
-        _temp_in = QgsProcessingUtils.generateTempFilename(
-            f"feats_{str(uuid4().hex)}.shp"
+    def writeVectorLayer(self, vectorLyr, outputPath, driverName):
+        save_options = QgsVectorFileWriter.SaveVectorOptions()
+        save_options.driverName = driverName
+        save_options.fileEncoding = "UTF-8"
+        transform_context = QgsProject.instance().transformContext()
+        return QgsVectorFileWriter.writeAsVectorFormatV3(
+            vectorLyr, outputPath, transform_context, save_options
         )
 
-        NoData_value = -9999
-        x_res = rasterLyr.rasterUnitsPerPixelX()
-        y_res = rasterLyr.rasterUnitsPerPixelY()
-        x_min, y_min, x_max, y_max = rasterLyr.extent().toRectF().getCoords()
+    def buildRasterWithMedianFilter(
+        self, inputRaster, outputRaster, tileSize=0, nProcesses=1
+    ):
+        ds = gdal.Open(inputRaster)
+        if tileSize <= 0 and nProcesses <= 1:
+            npRaster = np.array(ds.GetRasterBand(1).ReadAsArray())
+            npRaster = signal.medfilt2d(npRaster, kernel_size=self.MEDIAN_KERNEL_SIZE)
+            self.writeOutputRaster(
+                outputRaster, npRaster, ds, outputType=gdal.GDT_Float32
+            )
+            return
+        # cada bloco é lido com uma borda de meio kernel para que o filtro seja
+        # igual ao aplicado no raster inteiro. Sem tamanho de bloco, o raster é
+        # dividido em uma faixa de linhas por processo
+        windowList = list(
+            self.iterateBlockWindows(
+                ds.RasterXSize,
+                ds.RasterYSize,
+                tileSize if tileSize > 0 else ds.RasterXSize,
+                halo=self.MEDIAN_KERNEL_SIZE // 2,
+                tileHeight=None
+                if tileSize > 0
+                else math.ceil(ds.RasterYSize / nProcesses),
+            )
+        )
+        band = ds.GetRasterBand(1)
+        out_ds = self.createOutputRaster(
+            outputRaster, ds.RasterXSize, ds.RasterYSize, ds, gdal.GDT_Float32
+        )
+        outBand = out_ds.GetRasterBand(1)
+        medianFilter = partial(signal.medfilt2d, kernel_size=self.MEDIAN_KERNEL_SIZE)
+        if nProcesses <= 1:
+            for window, readWindow in windowList:
+                self.writeBlockCore(
+                    outBand,
+                    medianFilter(band.ReadAsArray(*readWindow)),
+                    window,
+                    readWindow,
+                )
+        else:
+            # no máximo dois blocos por processo ficam em memória
+            chunkSize = 2 * nProcesses
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=nProcesses,
+                mp_context=ProcessingUtils().getSpawnContext(),
+            ) as executor:
+                for chunkStart in range(0, len(windowList), chunkSize):
+                    chunk = windowList[chunkStart : chunkStart + chunkSize]
+                    filteredBlocks = executor.map(
+                        medianFilter,
+                        [band.ReadAsArray(*readWindow) for _, readWindow in chunk],
+                    )
+                    for (window, readWindow), npRaster in zip(chunk, filteredBlocks):
+                        self.writeBlockCore(outBand, npRaster, window, readWindow)
+        outBand.FlushCache()
+        outBand.ComputeStatistics(False)
+        out_ds = None
 
-        # 4. Create Target - TIFF
-        cols = int((x_max - x_min) / x_res)
-        rows = int((y_max - y_min) / y_res)
+    def writeBlockCore(self, outBand, npRaster, window, readWindow):
+        """
+        Writes the part of a block read with a halo that belongs to its window.
+        """
+        xOff, yOff, xSize, ySize = window
+        readXOff, readYOff = readWindow[0], readWindow[1]
+        outBand.WriteArray(
+            npRaster[
+                yOff - readYOff : yOff - readYOff + ySize,
+                xOff - readXOff : xOff - readXOff + xSize,
+            ],
+            xOff,
+            yOff,
+        )
+
+    def buildNumpyNodataMask(self, maskRaster):
+        ds = gdal.Open(maskRaster)
+        npRaster = np.array(ds.GetRasterBand(1).ReadAsArray(), dtype=float)
+        ds = None
+        npRaster[npRaster == 255.0] = np.nan
+        return npRaster
 
+    def writeMaskFeatures(self, vectorLyr, outputPath):
+        """
+        Writes the features to be burned on a nodata mask and returns their path, or
+        None if there are no features.
+        """
+        if vectorLyr is None or vectorLyr.featureCount() == 0:
+            return None
+        self.writeVectorLayer(vectorLyr, outputPath, "GeoJSON")
+        return outputPath
+
+    def buildNodataMaskRaster(self, gridRaster, maskFeatures, outputRaster):
+        """
+        Rasterizes the features on maskFeatures on the grid of gridRaster, burning
+        255 on the covered pixels, and returns outputRaster. Only GDAL is used, so it
+        can run outside the main thread.
+        """
+        NoData_value = -9999
+        ds = gdal.Open(gridRaster)
         _raster = gdal.GetDriverByName("GTiff").Create(
-            _out, cols, rows, 1, gdal.GDT_Byte
+            outputRaster, ds.RasterXSize, ds.RasterYSize, 1, gdal.GDT_Byte
         )
-        _raster.SetGeoTransform((x_min, x_res, 0, y_max, 0, -y_res))
+        _raster.SetGeoTransform(ds.GetGeoTransform())
+        ds = None
         _band = _raster.GetRasterBand(1)
         _band.SetNoDataValue(NoData_value)
 
-        if vectorLyr is None or vectorLyr.featureCount() == 0:
+        if maskFeatures is None:
             _raster = None
-            ds = gdal.Open(_out)
-            npRaster = np.array(ds.GetRasterBand(1).ReadAsArray())
-            ds = None
-            return npRaster
+            return outputRaster
 
-        save_options = QgsVectorFileWriter.SaveVectorOptions()
-        save_options.driverName = "ESRI Shapefile"
-        save_options.fileEncoding = "UTF-8"
-        transform_context = QgsProject.instance().transformContext()
-        error = QgsVectorFileWriter.writeAsVectorFormatV3(
-            vectorLyr, _temp_in, transform_context, save_options
-        )
-
-        # 3. Open Shapefile
-        driver = ogr.GetDriverByName("ESRI Shapefile")
-        source_ds = driver.Open(_temp_in, 0)
+        source_ds = ogr.Open(maskFeatures, 0)
         source_layer = source_ds.GetLayer()
 
         gdal.RasterizeLayer(_raster, [1], source_layer, burn_values=[255.0])
         _raster = None
-        ds = gdal.Open(_out)
-        npRaster = np.array(ds.GetRasterBand(1).ReadAsArray(), dtype=float)
-        ds = None
-        npRaster[npRaster == 255.0] = np.nan
-        return npRaster
+        return outputRaster
 
     def tr(self, string):
         return QCoreApplication.translate("BuildElevationDiagram", string)
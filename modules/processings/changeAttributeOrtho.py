@@ -8,7 +8,7 @@ from qgis.core import (
     QgsVectorLayer,
 )
 from qgis.PyQt.QtCore import QCoreApplication
-from .processingUtils import ProcessingUtils
+from .processingUtils import EMPTY_TEXT_EDICAO_SQL, ProcessingUtils
 import concurrent.futures
 import os
 
@@ -18,6 +18,83 @@ class ChangeAttributeOrtho(QgsProcessingAlgorithm):
     INPUT_LAYER_LIST = "INPUT_LAYER"
     SCALE = "SCALE"
 
+    # regras equivalentes às funções default que não dependem da geometria, executadas
+    # no banco quando a camada é do PostGIS
+    defaultRules = {
+        "defaultExtMineral": [
+            (None, {"justificativa_txt": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE tipo WHEN 1 THEN 'Poço' WHEN 4 THEN 'Pedreira'"
+                    " WHEN 5 THEN 'Garimpo' WHEN 6 THEN 'Salina' WHEN 8 THEN 'Petróleo'"
+                    " ELSE texto_edicao END"
+                },
+            ),
+        ],
+        "defaultElemnatElemHidPL": [
+            (None, {"justificativa_txt": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE WHEN nome = '' THEN CASE tipo"
+                    " WHEN 9 THEN 'Cachoreira' WHEN 10 THEN 'Salto'"
+                    " WHEN 11 THEN 'Catarata' WHEN 12 THEN 'Corredeira'"
+                    " ELSE texto_edicao END ELSE nome END"
+                },
+            ),
+        ],
+        "defaultElemnatElemHidA": [
+            (None, {"justificativa_txt": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {"texto_edicao": "CASE WHEN nome = '' THEN 'Corredeira' ELSE nome END"},
+            ),
+        ],
+        "defaultIlhaP": [
+            (None, {"tamanho_txt": "7", "justificativa_txt": "2"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultPtoCotado": [
+            (None, {"visivel": "1", "ancora_vertical": "1", "ancora_horizontal": "1"})
+        ],
+        "defaultTSI": [(None, {"visivel": "1"})],
+        "defaultElemnatTopoFisioP": [
+            (None, {"visivel": "1", "justificativa_txt": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultElemnatTopoFisioL": [
+            (None, {"visivel": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultInfraElemEnergPA": [
+            (None, {"visivel": "1", "justificativa_txt": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "'Subestação'"}),
+        ],
+        "defaultInfraElemEnergL": [(None, {"visivel": "1"})],
+        "defaultInfraElemInfra": [
+            (None, {"justificativa_txt": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "'Atracadouro'"}),
+        ],
+        "defaultEdicao": [(None, {"visivel": "1", "exibir_rotulo_aproximado": "1"})],
+        "defaultCurvaNivel": [
+            (None, {"visivel": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE WHEN cota = 0 THEN 'ZERO'"
+                    " WHEN cota < 0 THEN 'MENOS ' || abs(cota) ELSE cota::text END"
+                },
+            ),
+        ],
+        "defaultFerrovia": [(None, {"visivel": "1"})],
+        "defaultViaDesloc": [(None, {"visivel": "1"})],
+        "defaultllpLocalidade": [
+            (None, {"justificativa_txt": "2", "visivel": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+    }
+
     def initAlgorithm(self, config=None):
         self.addParameter(
             QgsProcessingParameterMultipleLayers(
@@ -149,12 +226,16 @@ class ChangeAttributeOrtho(QgsProcessingAlgorithm):
         else:
             return
 
-        layer.startEditing()
-        layer.beginEditCommand("Atualizando atributos")
+        rules = self.defaultRules.get(processing_function.__name__)
+        if rules is not None and ProcessingUtils().runAttributeRulesOnPostgis(
+            layer, rules
+        ):
+            return
+
         lyrCrs = layer.dataProvider().crs()
-        update_func = lambda x: layer.updateFeature(processing_function(x, lyrCrs))
-        list(map(update_func, layer.getFeatures()))
-        layer.endEditCommand()
+        ProcessingUtils().writeChangedAttributes(
+            layer, layer.getFeatures(), lambda x: processing_function(x, lyrCrs)
+        )
 
     def defaultExtMineral(self, feature, lyrCrs):
         feature["justificativa_txt"] = 1
@@ -348,7 +429,7 @@ class ChangeAttributeOrtho(QgsProcessingAlgorithm):
         if feature["cota"] == 0:
             feature["texto_edicao"] = "ZERO"
         elif feature["cota"] < 0:
-            feature["texto_edicao"] = "MENOS " + feature["cota"]
+            feature["texto_edicao"] = "MENOS " + str(abs(feature["cota"]))
         else:
             feature["texto_edicao"] = feature["cota"]
         return feature
@@ -5,18 +5,144 @@ from qgis.core import (
     QgsProcessingParameterEnum,
     NULL,
     QgsProcessingMultiStepFeedback,
+    QgsProcessingParameterNumber,
     QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+    QgsFeatureRequest,
 )
 from qgis.PyQt.QtCore import QCoreApplication
-from .processingUtils import ProcessingUtils
+from .processingUtils import EMPTY_TEXT_EDICAO_SQL, ProcessingUtils
 import concurrent.futures
-import os
 
 
 class ChangeAttributeTopo(QgsProcessingAlgorithm):
 
     INPUT_LAYER_LIST = "INPUT_LAYER"
     SCALE = "SCALE"
+    N_THREADS = "N_THREADS"
+    # número de feições avaliadas por tarefa, para dividir camadas grandes entre as threads
+    featureChunkSize = 500
+
+    # regras equivalentes às funções default que não dependem da geometria, executadas
+    # no banco quando a camada é do PostGIS
+    defaultRules = {
+        "defaultExtMineral": [
+            (None, {"justificativa_txt": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE tipo WHEN 1 THEN 'Poço' WHEN 4 THEN 'Pedreira'"
+                    " WHEN 5 THEN 'Garimpo' WHEN 6 THEN 'Salina' WHEN 8 THEN 'Petróleo'"
+                    " ELSE texto_edicao END"
+                },
+            ),
+        ],
+        "defaultElemnatElemHidPL": [
+            (None, {"justificativa_txt": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE WHEN nome = '' THEN CASE tipo"
+                    " WHEN 9 THEN 'Cachoreira' WHEN 10 THEN 'Salto'"
+                    " WHEN 11 THEN 'Catarata' WHEN 12 THEN 'Corredeira'"
+                    " ELSE texto_edicao END ELSE nome END"
+                },
+            ),
+        ],
+        "defaultElemnatElemHidA": [
+            (None, {"justificativa_txt": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {"texto_edicao": "CASE WHEN nome = '' THEN 'Corredeira' ELSE nome END"},
+            ),
+        ],
+        "defaultIlhaP": [
+            (None, {"tamanho_txt": "7", "justificativa_txt": "2", "visivel": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultPtoCotado": [
+            (
+                None,
+                {
+                    "visivel": "1",
+                    "ancora_vertical": "1",
+                    "ancora_horizontal": "1",
+                    "suprimir_simbologia": "1",
+                },
+            )
+        ],
+        "defaultElemnatTopoFisioP": [
+            (None, {"justificativa_txt": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultElemnatTopoFisioL": [(EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"})],
+        "defaultInfraElemEnergPA": [
+            (None, {"visivel": "1", "justificativa_txt": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "'Subestação'"}),
+        ],
+        "defaultInfraElemEnergL": [(None, {"visivel": "1"})],
+        "defaultInfraElemInfra": [(None, {"justificativa_txt": "1"})],
+        "defaultEdicao": [(None, {"exibir_rotulo_aproximado": "1"})],
+        "defaultCurvaNivel": [
+            (None, {"visivel": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE WHEN cota = 0 THEN 'ZERO'"
+                    " WHEN cota < 0 THEN 'MENOS ' || abs(cota) ELSE cota::text END"
+                },
+            ),
+        ],
+        "defaultFerrovia": [(None, {"visivel": "1"})],
+        "defaultViaDesloc": [(None, {"visivel": "1"})],
+        "defaultDuto": [
+            (None, {"visivel": "1"}),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE tipo WHEN 302 THEN 'Óleo' WHEN 303 THEN 'Gasolina'"
+                    " WHEN 304 THEN 'Álcool' WHEN 305 THEN 'Querosene'"
+                    " WHEN 306 THEN 'Petróleo' WHEN 307 THEN 'Nafta' WHEN 308 THEN 'Gás'"
+                    " WHEN 309 THEN 'Efluentes' WHEN 310 THEN 'Esgoto'"
+                    " ELSE texto_edicao END"
+                },
+            ),
+        ],
+        "defaultVala": [(None, {"visivel": "1"})],
+        "defaultAreaUsoEspecifico": [
+            (None, {"visivel": "1", "justificativa_txt": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultllpLocalidade": [
+            (None, {"justificativa_txt": "2", "visivel": "1"}),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "nome"}),
+        ],
+        "defaultDeposito": [
+            (
+                None,
+                {"justificativa_txt": "2", "visivel": "1", "exibir_linha_rotulo": "2"},
+            ),
+            (
+                EMPTY_TEXT_EDICAO_SQL,
+                {
+                    "texto_edicao": "CASE WHEN nome IS NOT NULL THEN nome"
+                    " WHEN tipo = 109 THEN 'Silo' ELSE texto_edicao END"
+                },
+            ),
+        ],
+        "defaultElementoViario": [
+            (
+                None,
+                {
+                    "justificativa_txt": "2",
+                    "visivel": "1",
+                    "exibir_lado_simbologia": "1",
+                    "exibir_ponta_simbologia": "1",
+                },
+            ),
+            (EMPTY_TEXT_EDICAO_SQL, {"texto_edicao": "coalesce(nome, texto_edicao)"}),
+        ],
+    }
 
     def initAlgorithm(self, config=None):
         self.addParameter(
@@ -38,6 +164,15 @@ class ChangeAttributeTopo(QgsProcessingAlgorithm):
                 ],
             )
         )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.N_THREADS,
+                self.tr("Número de threads para calcular os atributos"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=1,
+            )
+        )
 
     def processAlgorithm(self, parameters, context, feedback):
         layer_list = self.parameterAsLayerList(
@@ -54,30 +189,69 @@ class ChangeAttributeTopo(QgsProcessingAlgorithm):
         elif gridScaleParam == 3:
             self.scale = 250000
 
+        nThreads = self.parameterAsInt(parameters, self.N_THREADS, context)
+
         stepSize = 100 / (len(layer_list))
-        multiStepFeedback = QgsProcessingMultiStepFeedback(2, feedback)
+        multiStepFeedback = QgsProcessingMultiStepFeedback(3, feedback)
         multiStepFeedback.setCurrentStep(0)
-        # multiStepFeedback.setProgressText("Submetendo tarefas para as threads")
-        # futures = set()
-        # pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() - 1)
-
-        for current, layer in enumerate(layer_list):
+        multiStepFeedback.setProgressText("Submetendo tarefas para as threads")
+        futures = dict()
+        layerChangeDict = dict()
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=nThreads)
+        # as tarefas pendentes são canceladas também quando uma delas falha
+        try:
+            for current, layer in enumerate(layer_list):
+                if multiStepFeedback.isCanceled():
+                    return {}
+                for future in self.process_layer(layer, pool):
+                    futures[future] = layer
+                multiStepFeedback.setProgress(current * stepSize)
+
+            multiStepFeedback.setCurrentStep(1)
+            multiStepFeedback.setProgressText("Calculando os atributos")
+            futureStepSize = 100 / len(futures) if futures else 0
+            for current, future in enumerate(concurrent.futures.as_completed(futures)):
+                if multiStepFeedback.isCanceled():
+                    return {}
+                layer = futures[future]
+                _, attributeChangeMap = layerChangeDict.setdefault(
+                    layer.id(), (layer, dict())
+                )
+                attributeChangeMap.update(future.result())
+                multiStepFeedback.setProgress(current * futureStepSize)
+        finally:
+            self.cancelFutures(pool, futures)
+
+        multiStepFeedback.setCurrentStep(2)
+        multiStepFeedback.setProgressText("Gravando os atributos")
+        for current, (layer, attributeChangeMap) in enumerate(layerChangeDict.values()):
             if multiStepFeedback.isCanceled():
                 return {}
-            self.process_layer(layer)
-            # futures.add(pool.submit(self.process_layer, layer))
+            ProcessingUtils().applyAttributeChanges(layer, attributeChangeMap)
             multiStepFeedback.setProgress(current * stepSize)
 
-        multiStepFeedback.setCurrentStep(1)
-        multiStepFeedback.setProgressText("Avaliando os resultados")
-        # for current, future in enumerate(concurrent.futures.as_completed(futures)):
-        #     if multiStepFeedback.isCanceled():
-        #         return {}
-        #     multiStepFeedback.setProgress(current * stepSize)
-
         return {}
 
-    def process_layer(self, layer: QgsVectorLayer):
+    def cancelFutures(self, pool, futures):
+        """
+        cancels the tasks that did not start yet and waits for the running ones
+        :param pool: (concurrent.futures.ThreadPoolExecutor) thread pool;
+        :param futures: (iterable) submitted tasks;
+        """
+        for future in futures:
+            future.cancel()
+        pool.shutdown()
+
+    def process_layer(self, layer: QgsVectorLayer, pool):
+        """
+        submits to the pool the computation of the default attributes of the layer.
+        The features are read from a QgsVectorLayerFeatureSource snapshot, split in
+        chunks of featureChunkSize features, so the geometry heavy layers are
+        spread among the threads. Returns the submitted futures, each one resolving
+        to a {featId: {fieldIdx: value}} map
+        :param layer: (QgsVectorLayer) layer to be updated;
+        :param pool: (concurrent.futures.ThreadPoolExecutor) thread pool;
+        """
 
         table_name = layer.dataProvider().uri().table()
 
@@ -154,14 +328,41 @@ class ChangeAttributeTopo(QgsProcessingAlgorithm):
         elif table_name in ["constr_ocupacao_solo_p", "constr_ocupacao_solo_a"]:
             processing_function = self.defaultOcupacaoSolo
         else:
-            return
+            return []
+
+        rules = self.defaultRules.get(processing_function.__name__)
+        if rules is not None and ProcessingUtils().runAttributeRulesOnPostgis(
+            layer, rules
+        ):
+            return []
 
-        layer.startEditing()
-        layer.beginEditCommand("Atualizando atributos")
         lyrCrs = layer.dataProvider().crs()
-        update_func = lambda x: layer.updateFeature(processing_function(x, lyrCrs))
-        list(map(update_func, layer.getFeatures()))
-        layer.endEditCommand()
+        source = QgsVectorLayerFeatureSource(layer)
+        featIds = sorted(layer.allFeatureIds())
+        return [
+            pool.submit(
+                self.computeAttributeChanges,
+                source,
+                featIds[i : i + self.featureChunkSize],
+                processing_function,
+                lyrCrs,
+            )
+            for i in range(0, len(featIds), self.featureChunkSize)
+        ]
+
+    def computeAttributeChanges(self, source, featIds, processing_function, lyrCrs):
+        """
+        runs on a worker thread and returns the attributes that processing_function
+        changes on the features featIds of the snapshot source
+        :param source: (QgsVectorLayerFeatureSource) snapshot of the layer;
+        :param featIds: (list) ids of the features to be evaluated;
+        :param processing_function: (function) default function of the layer;
+        :param lyrCrs: (QgsCoordinateReferenceSystem) crs of the layer;
+        """
+        request = QgsFeatureRequest().setFilterFids(featIds)
+        return ProcessingUtils().getAttributeChanges(
+            source.getFeatures(request), lambda x: processing_function(x, lyrCrs)
+        )
 
     def defaultExtMineral(self, feature, lyrCrs):
         feature["justificativa_txt"] = 1
@@ -350,7 +551,7 @@ class ChangeAttributeTopo(QgsProcessingAlgorithm):
         if feature["cota"] == 0:
             feature["texto_edicao"] = "ZERO"
         elif feature["cota"] < 0:
-            feature["texto_edicao"] = "MENOS " + feature["cota"]
+            feature["texto_edicao"] = "MENOS " + str(abs(feature["cota"]))
         else:
             feature["texto_edicao"] = feature["cota"]
         return feature
@@ -599,7 +800,7 @@ class ChangeAttributeTopo(QgsProcessingAlgorithm):
 
         return feature
 
-    def defaultOcupacaoSolo(self, feature):
+    def defaultOcupacaoSolo(self, feature, lyrCrs):
         feature["visivel"] = 1
         feature["justificativa_txt"] = 2
         if feature["nome"] != NULL:
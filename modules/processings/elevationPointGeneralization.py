@@ -1,14 +1,18 @@
 import concurrent.futures
 import math
-import os
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
 
+import numpy as np
 from qgis import processing
 from qgis.core import (
+    NULL,
     QgsCoordinateReferenceSystem,
-    QgsFeature,
+    QgsCoordinateTransform,
     QgsFeatureRequest,
     QgsFeatureSink,
     QgsGeometry,
+    QgsPoint,
     QgsPointXY,
     QgsProcessing,
     QgsProcessingAlgorithm,
@@ -16,7 +20,9 @@ from qgis.core import (
     QgsProcessingParameterEnum,
     QgsProcessingParameterFeatureSink,
     QgsProcessingParameterField,
+    QgsProcessingParameterNumber,
     QgsProcessingParameterVectorLayer,
+    QgsProject,
     QgsSpatialIndex,
 )
 from qgis.PyQt.QtCore import QCoreApplication
@@ -24,6 +30,65 @@ from qgis.PyQt.QtCore import QCoreApplication
 from .makeGrid import MakeGrid
 from .processingUtils import ProcessingUtils
 
+# dados carregados uma única vez em cada processo do modo multiprocesso
+workerData = dict()
+
+
+def initSummitOrBottomWorker(sharedMemoryName, nPoints, sobWkbList):
+    """
+    Attaches the shared point arrays and builds the prepared summit or bottom
+    geometries of a worker process.
+    """
+    sharedPoints = shared_memory.SharedMemory(name=sharedMemoryName)
+    workerData["sharedMemory"] = sharedPoints
+    workerData["points"] = np.ndarray(
+        (3, nPoints), dtype=np.float64, buffer=sharedPoints.buf
+    )
+    workerData["sobs"] = []
+    for wkb in sobWkbList:
+        geom = QgsGeometry()
+        geom.fromWkb(wkb)
+        engine = QgsGeometry.createGeometryEngine(geom.constGet())
+        engine.prepareGeometry()
+        workerData["sobs"].append((geom, engine, geom.boundingBox()))
+
+
+def findSummitOrBottomInBand(rowBand):
+    """
+    Runs the point in polygon tests of the points whose grid row is inside rowBand.
+    Returns the indexes of the points found inside a summit or bottom and the index
+    of the summit or bottom of each one.
+    """
+    rowStart, rowEnd = rowBand
+    x, y, row = workerData["points"]
+    inBand = np.flatnonzero((row >= rowStart) & (row < rowEnd))
+    bandX, bandY = x[inBand], y[inBand]
+    bandSobIdx = np.full(len(inBand), -1, dtype=np.int64)
+    if len(inBand) == 0:
+        return inBand, bandSobIdx
+    bandXMin, bandXMax = bandX.min(), bandX.max()
+    bandYMin, bandYMax = bandY.min(), bandY.max()
+    for sobIndex, (_, engine, bbox) in enumerate(workerData["sobs"]):
+        if (
+            bbox.xMaximum() < bandXMin
+            or bbox.xMinimum() > bandXMax
+            or bbox.yMaximum() < bandYMin
+            or bbox.yMinimum() > bandYMax
+        ):
+            continue
+        candidates = np.flatnonzero(
+            (bandSobIdx == -1)
+            & (bandX >= bbox.xMinimum())
+            & (bandX <= bbox.xMaximum())
+            & (bandY >= bbox.yMinimum())
+            & (bandY <= bbox.yMaximum())
+        )
+        for i in candidates:
+            if engine.contains(QgsPoint(bandX[i], bandY[i])):
+                bandSobIdx[i] = sobIndex
+    found = bandSobIdx >= 0
+    return inBand[found], bandSobIdx[found]
+
 
 class ElevationPointsGeneralization(QgsProcessingAlgorithm):
 
@@ -33,6 +98,7 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
     GEOGRAPHIC_BOUNDARY = "GEOGRAPHIC_BOUNDARY"
     INPUT_IS_DEPRESSION_FIELD = "INPUT_IS_DEPRESSION_FIELD"
     INPUT_IS_VISIBLE_FIELD = "INPUT_IS_VISIBLE_FIELD"
+    N_PROCESSES = "N_PROCESSES"
     OUTPUT = "OUTPUT"
 
     def initAlgorithm(self, config=None):
@@ -92,6 +158,17 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
                 defaultValue="visivel",
             )
         )
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.N_PROCESSES,
+                self.tr(
+                    "Número de processos para selecionar os pontos em cumes e depressões"
+                ),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=1,
+            )
+        )
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT, self.tr("Generalização de Ponto Cotado")
@@ -119,6 +196,7 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
         isVisibleField = self.parameterAsFields(
             parameters, "INPUT_IS_VISIBLE_FIELD", context
         )[0]
+        nProcesses = self.parameterAsInt(parameters, self.N_PROCESSES, context)
         geographicBoundaryLyr = self.parameterAsLayer(
             parameters, self.GEOGRAPHIC_BOUNDARY, context
         )
@@ -197,7 +275,7 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
         if multiStepFeedback is not None:
             multiStepFeedback.setCurrentStep(currentStep)
             multiStepFeedback.pushInfo(self.tr("Selecting summits or bottoms."))
-        sobIdDict, sobSpatialIdx = self.selectSummitsAndBottoms(
+        sobIdDict, _ = self.selectSummitsAndBottoms(
             countourLayer, feedback=multiStepFeedback
         )
         CRSstr = pointWithOriginalIdField.sourceCrs()
@@ -205,12 +283,10 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
         extentGeom = self.getExtentGeom(
             gridScaleParam, pointWithOriginalIdField, gridScale
         )
-        grid = self.makeGrid(
+        gridDefinition = self.getGridDefinition(
             extentGeom,
             CRSstr,
             gridScale,
-            parameters,
-            context,
             feedback=multiStepFeedback,
         )
         currentStep += 1
@@ -218,13 +294,16 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
             multiStepFeedback.setCurrentStep(currentStep)
             multiStepFeedback.pushInfo(self.tr("Generalizing points."))
         idDict, pointsIdsSelected = self.generalizePoint(
-            grid,
+            gridDefinition,
             pointWithOriginalIdField,
             sobIdDict,
-            sobSpatialIdx,
             isDepressionField,
+            nProcesses=nProcesses,
             feedback=multiStepFeedback,
         )
+        if len(idDict) == 0:
+            feedback.pushInfo(self.tr("There are no points to generalize."))
+            return {}
         currentStep += 1
         if multiStepFeedback is not None:
             multiStepFeedback.setCurrentStep(currentStep)
@@ -322,9 +401,9 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
         )
         return processOutputLyr["OUTPUT"]
 
-    def makeGrid(self, extentGeom, CRS, gridScale, parameters, context, feedback):
+    def getGridDefinition(self, extentGeom, CRS, gridScale, feedback):
         multiStepFeedback = (
-            QgsProcessingMultiStepFeedback(5, feedback)
+            QgsProcessingMultiStepFeedback(3, feedback)
             if feedback is not None
             else None
         )
@@ -350,30 +429,12 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
             QgsCoordinateReferenceSystem("EPSG:4326"),
             feedback=multiStepFeedback,
         )
-        if multiStepFeedback is not None:
-            multiStepFeedback.setCurrentStep(3)
-            multiStepFeedback.pushInfo(self.tr("Creating grid."))
         # Pegar centro da moldura  (se tiver mais de um polígono na camada de moldura pegar o centro dos centros)
         utm, gridSize, extent = self.getUtmGridAndExtent(gridScale, frameLayerForInput)
-        grid = processing.run(
-            "native:creategrid",
-            {
-                "TYPE": 2,
-                "EXTENT": extent,
-                "HSPACING": gridSize,
-                "VSPACING": gridSize,
-                "HOVERLAY": 0,
-                "VOVERLAY": 0,
-                "CRS": utm,
-                "OUTPUT": parameters["OUTPUT"],
-            },
-            feedback=multiStepFeedback,
-        )["OUTPUT"]
-        if multiStepFeedback is not None:
-            multiStepFeedback.setCurrentStep(4)
-            multiStepFeedback.pushInfo(self.tr("Reprojecting grid."))
-        reprojectGrid = self.reprojectLayer(grid, CRS, feedback=multiStepFeedback)
-        return reprojectGrid
+        # as células são contadas a partir do canto superior esquerdo do extent,
+        # como no native:creategrid
+        xmin, _, _, ymax = map(float, extent.split(","))
+        return {"crs": utm, "size": gridSize, "xmin": xmin, "ymax": ymax}
 
     def getUtmGridAndExtent(self, gridScale, frameLayerForInput):
         if frameLayerForInput.featureCount() > 1:
@@ -571,17 +632,15 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
 
     def generalizePoint(
         self,
-        grid,
+        gridDefinition,
         pointLayer,
         sobIdDict,
-        sobSpatialIdx,
         isDepressionField,
+        nProcesses=1,
         feedback=None,
     ):
-        isDep = 1
-        isNotDep = 2
         multiStepFeedback = (
-            QgsProcessingMultiStepFeedback(2, feedback)
+            QgsProcessingMultiStepFeedback(3, feedback)
             if feedback is not None
             else None
         )
@@ -593,76 +652,223 @@ class ElevationPointsGeneralization(QgsProcessingAlgorithm):
         spatialIdx, idDict = ProcessingUtils().buildSpatialIndexAndIdDict(
             inputLyr=pointLayer, feedback=multiStepFeedback
         )
-        selectedPointsSet = set()
         if len(idDict) == 0:
-            return {}
+            return {}, set()
+        pointIds, x, y, cota = self.getPointArrays(
+            idDict, pointLayer.crs(), gridDefinition["crs"]
+        )
         if multiStepFeedback is not None:
             multiStepFeedback.setCurrentStep(1)
+            multiStepFeedback.pushInfo(
+                self.tr("Finding points inside summits or bottoms.")
+            )
+        sobIdx = None
+        if (
+            nProcesses > 1
+            and len(sobIdDict) > 0
+            and ProcessingUtils().canStartProcesses()
+        ):
+            try:
+                sobIdx = self.findSummitOrBottomOfPointsInProcesses(
+                    idDict,
+                    gridDefinition,
+                    x,
+                    y,
+                    sobIdDict,
+                    nProcesses,
+                    feedback=multiStepFeedback,
+                )
+            except BrokenProcessPool:
+                if multiStepFeedback is not None:
+                    multiStepFeedback.pushInfo(
+                        self.tr(
+                            "A worker process was terminated, the points will be "
+                            "evaluated in a single process."
+                        )
+                    )
+        if sobIdx is None:
+            sobIdx = self.findSummitOrBottomOfPoints(
+                pointIds,
+                idDict,
+                spatialIdx,
+                sobIdDict,
+                feedback=multiStepFeedback,
+            )
+        # o índice -1 (fora de cume ou depressão) recebe o tipo do ponto mais alto
+        sobKind = np.append(
+            self.getSummitOrBottomKinds(sobIdDict, isDepressionField), 1
+        )[sobIdx]
+        if multiStepFeedback is not None:
+            if multiStepFeedback.isCanceled():
+                return idDict, set()
+            multiStepFeedback.setCurrentStep(2)
             multiStepFeedback.pushInfo(self.tr("Evaluating point features."))
+        selectedIdx = self.selectPointsByCell(
+            x, y, cota, sobIdx, sobKind, gridDefinition
+        )
+        return idDict, set(pointIds[selectedIdx].tolist())
 
-        def _select_points(feat: QgsFeature) -> set:
-            if multiStepFeedback is not None and multiStepFeedback.isCanceled():
-                return set()
-            pointsIdsSelectedinGrid = []
-            summitsOrBottomsPoints = {}
-            returnedIdsSet = set()
-            hasSoBPoints = False
-            roi = feat.geometry().boundingBox()
-            for pointId in spatialIdx.intersects(roi):
-                point = idDict[pointId]
-                for sobId in sobSpatialIdx.intersects(roi):
-                    SoB = sobIdDict[sobId]
-                    if not (point.geometry().within(SoB.geometry())):
-                        continue
-                    if SoB["id"] in summitsOrBottomsPoints.keys():
-                        if (SoB[isDepressionField] == isNotDep) and (
-                            summitsOrBottomsPoints[SoB["id"]]["cota"] < point["cota"]
-                        ):
-                            summitsOrBottomsPoints[SoB["id"]] = point
-                            hasSoBPoints = True
-                        if (SoB[isDepressionField] == isDep) and (
-                            summitsOrBottomsPoints[SoB["id"]]["cota"] > point["cota"]
-                        ):
-                            summitsOrBottomsPoints[SoB["id"]] = point
-                            hasSoBPoints = True
-                        break
-                    summitsOrBottomsPoints[SoB["id"]] = point
-                    hasSoBPoints = True
-                    pointsIdsSelectedinGrid = []
-                    break
+    def getPointArrays(self, idDict, pointCrs, gridCrs):
+        """
+        Returns the feature ids, the coordinates on the grid CRS and the elevation of
+        the points as numpy arrays, in the order of idDict.
+        """
+        transform = QgsCoordinateTransform(pointCrs, gridCrs, QgsProject.instance())
+        nPoints = len(idDict)
+        pointIds = np.fromiter(idDict.keys(), dtype=np.int64, count=nPoints)
+        x, y, cota = np.empty(nPoints), np.empty(nPoints), np.empty(nPoints)
+        for i, point in enumerate(idDict.values()):
+            pointXY = transform.transform(point.geometry().centroid().asPoint())
+            x[i], y[i] = pointXY.x(), pointXY.y()
+            cota[i] = point["cota"] if point["cota"] != NULL else np.nan
+        return pointIds, x, y, cota
+
+    def findSummitOrBottomOfPoints(
+        self,
+        pointIds,
+        idDict,
+        spatialIdx,
+        sobIdDict,
+        feedback=None,
+    ):
+        """
+        Runs the point in polygon tests of every summit or bottom in one pass.
+        Returns, for each point, the index of the summit or bottom that contains it
+        (-1 if none).
+        """
+        pointIndexDict = {pointId: i for i, pointId in enumerate(pointIds.tolist())}
+        sobIdx = np.full(len(pointIds), -1, dtype=np.int64)
+        nSobs = len(sobIdDict)
+        step = 100 / nSobs if nSobs else 0
+        for current, SoB in enumerate(sobIdDict.values()):
+            if feedback is not None and feedback.isCanceled():
+                break
+            SoBgeom = SoB.geometry()
+            engine = QgsGeometry.createGeometryEngine(SoBgeom.constGet())
+            engine.prepareGeometry()
+            for pointId in spatialIdx.intersects(SoBgeom.boundingBox()):
+                i = pointIndexDict[pointId]
+                if sobIdx[i] != -1:
+                    continue
+                if not engine.contains(idDict[pointId].geometry().constGet()):
+                    continue
+                sobIdx[i] = current
+            if feedback is not None:
+                feedback.setProgress(current * step)
+        return sobIdx
 
-                if not hasSoBPoints:
-                    if not pointsIdsSelectedinGrid:
-                        pointsIdsSelectedinGrid.append(point.id())
-                        continue
-                    if (
-                        pointLayer.getFeature(pointsIdsSelectedinGrid[-1])["cota"]
-                        < point["cota"]
-                    ):
-                        pointsIdsSelectedinGrid.append(point.id())
-            if pointsIdsSelectedinGrid:
-                returnedIdsSet.add(pointsIdsSelectedinGrid[-1])
-            if summitsOrBottomsPoints:
-                returnedIdsSet = returnedIdsSet.union(
-                    {point.id() for point in summitsOrBottomsPoints.values()}
+    def findSummitOrBottomOfPointsInProcesses(
+        self,
+        idDict,
+        gridDefinition,
+        x,
+        y,
+        sobIdDict,
+        nProcesses,
+        feedback=None,
+    ):
+        """
+        Same as findSummitOrBottomOfPoints, but split into bands of grid rows that
+        are evaluated by a pool of nProcesses processes. The point coordinates are
+        shared through shared memory and the summits or bottoms are sent as WKB
+        only once to each process.
+        """
+        nPoints = len(idDict)
+        row = np.floor((gridDefinition["ymax"] - y) / gridDefinition["size"])
+        sobWkbList = [bytes(SoB.geometry().asWkb()) for SoB in sobIdDict.values()]
+        sharedPoints = shared_memory.SharedMemory(
+            create=True, size=3 * nPoints * np.dtype(np.float64).itemsize
+        )
+        sobIdx = np.full(nPoints, -1, dtype=np.int64)
+        try:
+            points = np.ndarray((3, nPoints), dtype=np.float64, buffer=sharedPoints.buf)
+            for i, point in enumerate(idDict.values()):
+                pointXY = point.geometry().centroid().asPoint()
+                points[0, i], points[1, i] = pointXY.x(), pointXY.y()
+            points[2] = row
+            rowBands = [
+                (int(band[0]), int(band[-1]) + 1)
+                for band in np.array_split(
+                    np.arange(row.min(), row.max() + 1), 4 * nProcesses
                 )
-            return returnedIdsSet
-
-        step = 100 / grid.featureCount()
-        futures = set()
-        pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() - 1)
-
-        for gridFeat in grid.getFeatures():
-            if multiStepFeedback is not None and multiStepFeedback.isCanceled():
-                break
-            futures.add(pool.submit(_select_points, gridFeat))
-        for current, x in enumerate(concurrent.futures.as_completed(futures)):
-            if multiStepFeedback is not None and multiStepFeedback.isCanceled():
-                break
-            selectedPointsSet = selectedPointsSet.union(x.result())
-            if multiStepFeedback is not None:
-                multiStepFeedback.setProgress(current * step)
-        return idDict, list(selectedPointsSet)
+                if len(band) > 0
+            ]
+            step = 100 / len(rowBands)
+            # se um processo morrer, as faixas restantes levantam BrokenProcessPool
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=nProcesses,
+                mp_context=ProcessingUtils().getSpawnContext(),
+                initializer=initSummitOrBottomWorker,
+                initargs=(sharedPoints.name, nPoints, sobWkbList),
+            ) as executor:
+                futures = [
+                    executor.submit(findSummitOrBottomInBand, rowBand)
+                    for rowBand in rowBands
+                ]
+                for current, future in enumerate(
+                    concurrent.futures.as_completed(futures)
+                ):
+                    if feedback is not None and feedback.isCanceled():
+                        for pendingFuture in futures:
+                            pendingFuture.cancel()
+                        break
+                    pointIdx, bandSobIdx = future.result()
+                    sobIdx[pointIdx] = bandSobIdx
+                    if feedback is not None:
+                        feedback.setProgress(current * step)
+            del points
+        finally:
+            sharedPoints.close()
+            sharedPoints.unlink()
+        return sobIdx
+
+    def getSummitOrBottomKinds(self, sobIdDict, isDepressionField):
+        """
+        Returns how the point of each summit or bottom is chosen: 1 keeps the highest
+        point (summit), -1 the lowest (depression) and 0 the first one.
+        """
+        isDep = 1
+        isNotDep = 2
+        return np.array(
+            [
+                1
+                if SoB[isDepressionField] == isNotDep
+                else -1
+                if SoB[isDepressionField] == isDep
+                else 0
+                for SoB in sobIdDict.values()
+            ],
+            dtype=np.int64,
+        )
+
+    def selectPointsByCell(self, x, y, cota, sobIdx, sobKind, gridDefinition):
+        """
+        Bins the points into the grid cells and returns the indexes of the selected
+        points. Cells that have points inside summits or bottoms keep one point per
+        summit or bottom; the other cells keep their highest point.
+        """
+        size = gridDefinition["size"]
+        col = np.floor((x - gridDefinition["xmin"]) / size).astype(np.int64)
+        row = np.floor((gridDefinition["ymax"] - y) / size).astype(np.int64)
+        _, cellIdx = np.unique(
+            np.stack([col, row], axis=1), axis=0, return_inverse=True
+        )
+        cellIdx = cellIdx.reshape(-1)
+        cellHasSoB = np.zeros(cellIdx.max() + 1, dtype=bool)
+        cellHasSoB[cellIdx[sobIdx >= 0]] = True
+        candidates = np.flatnonzero((sobIdx >= 0) | ~cellHasSoB[cellIdx])
+        _, groupIdx = np.unique(
+            np.stack([cellIdx[candidates], sobIdx[candidates]], axis=1),
+            axis=0,
+            return_inverse=True,
+        )
+        groupIdx = groupIdx.reshape(-1)
+        kind = sobKind[candidates]
+        sortKey = np.where(kind == 0, 0, -kind * cota[candidates])
+        order = np.lexsort((np.arange(len(candidates)), sortKey, groupIdx))
+        sortedGroups = groupIdx[order]
+        isFirstOfGroup = np.r_[True, sortedGroups[1:] != sortedGroups[:-1]]
+        return candidates[order[isFirstOfGroup]]
 
     def outLayer(self, parameters, context, features, setCRS):
 
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import os
-import processing
 import concurrent.futures
 
 from collections import defaultdict
@@ -20,8 +19,6 @@ from qgis.core import (
     QgsProcessingParameterVectorLayer,
     QgsGeometry,
     QgsFeature,
-    QgsPointXY,
-    QgsVectorLayer,
     QgsFeatureSink,
     QgsProcessingParameterEnum,
     QgsFields,
@@ -33,7 +30,7 @@ from qgis.core import (
     QgsWkbTypes,
     QgsRectangle,
 )
-from DsgTools.core.DSGToolsProcessingAlgs.algRunner import AlgRunner
+from .processingUtils import ProcessingUtils
 from qgis.PyQt.QtCore import QCoreApplication, QVariant
 
 
@@ -42,6 +39,7 @@ class IdentifyLabelOverlap(QgsProcessingAlgorithm):
     INPUT_LAYERS = "INPUT_LAYERS"
     GEOGRAPHIC_BOUNDARY = "GEOGRAPHIC_BOUNDARY"
     SCALE = "SCALE"
+    N_PROCESSES = "N_PROCESSES"
     OUTPUT = "OUTPUT"
 
     def initAlgorithm(self, config=None):
@@ -80,6 +78,15 @@ class IdentifyLabelOverlap(QgsProcessingAlgorithm):
             "1:100.000": 100000,
             "1:250.000": 250000,
         }
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.N_PROCESSES,
+                self.tr("Número de processos para extrair os rótulos"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=1,
+            )
+        )
         self.addParameter(
             QgsProcessingParameterFeatureSink(
                 self.OUTPUT, self.tr("Flags Sobreposição de Rótulos")
@@ -93,6 +100,7 @@ class IdentifyLabelOverlap(QgsProcessingAlgorithm):
         )
         scaleIdx = self.parameterAsEnum(parameters, self.SCALE, context)
         scale = self.scaleDict[self.scales[scaleIdx]]
+        nProcesses = self.parameterAsInt(parameters, self.N_PROCESSES, context)
         fields = QgsFields()
         fields.append(QgsField("id", QVariant.String))
         fields.append(QgsField("texto", QVariant.String))
@@ -106,203 +114,147 @@ class IdentifyLabelOverlap(QgsProcessingAlgorithm):
         )
 
         lyrNameSet = set(i.name() for i in layerList)
-        algRunner = AlgRunner()
-        nRegions = geographicBoundaryLyr.featureCount()
-        nSteps = 5 + 2 * nRegions
-        multiStepFeedback = QgsProcessingMultiStepFeedback(nSteps, feedback)
+        multiStepFeedback = QgsProcessingMultiStepFeedback(5, feedback)
         currentStep = 0
-        labelDict = defaultdict(lambda: defaultdict(dict))
-        selectedLabelLyrList = []
-        for feat in geographicBoundaryLyr.getFeatures():
-            if multiStepFeedback.isCanceled():
-                return {self.OUTPUT: sink_id}
-            geom = feat.geometry()
-            extent = geom.boundingBox()
-            multiStepFeedback.setCurrentStep(currentStep)
-            multiStepFeedback.setProgressText(
-                self.tr(f"Calculando posição dos textos para o extent {extent}")
-            )
-            outputLabelLyr = processing.run(
-                "native:extractlabels",
-                {
-                    "EXTENT": extent,
-                    "SCALE": scale,
-                    "MAP_THEME": None,
-                    "INCLUDE_UNPLACED": False,
-                    "DPI": 300,
-                    "OUTPUT": "memory:",
-                },
-                context=context,
-                feedback=multiStepFeedback,
-            )["OUTPUT"]
-            currentStep += 1
-            multiStepFeedback.setCurrentStep(currentStep)
-            multiStepFeedback.setProgressText(
-                self.tr(
-                    f"Adicionando dados calculados do extent {extent} às estruturas auxiliares"
-                )
-            )
-            nFeats = outputLabelLyr.featureCount()
-            if nFeats == 0:
-                continue
-            selectedLabelsLyr = algRunner.runFilterExpression(
-                inputLyr=outputLabelLyr,
-                context=context,
-                expression=f"Layer in {tuple(lyrNameSet)}".replace(",)", ")"),
-                feedback=multiStepFeedback,
-            )
-            currentStep += 1
-            if selectedLabelsLyr.featureCount() == 0:
-                continue
-            selectedLabelLyrList.append(selectedLabelsLyr)
+        multiStepFeedback.setCurrentStep(currentStep)
+        selectedLabelLyrList = ProcessingUtils().extractLabelsOfRegions(
+            [
+                feat.geometry().boundingBox()
+                for feat in geographicBoundaryLyr.getFeatures()
+            ],
+            scale,
+            lyrNameSet,
+            nProcesses,
+            context,
+            multiStepFeedback,
+        )
 
         if selectedLabelLyrList == [] or multiStepFeedback.isCanceled():
             return {self.OUTPUT: sink_id}
 
-        mergedLyr = algRunner.runMergeVectorLayers(
-            selectedLabelLyrList, context, feedback=multiStepFeedback
-        )
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
-        mergedWithFieldId = algRunner.runCreateFieldWithExpression(
-            inputLyr=mergedLyr,
-            expression="$id",
-            fieldType=1,
-            fieldName="featid",
-            feedback=multiStepFeedback,
-            context=context,
-            is_child_algorithm=False,
+        multiStepFeedback.setProgressText(self.tr("Indexando os rótulos"))
+        labelRectDict, labelIndex = self.buildLabelIndex(
+            selectedLabelLyrList, multiStepFeedback
         )
-        currentStep += 1
-        multiStepFeedback.setCurrentStep(currentStep)
-        if mergedWithFieldId.featureCount() == 0:
+        if multiStepFeedback.isCanceled():
             return {self.OUTPUT: sink_id}
-        labelPolygonsLayer = self.getLabelPolygons(mergedWithFieldId, multiStepFeedback)
-        currentStep += 1
-        multiStepFeedback.setCurrentStep(currentStep)
-        algRunner.runCreateSpatialIndex(
-            labelPolygonsLayer,
-            context,
-            feedback=multiStepFeedback,
-            is_child_algorithm=True,
-        )
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
         multiStepFeedback.setProgressText(self.tr("Calculando overlaps"))
-        currentStep += 1
-        multiStepFeedback.setCurrentStep(currentStep)
-        intersectedLyr = algRunner.runIntersection(
-            labelPolygonsLayer,
-            context,
-            inputFields=["featid"],
-            overlayFields=["featid"],
-            overlayLyr=labelPolygonsLayer,
-            feedback=multiStepFeedback,
-        )
-        nProblems = intersectedLyr.featureCount()
-        if nProblems == 0:
-            return {self.OUTPUT: sink_id}
-        currentStep += 1
-        multiStepFeedback.setCurrentStep(currentStep)
-        dissolvedLyr = algRunner.runDissolve(
-            inputLyr=intersectedLyr,
-            context=context,
-            feedback=multiStepFeedback,
-        )
-        currentStep += 1
-        multiStepFeedback.setCurrentStep(currentStep)
-        algRunner.runDeaggregate(
-            inputLyr=dissolvedLyr,
-            context=context,
-            feedback=multiStepFeedback,
+        overlapClusterList = self.findOverlappingLabels(
+            labelRectDict, labelIndex, multiStepFeedback
         )
-        dissolvedLyr = processing.run(
-            "native:joinattributesbylocation",
-            {
-                "INPUT": dissolvedLyr,
-                "PREDICATE": [2],  # equal
-                "JOIN": labelPolygonsLayer,
-                "JOIN_FIELDS": [],
-                "METHOD": 0,
-                "DISCARD_NONMATCHING": False,
-                "PREFIX": "",
-                "NON_MATCHING": "memory:",
-            },
-            context=context,
-            feedback=multiStepFeedback,
-            is_child_algorithm=False,
-        )["NON_MATCHING"]
-        nProblems = dissolvedLyr.featureCount()
+        nProblems = len(overlapClusterList)
         if nProblems == 0:
             multiStepFeedback.pushInfo(self.tr("Não há rótulos sobrepostos"))
             return {self.OUTPUT: sink_id}
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
         stepSize = 100 / nProblems
-        flagId = 0
-        for current, feat in enumerate(dissolvedLyr.getFeatures()):
+        for flagId, cluster in enumerate(overlapClusterList):
             if multiStepFeedback.isCanceled():
                 break
-            # if feat["featid"] == feat["featid_2"]:
-            #     continue
             flagFeat = QgsFeature(fields)
             flagFeat["id"] = flagId
             flagFeat["texto"] = "Rótulos sobrepostos"
-            flagFeat.setGeometry(feat.geometry())
+            flagFeat.setGeometry(
+                QgsGeometry.unaryUnion([labelRectDict[i] for i in cluster])
+            )
             sink.addFeature(flagFeat)
-            multiStepFeedback.setProgress(current * stepSize)
-            flagId += 1
+            multiStepFeedback.setProgress(flagId * stepSize)
 
         return {self.OUTPUT: sink_id}
 
-    def getLabelPolygons(self, lyr, feedback):
-        fields = lyr.fields()
-        temp = QgsVectorLayer(
-            f"Polygon?crs={lyr.crs().authid()}",
-            "temp_label_lyr",
-            "memory",
+    def buildLabelIndex(self, labelLyrList, feedback):
+        """
+        Builds the rectangle of each extracted label and an R-tree with their bounding
+        boxes. Returns a dict {labelId: QgsGeometry} and the spatial index. A label
+        extracted again by an adjacent region is indexed only once.
+        """
+        labelRectDict = dict()
+        labelKeySet = set()
+        labelIndex = QgsSpatialIndex()
+        nLabels = sum(lyr.featureCount() for lyr in labelLyrList)
+        if nLabels == 0:
+            return labelRectDict, labelIndex
+        stepSize = 100 / nLabels
+        for lyr in labelLyrList:
+            for feat in lyr.getFeatures():
+                if feedback.isCanceled():
+                    return labelRectDict, labelIndex
+                geom = self.getLabelRectangle(feat)
+                labelKey = (
+                    feat["Layer"],
+                    feat["FeatureID"],
+                    feat["LabelText"],
+                    geom.asWkt(),
+                )
+                if labelKey in labelKeySet:
+                    continue
+                labelKeySet.add(labelKey)
+                labelId = len(labelRectDict)
+                labelRectDict[labelId] = geom
+                labelIndex.addFeature(labelId, geom.boundingBox())
+                feedback.setProgress(labelId * stepSize)
+        return labelRectDict, labelIndex
+
+    def getLabelRectangle(self, feat):
+        """
+        Returns the rectangle covered by a label of native:extractlabels, whose point
+        is the lower left corner of the text, rotated by the label rotation.
+        """
+        pointXY = feat.geometry().asPoint()
+        height = feat["LabelHeight"]
+        width = feat["LabelWidth"] * 1.15
+        geom = QgsGeometry.fromRect(
+            QgsRectangle(
+                pointXY.x(), pointXY.y(), pointXY.x() + width, pointXY.y() + height
+            )
+        )
+        rotation = (
+            feat["LabelRotation"]
+            if feat.fields().indexOf("LabelRotation") >= 0
+            else NULL
         )
-        isGeographic = lyr.crs().isGeographic()
-        temp.startEditing()
+        if rotation not in (None, NULL) and rotation != 0:
+            geom.rotate(rotation, pointXY)
+        return geom
 
-        temp_data = temp.dataProvider()
-        temp_data.addAttributes(fields.toList())
-        temp.updateFields()
+    def findOverlappingLabels(self, labelRectDict, labelIndex, feedback):
+        """
+        Finds the pairs of labels whose rectangles overlap with a positive area and
+        groups them with a union-find. Returns one list of label ids per group of
+        overlapping labels.
+        """
+        parentDict = {labelId: labelId for labelId in labelRectDict}
 
-        temp.beginEditCommand("Populating temp lyr")
+        def find(labelId):
+            while parentDict[labelId] != labelId:
+                parentDict[labelId] = parentDict[parentDict[labelId]]
+                labelId = parentDict[labelId]
+            return labelId
 
-        # tol = 25000 * 1.5
-        nSteps = lyr.featureCount()
-        if nSteps == 0:
-            return temp
-        stepSize = 100 / nSteps
-        for current, feat in enumerate(lyr.getFeatures()):
+        nLabels = len(labelRectDict)
+        stepSize = 100 / nLabels
+        for current, (labelId, geom) in enumerate(labelRectDict.items()):
             if feedback.isCanceled():
-                break
-            pointGeom = feat.geometry()
-            pointXY = pointGeom.asPoint()
-            # labelSize = feat["Size"]
-            height = feat["LabelHeight"]
-            width = feat["LabelWidth"] * 1.15
-            #    width = (feat["LabelWidth"] / max([len(i) for i in feat["LabelText"].split('\n')])) * tol
-            geom = QgsGeometry.fromRect(
-                QgsRectangle.fromCenterAndSize(
-                    QgsPointXY(pointXY.x() + width / 2, pointXY.y() + height / 2),
-                    width,
-                    height,
-                )
-            )
-            newFeat = QgsFeature(fields)
-            for attr, value in feat.attributeMap().items():
-                newFeat[attr] = value
-            newFeat["LabelHeight"] = height
-            newFeat["LabelWidth"] = width
-            newFeat.setGeometry(geom)
-            temp.addFeature(newFeat)
+                return []
+            for candidateId in labelIndex.intersects(geom.boundingBox()):
+                if candidateId <= labelId:
+                    continue
+                candidateGeom = labelRectDict[candidateId]
+                if not geom.intersects(candidateGeom):
+                    continue
+                if geom.intersection(candidateGeom).area() <= 0:
+                    continue
+                parentDict[find(candidateId)] = find(labelId)
             feedback.setProgress(current * stepSize)
-
-        temp.endEditCommand()
-        return temp
+        clusterDict = defaultdict(list)
+        for labelId in labelRectDict:
+            clusterDict[find(labelId)].append(labelId)
+        return [cluster for cluster in clusterDict.values() if len(cluster) > 1]
 
     def tr(self, string):
         return QCoreApplication.translate("Processing", string)
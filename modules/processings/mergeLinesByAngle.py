@@ -1,15 +1,11 @@
 from collections import defaultdict
-import math
-import os
-import concurrent.futures
 
+import numpy as np
 from qgis import processing
 from qgis.core import (
     QgsFeatureRequest,
     QgsFeatureSink,
     QgsGeometry,
-    QgsGeometryUtils,
-    QgsPointXY,
     QgsProcessing,
     QgsProcessingAlgorithm,
     QgsProcessingException,
@@ -20,7 +16,6 @@ from qgis.core import (
     QgsProcessingMultiStepFeedback,
 )
 from qgis.PyQt.QtCore import QCoreApplication
-from DsgTools.core.GeometricTools import graphHandler
 from DsgTools.core.DSGToolsProcessingAlgs.algRunner import AlgRunner
 
 
@@ -99,132 +94,207 @@ class MergeLinesByAngle(QgsProcessingAlgorithm):
         multiStepFeedback = QgsProcessingMultiStepFeedback(4, feedback)
         currentStep = 0
         multiStepFeedback.setCurrentStep(currentStep)
-        pointsAndLineDict, cacheLayer = self.startOrEndIntersectionsDict(
+        polylineDict, nodeDict = self.buildLineEndGraph(
             layer, feedback=multiStepFeedback
         )
-        lineDict = {feat["featid"]: feat for feat in cacheLayer.getFeatures()}
-        currentStep += 1
-        if not pointsAndLineDict:
+        if not nodeDict:
             return False
-        toMerge = []
-
-        def compute(ptAndLine, linesArray):
-            smallerAngle = 360
-            linePair = []
-            for i in range(len(linesArray)):
-                line1 = linesArray[i]
-                for j in range(i + 1, len(linesArray)):
-                    line2 = linesArray[j]
-                    deflection = abs(
-                        self.anglesBetweenLines(line1, line2, ptAndLine) - 180
-                    )
-                    if deflection >= smallerAngle:
-                        continue
-                    newGeometry = (
-                        line1.geometry().combine(line2.geometry()).mergeLines()
-                    )
-                    if newGeometry.isMultipart():
-                        continue
-                    geometry = newGeometry.asPolyline()
-                    ptLast = QgsGeometry().fromPointXY(QgsPointXY(geometry[-1]))
-                    ptFirst = QgsGeometry().fromPointXY(QgsPointXY(geometry[0]))
-                    if ptFirst.equals(ptLast):
-                        continue
-                    smallerAngle = deflection
-                    linePair = [line1["featid"], line2["featid"]]
-            return linePair
-
-        futures = set()
-        pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() - 1)
+        currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
-        multiStepFeedback.pushInfo("Submitting to thread")
-        stepSize = 100 / len(pointsAndLineDict)
-        for current, (geomWkb, linesIdSet) in enumerate(pointsAndLineDict.items()):
-            if multiStepFeedback.isCanceled():
-                break
-            ptAndLine = QgsGeometry()
-            ptAndLine.fromWkb(geomWkb)
-            futures.add(
-                pool.submit(compute, ptAndLine, [lineDict[i] for i in linesIdSet])
-            )
-            multiStepFeedback.setProgress(current * stepSize)
-
+        multiStepFeedback.pushInfo("Evaluating angles")
+        joinDict = self.findLineEndsToJoin(
+            polylineDict, nodeDict, feedback=multiStepFeedback
+        )
+        if not joinDict or multiStepFeedback.isCanceled():
+            return True
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
-        multiStepFeedback.pushInfo("Evaluating results")
-        for current, future in enumerate(concurrent.futures.as_completed(futures)):
-            if multiStepFeedback.isCanceled():
-                break
-            linePair = future.result()
-            if linePair:
-                toMerge.append(linePair)
-            multiStepFeedback.setProgress(current * stepSize)
-        # Merge Two Lines
+        chainList = self.buildChains(polylineDict, joinDict)
+        # Merge Chains
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
         multiStepFeedback.pushInfo("Writing output")
-
-        layer.startEditing()
-        layer.beginEditCommand("Editando")
+        isMultiType = QgsWkbTypes.isMultiType(layer.wkbType())
+        geometryMap = {}
         idsToRemove = []
+        for chainIds, vertices in chainList:
+            newGeometry = QgsGeometry.fromPolylineXY(vertices)
+            if isMultiType:
+                newGeometry.convertToMultiType()
+            geometryMap[chainIds[0]] = newGeometry
+            idsToRemove.extend(chainIds[1:])
+        dataProvider = layer.dataProvider()
+        dataProvider.changeGeometryValues(geometryMap)
+        dataProvider.deleteFeatures(idsToRemove)
+        layer.updateExtents()
+        return True
 
-        changeLines = {}
-        nSteps = len(toMerge)
-        if nSteps == 0:
-            return True
-        stepSize = 100 / nSteps
-        for current, lines in enumerate(toMerge):
-            if multiStepFeedback.isCanceled():
+    def buildLineEndGraph(self, layer, feedback):
+        """
+        Reads the lines once and returns their vertices by feature id and the line
+        ends at each node, as {(x, y): [(featId, isEnd)]}. Multipart and closed lines
+        are not merged, so they are left out of the graph.
+        """
+        polylineDict = {}
+        nodeDict = defaultdict(list)
+        nFeats = layer.featureCount()
+        if nFeats == 0:
+            return polylineDict, nodeDict
+        stepSize = 100 / nFeats
+        for current, feat in enumerate(layer.getFeatures()):
+            if feedback.isCanceled():
                 break
-            line1id = lines[0]
-            line2id = lines[1]
-            while line1id in changeLines:
-                if multiStepFeedback.isCanceled():
-                    break
-                line1id = changeLines[line1id]
-            while line2id in changeLines:
-                if multiStepFeedback.isCanceled():
-                    break
-                line2id = changeLines[line2id]
-            line1 = layer.getFeature(line1id)
-            line2 = layer.getFeature(line2id)
-            newGeometry = line1.geometry().combine(line2.geometry()).mergeLines()
-            if newGeometry.isMultipart() or newGeometry.isNull():
+            geom = feat.geometry()
+            if geom.isNull() or geom.isEmpty():
                 continue
-            geometry = newGeometry.asPolyline()
-            ptLast = QgsGeometry().fromPointXY(QgsPointXY(geometry[-1]))
-            ptFirst = QgsGeometry().fromPointXY(QgsPointXY(geometry[0]))
-            if ptFirst.equals(ptLast):
+            parts = (
+                geom.asMultiPolyline() if geom.isMultipart() else [geom.asPolyline()]
+            )
+            if len(parts) != 1 or len(parts[0]) < 2:
                 continue
-            line1.setGeometry(newGeometry)
-            layer.updateFeature(line1)
-            changeLines[line2id] = line1id
-            idsToRemove.append(line2.id())
-            multiStepFeedback.setProgress(current * stepSize)
-        layer.deleteFeatures(idsToRemove)
-        layer.endEditCommand()
-        return True
-
-    def startOrEndIntersectionsDict(self, layer, feedback):
-        multiStepFeedback = QgsProcessingMultiStepFeedback(2, feedback)
-        multiStepFeedback.setCurrentStep(0)
-        cacheLayer, nodesLayer = graphHandler.buildAuxLayersPriorGraphBuilding(
-            layer, feedback=multiStepFeedback
+            polyline = parts[0]
+            first, last = polyline[0], polyline[-1]
+            if first == last:
+                continue
+            polylineDict[feat.id()] = polyline
+            nodeDict[(first.x(), first.y())].append((feat.id(), False))
+            nodeDict[(last.x(), last.y())].append((feat.id(), True))
+            feedback.setProgress(current * stepSize)
+        return polylineDict, nodeDict
+
+    def findLineEndsToJoin(self, polylineDict, nodeDict, feedback):
+        """
+        Picks, at each node, the pair of line ends with the smallest deflection. The
+        tangent of each line end is computed once and the deflections of every pair
+        are compared on numpy arrays. Pairs are accepted from the smallest deflection
+        on and a union-find rejects the ones that would close a ring, either by
+        joining a chain to itself or by leaving both free ends of the merged chain
+        on the same node. In that case the node falls back to its next best pair.
+        Returns a dict {(featId, isEnd): (otherFeatId, otherIsEnd)} of joined ends.
+        """
+        nodeEnds = [ends for ends in nodeDict.values() if len(ends) > 1]
+        if not nodeEnds:
+            return {}
+        endList = [end for ends in nodeEnds for end in ends]
+        nodeSizes = np.array([len(ends) for ends in nodeEnds])
+        nodeOffsets = np.concatenate([[0], np.cumsum(nodeSizes)[:-1]])
+        # tangente de cada extremidade: do nó para o vértice adjacente
+        endPoints = np.array(
+            [
+                (vertex.x(), vertex.y(), adjacent.x(), adjacent.y())
+                for vertex, adjacent in (
+                    (polylineDict[featId][-1], polylineDict[featId][-2])
+                    if isEnd
+                    else (polylineDict[featId][0], polylineDict[featId][1])
+                    for featId, isEnd in endList
+                )
+            ],
+            dtype=np.float64,
         )
-        pointsDict = defaultdict(set)
-        multiStepFeedback.setCurrentStep(1)
-        nNodes = nodesLayer.featureCount()
-        if nNodes == 0:
-            return pointsDict, cacheLayer
-        stepSize = 100 / nNodes
-        for current, nodeFeat in enumerate(nodesLayer.getFeatures()):
-            if multiStepFeedback.isCanceled():
-                break
-            geom = nodeFeat.geometry()
-            geomWkb = geom.asWkb()
-            pointsDict[geomWkb].add(nodeFeat["featid"])
-            multiStepFeedback.setProgress(current * stepSize)
-        return pointsDict, cacheLayer
+        tangents = endPoints[:, 2:] - endPoints[:, :2]
+        norms = np.linalg.norm(tangents, axis=1)
+        tangents = tangents / np.where(norms > 0, norms, 1)[:, None]
+
+        # pares de extremidades de cada nó, agrupando os nós pelo grau
+        pairNodes, pairEnds1, pairEnds2 = [], [], []
+        for size in np.unique(nodeSizes):
+            nodeIdx = np.flatnonzero(nodeSizes == size)
+            iIdx, jIdx = np.triu_indices(size, k=1)
+            pairNodes.append(np.repeat(nodeIdx, len(iIdx)))
+            pairEnds1.append((nodeOffsets[nodeIdx][:, None] + iIdx).ravel())
+            pairEnds2.append((nodeOffsets[nodeIdx][:, None] + jIdx).ravel())
+        pairNodes = np.concatenate(pairNodes)
+        pairEnds1 = np.concatenate(pairEnds1)
+        pairEnds2 = np.concatenate(pairEnds2)
+        cosines = np.clip(
+            np.einsum("ij,ij->i", tangents[pairEnds1], tangents[pairEnds2]), -1, 1
+        )
+        deflections = 180 - np.degrees(np.arccos(cosines))
+        order = np.argsort(deflections, kind="stable")
+
+        parentDict = {featId: featId for featId in polylineDict}
+        # nós das duas extremidades livres da cadeia de cada raiz
+        chainEndsDict = {
+            featId: [
+                (polyline[0].x(), polyline[0].y()),
+                (polyline[-1].x(), polyline[-1].y()),
+            ]
+            for featId, polyline in polylineDict.items()
+        }
+
+        def find(featId):
+            while parentDict[featId] != featId:
+                parentDict[featId] = parentDict[parentDict[featId]]
+                featId = parentDict[featId]
+            return featId
+
+        joinDict = {}
+        usedNodes = set()
+        stepSize = 100 / len(order)
+        for current, pairIdx in enumerate(order):
+            if feedback.isCanceled():
+                return {}
+            nodeIdx = pairNodes[pairIdx]
+            if nodeIdx in usedNodes:
+                continue
+            end1, end2 = endList[pairEnds1[pairIdx]], endList[pairEnds2[pairIdx]]
+            root1, root2 = find(end1[0]), find(end2[0])
+            if root1 == root2:
+                continue
+            # a cadeia resultante seria fechada se as extremidades livres que sobram
+            # estivessem no mesmo nó
+            node = self.getEndNode(polylineDict, end1)
+            otherEnd1 = self.getOtherChainEnd(chainEndsDict[root1], node)
+            otherEnd2 = self.getOtherChainEnd(chainEndsDict[root2], node)
+            if otherEnd1 == otherEnd2:
+                continue
+            parentDict[root2] = root1
+            chainEndsDict[root1] = [otherEnd1, otherEnd2]
+            usedNodes.add(nodeIdx)
+            joinDict[end1] = end2
+            joinDict[end2] = end1
+            feedback.setProgress(current * stepSize)
+        return joinDict
+
+    def getEndNode(self, polylineDict, lineEnd):
+        featId, isEnd = lineEnd
+        vertex = polylineDict[featId][-1 if isEnd else 0]
+        return (vertex.x(), vertex.y())
+
+    def getOtherChainEnd(self, chainEnds, node):
+        return chainEnds[1] if chainEnds[0] == node else chainEnds[0]
+
+    def buildChains(self, polylineDict, joinDict):
+        """
+        Walks the joined line ends from one free end of each chain to the other one.
+        Returns a list of (featIds, vertices) with the ids of the lines of each chain,
+        in walking order, and the vertices of the merged line.
+        """
+        chainList = []
+        visited = set()
+        for featId, polyline in polylineDict.items():
+            if featId in visited:
+                continue
+            startIsFree = (featId, False) not in joinDict
+            endIsFree = (featId, True) not in joinDict
+            if startIsFree == endIsFree:
+                # linha isolada ou interna a uma cadeia ainda não percorrida
+                continue
+            visited.add(featId)
+            chainIds = [featId]
+            vertices = list(polyline) if startIsFree else polyline[::-1]
+            currentEnd = (featId, startIsFree)
+            while currentEnd in joinDict:
+                nextId, nextIsEnd = joinDict[currentEnd]
+                nextPolyline = polylineDict[nextId]
+                if nextIsEnd:
+                    nextPolyline = nextPolyline[::-1]
+                vertices.extend(nextPolyline[1:])
+                visited.add(nextId)
+                chainIds.append(nextId)
+                currentEnd = (nextId, not nextIsEnd)
+            chainList.append((chainIds, vertices))
+        return chainList
 
     def createFeaturesArray(self, originalLayer):
         arrayFeatures = []
@@ -235,26 +305,6 @@ class MergeLinesByAngle(QgsProcessingAlgorithm):
 
         return arrayFeatures
 
-    def adjacentPoint(self, line, point):
-        vertexPoint = line.geometry().closestVertexWithContext(point)[1]
-        adjpoints = line.geometry().adjacentVertices(vertexPoint)
-        adjptvertex = adjpoints[0]
-        if adjptvertex < 0:
-            adjptvertex = adjpoints[1]
-        adjpt = line.geometry().vertexAt(adjptvertex)
-        return QgsPointXY(adjpt)
-
-    def anglesBetweenLines(self, line1, line2, point):
-        pointB = QgsPointXY(point.asPoint())
-        pointA = self.adjacentPoint(line1, pointB)
-        pointC = self.adjacentPoint(line2, pointB)
-        angleRad = QgsGeometryUtils().angleBetweenThreePoints(
-            pointA.x(), pointA.y(), pointB.x(), pointB.y(), pointC.x(), pointC.y()
-        )
-        angle = math.degrees(angleRad)
-
-        return abs(angle)
-
     def outLayer(self, parameters, context, layer):
         newFields = layer.fields()
 
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 
 import os
-import processing
 import concurrent.futures
 
 from collections import defaultdict
@@ -40,6 +39,7 @@ from qgis.core import (
     QgsProperty,
 )
 from DsgTools.core.DSGToolsProcessingAlgs.algRunner import AlgRunner
+from .processingUtils import ProcessingUtils
 from qgis.PyQt.QtCore import QCoreApplication, QVariant
 
 
@@ -51,6 +51,7 @@ class PlaceMasterContourLabels(QgsProcessingAlgorithm):
     MAP_LAYERS = "MAP_LAYERS"
     GEOGRAPHIC_BOUNDARY = "GEOGRAPHIC_BOUNDARY"
     SCALE = "SCALE"
+    N_PROCESSES = "N_PROCESSES"
 
     def initAlgorithm(self, config=None):
         self.addParameter(
@@ -114,6 +115,15 @@ class PlaceMasterContourLabels(QgsProcessingAlgorithm):
             "1:100.000": 100000,
             "1:250.000": 250000,
         }
+        self.addParameter(
+            QgsProcessingParameterNumber(
+                self.N_PROCESSES,
+                self.tr("Número de processos para extrair os rótulos"),
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=1,
+                defaultValue=1,
+            )
+        )
         self.masterIndexDict = {
             25_000: 50,
             50_000: 100,
@@ -141,6 +151,7 @@ class PlaceMasterContourLabels(QgsProcessingAlgorithm):
         )
         scaleIdx = self.parameterAsEnum(parameters, self.SCALE, context)
         scale = self.scaleDict[self.scales[scaleIdx]]
+        nProcesses = self.parameterAsInt(parameters, self.N_PROCESSES, context)
         lyrNameSet = set(
             i.name()
             for i in layerList
@@ -165,7 +176,12 @@ class PlaceMasterContourLabels(QgsProcessingAlgorithm):
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
         labelPolygonsLayer = self.extractLabels(
-            lyrNameSet, geographicBoundaryLyr, scale, context, multiStepFeedback
+            lyrNameSet,
+            geographicBoundaryLyr,
+            scale,
+            context,
+            multiStepFeedback,
+            nProcesses=nProcesses,
         )
         currentStep += 1
         multiStepFeedback.setCurrentStep(currentStep)
@@ -214,55 +230,22 @@ class PlaceMasterContourLabels(QgsProcessingAlgorithm):
         scale: int,
         context: QgsProcessingContext,
         feedback: QgsProcessingFeedback,
+        nProcesses: int = 1,
     ) -> Union[QgsVectorLayer, None]:
-        nRegions = geographicBoundaryLyr.featureCount()
-        nSteps = 5 + 2 * nRegions
-        multiStepFeedback = QgsProcessingMultiStepFeedback(nSteps, feedback)
+        multiStepFeedback = QgsProcessingMultiStepFeedback(6, feedback)
         currentStep = 0
-        selectedLabelLyrList = []
-        for feat in geographicBoundaryLyr.getFeatures():
-            if multiStepFeedback.isCanceled():
-                return None
-            geom = feat.geometry()
-            extent = geom.boundingBox()
-            multiStepFeedback.setCurrentStep(currentStep)
-            multiStepFeedback.setProgressText(
-                self.tr(f"Calculando posição dos textos para o extent {extent}")
-            )
-            outputLabelLyr = processing.run(
-                "native:extractlabels",
-                {
-                    "EXTENT": extent,
-                    "SCALE": scale,
-                    "MAP_THEME": None,
-                    "INCLUDE_UNPLACED": False,
-                    "DPI": 300,
-                    "OUTPUT": "memory:",
-                },
-                context=context,
-                feedback=multiStepFeedback,
-            )["OUTPUT"]
-            currentStep += 1
-            multiStepFeedback.setCurrentStep(currentStep)
-            multiStepFeedback.setProgressText(
-                self.tr(
-                    f"Adicionando dados calculados do extent {extent} às estruturas auxiliares"
-                )
-            )
-            nFeats = outputLabelLyr.featureCount()
-            if nFeats == 0:
-                continue
-            selectedLabelsLyr = self.algRunner.runFilterExpression(
-                inputLyr=outputLabelLyr,
-                context=context,
-                expression=f"Layer in {tuple(lyrNameSet)}".replace(",)", ")"),
-                feedback=multiStepFeedback,
-            )
-            currentStep += 1
-            if selectedLabelsLyr.featureCount() == 0:
-                continue
-            selectedLabelLyrList.append(selectedLabelsLyr)
-
+        multiStepFeedback.setCurrentStep(currentStep)
+        selectedLabelLyrList = ProcessingUtils().extractLabelsOfRegions(
+            [
+                feat.geometry().boundingBox()
+                for feat in geographicBoundaryLyr.getFeatures()
+            ],
+            scale,
+            lyrNameSet,
+            nProcesses,
+            context,
+            multiStepFeedback,
+        )
         if selectedLabelLyrList == [] or multiStepFeedback.isCanceled():
             return None
         currentStep += 1
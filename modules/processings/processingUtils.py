@@ -1,4 +1,16 @@
+import concurrent.futures
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures.process import BrokenProcessPool
+
+from qgis.analysis import QgsNativeAlgorithms
+from qgis.PyQt.QtXml import QDomDocument
 from qgis.core import (
+    QgsApplication,
+    QgsExpression,
+    QgsExpressionFunction,
     QgsUnitTypes,
     QgsFeature,
     QgsDistanceArea,
@@ -7,9 +19,88 @@ from qgis.core import (
     QgsGeometry,
     QgsCoordinateTransformContext,
     QgsCoordinateReferenceSystem,
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProcessingMultiStepFeedback,
+    QgsProcessingUtils,
+    QgsProject,
+    QgsProviderConnectionException,
+    QgsProviderRegistry,
+    QgsReadWriteContext,
+    QgsRectangle,
 )
 from qgis import processing
 
+# condição SQL equivalente ao teste de texto_edicao vazio das funções default, que
+# usam str.strip() e portanto removem qualquer espaço em branco
+EMPTY_TEXT_EDICAO_SQL = "texto_edicao IS NULL OR texto_edicao ~ '^[[:space:]]*$'"
+
+# objetos iniciados em cada processo de extração de rótulos
+workerData = dict()
+# funções de expressão em python registradas por initLabelExtractionWorker
+WORKER_EXPRESSION_FUNCTIONS = {"longNumber", "shortNumber"}
+
+
+def initLabelExtractionWorker(prefixPath, projectPath):
+    """
+    Starts the QgsApplication of a label extraction worker process and loads the
+    project once, so each region only runs the labeling engine.
+    """
+    from ..expressionFunctions.functions.createCustomGridNumbers import (
+        longNumber,
+        shortNumber,
+    )
+
+    qgs = QgsApplication([], False)
+    QgsApplication.setPrefixPath(prefixPath, True)
+    qgs.initQgis()
+    QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    # as mesmas funções de expressão registradas pelo plugin e pelo standalone
+    QgsExpression.registerFunction(longNumber)
+    QgsExpression.registerFunction(shortNumber)
+    QgsProject.instance().read(projectPath)
+    workerData["qgs"] = qgs
+    workerData["functions"] = (longNumber, shortNumber)
+
+
+def extractLabelsOfRegion(task):
+    """
+    Runs native:extractlabels on the extent of a region and keeps the labels of the
+    layers in lyrNames. Returns the path of the GeoPackage with the labels, or None
+    if there are no labels.
+    """
+    extent, scale, lyrNames, outputPath = task
+    context = QgsProcessingContext()
+    context.setProject(QgsProject.instance())
+    feedback = QgsProcessingFeedback()
+    registry = QgsApplication.processingRegistry()
+    labelLyr = registry.createAlgorithmById("native:extractlabels").run(
+        {
+            "EXTENT": QgsRectangle(*extent),
+            "SCALE": scale,
+            "MAP_THEME": None,
+            "INCLUDE_UNPLACED": False,
+            "DPI": 300,
+            "OUTPUT": "memory:",
+        },
+        context,
+        feedback,
+    )[0]["OUTPUT"]
+    labelLyr = context.takeResultLayer(labelLyr)
+    if labelLyr is None or labelLyr.featureCount() == 0:
+        return None
+    registry.createAlgorithmById("native:extractbyexpression").run(
+        {
+            "INPUT": labelLyr,
+            "EXPRESSION": f"Layer in {tuple(lyrNames)}".replace(",)", ")"),
+            "OUTPUT": outputPath,
+        },
+        context,
+        feedback,
+    )
+    selectedLabelsLyr = QgsVectorLayer(outputPath, "labels", "ogr")
+    return outputPath if selectedLabelsLyr.featureCount() > 0 else None
+
 
 class ProcessingUtils:
     def __init__(self, *args, **kwargs):
@@ -31,6 +122,313 @@ class ProcessingUtils:
         dataProvider.addFeatures([newFeat])
         return vectorLayer
 
+    def getSpawnContext(self):
+        """
+        returns a spawn multiprocessing context that also works inside QGIS, where
+        sys.executable may be the QGIS executable instead of a python interpreter
+        """
+        context = multiprocessing.get_context("spawn")
+        if sys.platform == "win32":
+            context.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe"))
+        elif not os.path.basename(sys.executable).startswith("python"):
+            # no macOS e em alguns pacotes do linux o executável é o do QGIS
+            version = f"{sys.version_info.major}.{sys.version_info.minor}"
+            for name in (f"python{version}", f"python{sys.version_info.major}"):
+                executable = os.path.join(sys.exec_prefix, "bin", name)
+                if os.path.isfile(executable):
+                    context.set_executable(executable)
+                    break
+        return context
+
+    def canStartProcesses(self):
+        """
+        returns whether the current process can start worker processes. Processes
+        started by multiprocessing, such as the workers of the parallel export, do
+        not start workers of their own: daemonic ones can not have children and the
+        others would multiply the number of processes
+        """
+        return (
+            multiprocessing.parent_process() is None
+            and not multiprocessing.current_process().daemon
+        )
+
+    def canExtractLabelsInProcesses(self):
+        """
+        returns whether the label extraction can run on worker processes, which load
+        the project from disk: the project must be saved and the labeled layers can
+        not be memory layers nor have unsaved edits
+        """
+        project = QgsProject.instance()
+        if not self.canStartProcesses():
+            return False
+        if project.fileName() == "" or project.isDirty():
+            return False
+        # funções registradas em python por outros plugins não existem nos workers
+        missingFunctions = (
+            self.getPythonExpressionFunctionNames() - WORKER_EXPRESSION_FUNCTIONS
+        )
+        for lyr in project.mapLayers().values():
+            if not isinstance(lyr, QgsVectorLayer) or not lyr.labelsEnabled():
+                continue
+            if lyr.providerType() == "memory" or lyr.isModified():
+                return False
+            if self.labelingUsesFunctions(lyr, missingFunctions):
+                return False
+        return True
+
+    def getPythonExpressionFunctionNames(self):
+        """
+        returns the names of the expression functions registered from python, which
+        are subclasses defined outside the qgis core module
+        """
+        return {
+            function.name()
+            for function in QgsExpression.Functions()
+            if type(function).__module__ != QgsExpressionFunction.__module__
+        }
+
+    def labelingUsesFunctions(self, lyr, functionNames):
+        """
+        returns whether the labeling of the layer, including its data defined
+        properties and rules, calls any of the expression functions in functionNames
+        :param lyr: (QgsVectorLayer) labeled layer;
+        :param functionNames: (set) names of the expression functions;
+        """
+        if not functionNames or lyr.labeling() is None:
+            return False
+        doc = QDomDocument()
+        doc.appendChild(lyr.labeling().save(doc, QgsReadWriteContext()))
+        labelingXml = doc.toString()
+        return any(
+            re.search(rf"\b{re.escape(name)}\s*\(", labelingXml, re.IGNORECASE)
+            for name in functionNames
+        )
+
+    def extractLabelsOfRegions(
+        self, extents, scale, lyrNameSet, nProcesses, context, feedback
+    ):
+        """
+        Runs native:extractlabels on each extent and returns the label layers of the
+        layers in lyrNameSet. Extents without labels do not return a layer. When
+        nProcesses > 1 the extents are processed in worker processes, if
+        canExtractLabelsInProcesses allows it, otherwise one by one in this process.
+        :param extents: (list) list of QgsRectangle;
+        :param scale: (int) map scale;
+        :param lyrNameSet: (set) names of the layers whose labels are kept;
+        :param nProcesses: (int) number of worker processes;
+        :param context: (QgsProcessingContext) processing context;
+        :param feedback: (QgsProcessingFeedback) processing feedback;
+        """
+        if nProcesses > 1 and len(extents) > 1:
+            if not self.canExtractLabelsInProcesses():
+                feedback.pushInfo(
+                    "O projeto não está salvo, há camadas com edições não salvas ou "
+                    "rótulos com funções de expressão de outros plugins, os rótulos "
+                    "serão extraídos em um único processo"
+                )
+            else:
+                feedback.setProgressText(
+                    f"Calculando posição dos textos em {nProcesses} processos"
+                )
+                try:
+                    return self.extractLabelsInProcesses(
+                        extents, scale, lyrNameSet, nProcesses, feedback=feedback
+                    )
+                except BrokenProcessPool:
+                    feedback.pushInfo(
+                        "Um processo de extração de rótulos foi encerrado, os "
+                        "rótulos serão extraídos em um único processo"
+                    )
+        multiStepFeedback = QgsProcessingMultiStepFeedback(2 * len(extents), feedback)
+        expression = f"Layer in {tuple(sorted(lyrNameSet))}".replace(",)", ")")
+        labelLyrList = []
+        for current, extent in enumerate(extents):
+            if multiStepFeedback.isCanceled():
+                break
+            multiStepFeedback.setCurrentStep(2 * current)
+            multiStepFeedback.setProgressText(
+                f"Calculando posição dos textos para o extent {extent}"
+            )
+            outputLabelLyr = processing.run(
+                "native:extractlabels",
+                {
+                    "EXTENT": extent,
+                    "SCALE": scale,
+                    "MAP_THEME": None,
+                    "INCLUDE_UNPLACED": False,
+                    "DPI": 300,
+                    "OUTPUT": "memory:",
+                },
+                context=context,
+                feedback=multiStepFeedback,
+            )["OUTPUT"]
+            if outputLabelLyr.featureCount() == 0:
+                continue
+            multiStepFeedback.setCurrentStep(2 * current + 1)
+            selectedLabelsLyr = processing.run(
+                "native:extractbyexpression",
+                {
+                    "INPUT": outputLabelLyr,
+                    "EXPRESSION": expression,
+                    "OUTPUT": "memory:",
+                },
+                context=context,
+                feedback=multiStepFeedback,
+            )["OUTPUT"]
+            if selectedLabelsLyr.featureCount() == 0:
+                continue
+            labelLyrList.append(selectedLabelsLyr)
+        return labelLyrList
+
+    def extractLabelsInProcesses(
+        self, extents, scale, lyrNameSet, nProcesses, feedback=None
+    ):
+        """
+        Runs native:extractlabels on each extent in a pool of nProcesses processes,
+        each one loading the saved project once, and returns the label layers of the
+        layers in lyrNameSet. Layers without labels are not returned.
+        :param extents: (list) list of QgsRectangle;
+        :param scale: (int) map scale;
+        :param lyrNameSet: (set) names of the layers whose labels are kept;
+        :param nProcesses: (int) number of worker processes;
+        :param feedback: (QgsProcessingFeedback) processing feedback;
+        """
+        lyrNames = sorted(lyrNameSet)
+        tasks = [
+            (
+                (
+                    extent.xMinimum(),
+                    extent.yMinimum(),
+                    extent.xMaximum(),
+                    extent.yMaximum(),
+                ),
+                scale,
+                lyrNames,
+                QgsProcessingUtils.generateTempFilename(f"labels_{i}.gpkg"),
+            )
+            for i, extent in enumerate(extents)
+        ]
+        labelLyrList = []
+        if len(tasks) == 0:
+            return labelLyrList
+        step = 100 / len(tasks)
+        # ao contrário do multiprocessing.Pool, o executor não trava se um processo
+        # morrer: as tarefas restantes levantam BrokenProcessPool
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(nProcesses, len(tasks)),
+            mp_context=self.getSpawnContext(),
+            initializer=initLabelExtractionWorker,
+            initargs=(QgsApplication.prefixPath(), QgsProject.instance().fileName()),
+        ) as executor:
+            futures = [executor.submit(extractLabelsOfRegion, task) for task in tasks]
+            for current, future in enumerate(futures):
+                if feedback is not None and feedback.isCanceled():
+                    for pendingFuture in futures:
+                        pendingFuture.cancel()
+                    break
+                outputPath = future.result()
+                if outputPath is not None:
+                    labelLyrList.append(QgsVectorLayer(outputPath, "labels", "ogr"))
+                if feedback is not None:
+                    feedback.setProgress(current * step)
+        return labelLyrList
+
+    def runAttributeRulesOnPostgis(self, layer, rules):
+        """
+        runs attribute rules as set-based UPDATE statements on the PostGIS table of
+        the layer, in a single transaction. Returns False without changing anything
+        when the layer is not a PostGIS layer, has unsaved edits or the statements
+        fail, so the caller can update the features one by one
+        :param layer: (QgsVectorLayer) layer to be updated;
+        :param rules: (list) list of (condition, {field: expression}), where condition
+        and expressions are SQL and a None condition updates every feature;
+        """
+        if layer.providerType() != "postgres" or layer.isModified():
+            return False
+        uri = layer.dataProvider().uri()
+        table = (
+            f'"{uri.schema()}"."{uri.table()}"'
+            if uri.schema() != ""
+            else f'"{uri.table()}"'
+        )
+        subsetString = layer.subsetString()
+        statements = []
+        for condition, assignments in rules:
+            whereList = [f"({item})" for item in (condition, subsetString) if item]
+            assignmentSql = ", ".join(
+                f'"{field}" = {expression}' for field, expression in assignments.items()
+            )
+            whereSql = f" WHERE {' AND '.join(whereList)}" if whereList else ""
+            statements.append(f"UPDATE {table} SET {assignmentSql}{whereSql};")
+        metadata = QgsProviderRegistry.instance().providerMetadata("postgres")
+        try:
+            connection = metadata.createConnection(uri.uri(), {})
+            # comandos enviados juntos são executados em uma única transação
+            connection.executeSql("\n".join(statements))
+        except QgsProviderConnectionException:
+            return False
+        layer.reload()
+        return True
+
+    def writeChangedAttributes(self, layer, features, updateFunction):
+        """
+        applies updateFunction to each feature and writes only the attributes that it
+        changed. Returns the number of changed features
+        :param layer: (QgsVectorLayer) layer to be updated;
+        :param features: (iterable) features of the layer;
+        :param updateFunction: (function) function that receives a feature, changes
+        its attributes and returns it;
+        """
+        return self.applyAttributeChanges(
+            layer, self.getAttributeChanges(features, updateFunction)
+        )
+
+    def getAttributeChanges(self, features, updateFunction):
+        """
+        applies updateFunction to each feature and returns the attributes that it
+        changed as a {featId: {fieldIdx: value}} map. Nothing is written to the
+        layer, so the features may come from a QgsVectorLayerFeatureSource read
+        outside the main thread
+        :param features: (iterable) features to be evaluated;
+        :param updateFunction: (function) function that receives a feature, changes
+        its attributes and returns it;
+        """
+        attributeChangeMap = dict()
+        for feat in features:
+            oldAttributes = feat.attributes()
+            newAttributes = updateFunction(feat).attributes()
+            changedAttributes = {
+                idx: newValue
+                for idx, (oldValue, newValue) in enumerate(
+                    zip(oldAttributes, newAttributes)
+                )
+                if oldValue != newValue
+            }
+            if changedAttributes:
+                attributeChangeMap[feat.id()] = changedAttributes
+        return attributeChangeMap
+
+    def applyAttributeChanges(self, layer, attributeChangeMap):
+        """
+        writes a {featId: {fieldIdx: value}} map in a single changeAttributeValues
+        call to the data provider. When the layer has unsaved edits the changes go
+        through its edit buffer, so they are kept together with the pending edits.
+        Must run on the main thread. Returns the number of changed features
+        :param layer: (QgsVectorLayer) layer to be updated;
+        :param attributeChangeMap: (dict) changed attributes of each feature;
+        """
+        if not attributeChangeMap:
+            return 0
+        if layer.isModified():
+            layer.beginEditCommand("Atualizando atributos")
+            for featId, changedAttributes in attributeChangeMap.items():
+                layer.changeAttributeValues(featId, changedAttributes)
+            layer.endEditCommand()
+        else:
+            layer.dataProvider().changeAttributeValues(attributeChangeMap)
+            layer.reload()
+        return len(attributeChangeMap)
+
     def buildSpatialIndexAndIdDict(self, inputLyr, feedback=None, featureRequest=None):
         """
         creates a spatial index for the input layer
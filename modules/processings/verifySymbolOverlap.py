@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from typing import Set
+import numpy as np
 import processing
 from qgis.core import (
     QgsField,
@@ -10,6 +11,7 @@ from qgis.core import (
     QgsProcessingParameterVectorLayer,
     QgsGeometry,
     QgsFeature,
+    QgsFeatureRequest,
     QgsPointXY,
     QgsVectorLayer,
     QgsFeatureSink,
@@ -21,7 +23,7 @@ from qgis.core import (
     QgsMarkerSymbol,
     QgsLineSymbol,
     QgsSvgMarkerSymbolLayer,
-    QgsRectangle,
+    QgsSpatialIndex,
     QgsProperty,
     QgsSimpleMarkerSymbolLayer,
     QgsWkbTypes,
@@ -594,8 +596,9 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
             verifyList, scale, fields, context, feedback=multiStepFeedback
         )
         multiStepFeedback.setCurrentStep(2)
+        frameEngine = self.getFrameGeometryEngine(frameLyr)
         featSet = self.removeOutputFeatures(
-            featSet, frameLyr, min_area, context, multiStepFeedback
+            featSet, frameEngine, min_area, multiStepFeedback
         )
         list(
             map(
@@ -614,53 +617,50 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
         return setList
 
     def calculateIntersections(self, layersList, scale, fields, context, feedback=None):
-        featSet = set()
         if feedback is not None:
-            multiStepFeedback = QgsProcessingMultiStepFeedback(
-                5 * len(layersList), feedback
-            )
+            multiStepFeedback = QgsProcessingMultiStepFeedback(2, feedback)
             multiStepFeedback.setCurrentStep(0)
         else:
             multiStepFeedback = None
-        for step, layerSet in enumerate(layersList):
-            layerList = list(layerSet)
-            if len(layerList) == 1:
-                a = b = layerList[0]
-            else:
-                a, b = layerList
+        footprintCache = self.buildSymbolFootprintCache(
+            layersList, scale, context, feedback=multiStepFeedback
+        )
+        if footprintCache is None:
+            return
+        if feedback is not None:
+            multiStepFeedback.setCurrentStep(1)
+        return self.getIntersectionsFeats(
+            footprintCache, layersList, fields, feedback=multiStepFeedback
+        )
+
+    def buildSymbolFootprintCache(self, layersList, scale, context, feedback=None):
+        """
+        Prepares each layer of the verification pairs only once.
+        :param layersList: (list) list of sets of layers to be verified;
+        :param scale: (int) map scale;
+        :param context: (QgsProcessingContext) processing context;
+        :param feedback: (QgsProcessingFeedback) processing feedback;
+        :returns: (dict) {layer: (prepared layer, symbol footprint layer)}
+        """
+        layers = list(dict.fromkeys(lyr for layerSet in layersList for lyr in layerSet))
+        footprintCache = dict()
+        if feedback is not None:
+            multiStepFeedback = QgsProcessingMultiStepFeedback(
+                2 * len(layers), feedback
+            )
+        for step, lyr in enumerate(layers):
             if feedback is not None and feedback.isCanceled():
                 return
             if feedback is not None:
-                multiStepFeedback.setCurrentStep(step * 5)
-            layer_pre_a = self.prepareInputLayer(a, context, None)
-            if feedback is not None:
-                multiStepFeedback.setCurrentStep(step * 5 + 1)
-            layer_a = self.polygonLayer(layer_pre_a, a, scale, context, feedback=None)
-            if a == b:
-                layer_pre_b = layer_pre_a
-                layer_b = layer_a
-            else:
-                if feedback is not None:
-                    multiStepFeedback.setCurrentStep(step * 5 + 2)
-                layer_pre_b = self.prepareInputLayer(b, context, feedback=None)
-                if feedback is not None:
-                    multiStepFeedback.setCurrentStep(step * 5 + 3)
-                layer_b = self.polygonLayer(
-                    layer_pre_b, b, scale, context, feedback=multiStepFeedback
-                )
+                multiStepFeedback.setCurrentStep(2 * step)
+            layer_pre = self.prepareInputLayer(lyr, context, feedback=None)
             if feedback is not None:
-                multiStepFeedback.setCurrentStep(step * 5 + 4)
-            featSet_a_b = self.getIntersectionsFeats(
-                layer_a,
-                layer_pre_a,
-                layer_b,
-                layer_pre_b,
-                fields,
-                context,
-                feedback=multiStepFeedback,
+                multiStepFeedback.setCurrentStep(2 * step + 1)
+            layer_footprint = self.polygonLayer(
+                layer_pre, lyr, scale, context, feedback=None
             )
-            featSet = featSet.union(featSet_a_b)
-        return featSet
+            footprintCache[lyr] = (layer_pre, layer_footprint)
+        return footprintCache
 
     def prepareInputLayer(self, lyr, context, feedback=None) -> QgsVectorLayer:
         if feedback is not None:
@@ -789,6 +789,7 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
         if feedback is not None and layer_with_id_field.featureCount() != 0:
             progressStep = 100 / layer_with_id_field.featureCount()
         toDelete = set()
+        symbolDimensionsDict = dict()
         for step, feat in enumerate(layer_with_id_field.getFeatures()):
             # Precisa refatorar: filtrar casos
             # exceção caixa d'água (constr_deposito_p, tipo = 202), removendo para não verificar
@@ -809,9 +810,17 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
                 return
             if multiStepFeedback is not None:
                 multiStepFeedback.setProgress(progressStep * step)
-            symbolsFeat = renderer.symbolsForFeature(feat, renderContext)
-            width_mm = 1e-13  # default, cannot be null (buffer)
-            if len(symbolsFeat) == 0:
+            symbolKey = self.getSymbolKey(renderer, feat, renderContext)
+            if symbolKey is not None and symbolKey in symbolDimensionsDict:
+                dimensions = symbolDimensionsDict[symbolKey]
+            else:
+                dimensions = self.getSymbolDimensions(
+                    renderer.symbolsForFeature(feat, renderContext), renderContext
+                )
+                if symbolKey is not None:
+                    symbolDimensionsDict[symbolKey] = dimensions
+            if dimensions is None:
+                width_mm = 1e-13  # default, cannot be null (buffer)
                 newAttributes = {
                     feat.fieldNameIndex("width"): scale * (width_mm / 1000),
                     feat.fieldNameIndex("height"): 0,
@@ -820,52 +829,25 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
                 }
                 updateFeats[feat.id()] = newAttributes
                 continue
-            symbolFeat = symbolsFeat[0]
-            if isinstance(symbolFeat, QgsMarkerSymbol):
-                height_mm = width_mm = symbolFeat.size(renderContext)
-                for symbolLyr in symbolFeat.symbolLayers():
-                    if isinstance(symbolLyr, QgsFontMarkerSymbolLayer):
-                        if symbolFeat.symbolLayerCount() == 1:
-                            toDelete.add(feat[id_field])
-                        continue
-                    if (
-                        isinstance(symbolLyr, QgsSimpleMarkerSymbolLayer)
-                        and symbolLyr.size() >= width_mm
-                    ):
-                        height_mm = width_mm = (
-                            symbolLyr.size() + symbolLyr.strokeWidth()
-                        )
-                        offset_x_mm, offset_y_mm = self.calcOffset(symbolLyr)
-                    elif (
-                        isinstance(symbolLyr, QgsSvgMarkerSymbolLayer)
-                        and symbolLyr.size() >= width_mm
-                    ):
-                        ratio = symbolLyr.defaultAspectRatio()
-                        height_mm = width_mm * ratio
-                        offset_x_mm, offset_y_mm = self.calcOffset(symbolLyr)
-                    elif symbolLyr.size() >= width_mm:
-                        offset_x_mm, offset_y_mm = self.calcOffset(symbolLyr)
+            if dimensions["type"] == "marker":
+                if dimensions["fontOnly"]:
+                    toDelete.add(feat[id_field])
                 if not feat[id_field] in toDelete:
                     newAttributes = {
-                        feat.fieldNameIndex("width"): scale * ((width_mm) / 1000),
-                        feat.fieldNameIndex("height"): scale * ((height_mm) / 1000),
-                        feat.fieldNameIndex("offset_x"): scale * (offset_x_mm / 1000),
-                        feat.fieldNameIndex("offset_y"): scale * (offset_y_mm / 1000),
+                        feat.fieldNameIndex("width"): scale
+                        * (dimensions["width"] / 1000),
+                        feat.fieldNameIndex("height"): scale
+                        * (dimensions["height"] / 1000),
+                        feat.fieldNameIndex("offset_x"): scale
+                        * (dimensions["offset_x"] / 1000),
+                        feat.fieldNameIndex("offset_y"): scale
+                        * (dimensions["offset_y"] / 1000),
                     }
                     updateFeats[feat.id()] = newAttributes
-            elif isinstance(symbolFeat, QgsLineSymbol):
+            elif dimensions["type"] == "line":
                 endCap = 1  # Flat
-                for symbolLyr in symbolFeat.symbolLayers():
-                    if feedback is not None and feedback.isCanceled():
-                        return
-                    if isinstance(symbolLyr, QgsMarkerLineSymbolLayer):
-                        continue
-                    offset = symbolLyr.offset()
-                    strokeWidth = symbolLyr.width()
-                    newWidth = abs(offset) + strokeWidth / 2
-                    width_mm = 2 * newWidth if 2 * newWidth > width_mm else width_mm
                 newAttributes = {
-                    feat.fieldNameIndex("width"): scale * ((width_mm) / 1000)
+                    feat.fieldNameIndex("width"): scale * (dimensions["width"] / 1000)
                 }
                 updateFeats[feat.id()] = newAttributes
         if feedback is not None:
@@ -893,6 +875,74 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
         )
         return layer_buffered
 
+    def getSymbolKey(self, renderer, feat, renderContext):
+        """
+        Returns a key identifying the symbol that the renderer resolves for the
+        feature, so features sharing a symbol are measured only once.
+        :param renderer: (QgsFeatureRenderer) started layer renderer;
+        :param feat: (QgsFeature) feature;
+        :param renderContext: (QgsRenderContext) render context;
+        :returns: (frozenset) legend keys of the feature or None if the
+            renderer does not provide them;
+        """
+        legendKeys = renderer.legendKeysForFeature(feat, renderContext)
+        return frozenset(legendKeys) if len(legendKeys) > 0 else None
+
+    def getSymbolDimensions(self, symbolsFeat, renderContext):
+        """
+        Computes the symbol size in millimeters.
+        :param symbolsFeat: (list) symbols resolved for a feature;
+        :param renderContext: (QgsRenderContext) render context;
+        :returns: (dict) symbol type, width, height and offsets or None if
+            there is no symbol;
+        """
+        if len(symbolsFeat) == 0:
+            return None
+        symbolFeat = symbolsFeat[0]
+        width_mm = 1e-13  # default, cannot be null (buffer)
+        if isinstance(symbolFeat, QgsMarkerSymbol):
+            height_mm = width_mm = symbolFeat.size(renderContext)
+            offset_x_mm, offset_y_mm = 0, 0
+            fontOnly = False
+            for symbolLyr in symbolFeat.symbolLayers():
+                if isinstance(symbolLyr, QgsFontMarkerSymbolLayer):
+                    if symbolFeat.symbolLayerCount() == 1:
+                        fontOnly = True
+                    continue
+                if (
+                    isinstance(symbolLyr, QgsSimpleMarkerSymbolLayer)
+                    and symbolLyr.size() >= width_mm
+                ):
+                    height_mm = width_mm = symbolLyr.size() + symbolLyr.strokeWidth()
+                    offset_x_mm, offset_y_mm = self.calcOffset(symbolLyr)
+                elif (
+                    isinstance(symbolLyr, QgsSvgMarkerSymbolLayer)
+                    and symbolLyr.size() >= width_mm
+                ):
+                    ratio = symbolLyr.defaultAspectRatio()
+                    height_mm = width_mm * ratio
+                    offset_x_mm, offset_y_mm = self.calcOffset(symbolLyr)
+                elif symbolLyr.size() >= width_mm:
+                    offset_x_mm, offset_y_mm = self.calcOffset(symbolLyr)
+            return {
+                "type": "marker",
+                "width": width_mm,
+                "height": height_mm,
+                "offset_x": offset_x_mm,
+                "offset_y": offset_y_mm,
+                "fontOnly": fontOnly,
+            }
+        if isinstance(symbolFeat, QgsLineSymbol):
+            for symbolLyr in symbolFeat.symbolLayers():
+                if isinstance(symbolLyr, QgsMarkerLineSymbolLayer):
+                    continue
+                offset = symbolLyr.offset()
+                strokeWidth = symbolLyr.width()
+                newWidth = abs(offset) + strokeWidth / 2
+                width_mm = 2 * newWidth if 2 * newWidth > width_mm else width_mm
+            return {"type": "line", "width": width_mm}
+        return {"type": "other"}
+
     def calcOffset(self, symbolLyr):
         offset_geom = QgsGeometry()
         offset_geom = offset_geom.fromQPointF(symbolLyr.offset())
@@ -902,38 +952,63 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
         return offset_x_mm, offset_y_mm
 
     def updateGeometries(self, layer: QgsVectorLayer, feedback=None):
-        simbRotIndex = layer.fields().indexFromName("simb_rot")
-        updateGeom = {}
+        hasRotation = layer.fields().indexFromName("simb_rot") != -1
+        attributes = ["x", "y", "width", "height", "offset_x", "offset_y"]
+        if hasRotation:
+            attributes.append("simb_rot")
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(attributes, layer.fields())
         if feedback is not None:
-            multiStepFeedback = QgsProcessingMultiStepFeedback(1, feedback)
+            multiStepFeedback = QgsProcessingMultiStepFeedback(2, feedback)
             multiStepFeedback.setCurrentStep(0)
-        if feedback is not None:
-            progressStep = layer.featureCount()
-        for step, feat in enumerate(layer.getFeatures()):
+            nSteps = layer.featureCount()
+            progressStep = 100 / nSteps if nSteps != 0 else 0
+        featIds, values = [], []
+        for step, feat in enumerate(layer.getFeatures(request)):
             if feedback is not None and feedback.isCanceled():
                 return
             if feedback is not None:
                 multiStepFeedback.setProgress(progressStep * step)
-            x = feat["x"]
-            width = feat["width"]
-            offset_x = feat["offset_x"]
-            y = feat["y"]
-            height = feat["height"]
-            offset_y = feat["offset_y"]
-            rect = QgsRectangle(
-                x - width / 2 + offset_x,
-                y - height / 2 - offset_y,
-                x + width / 2 + offset_x,
-                y + height / 2 - offset_y,
+            simb_rot = (
+                feat["simb_rot"] if hasRotation and feat["simb_rot"] != NULL else 0
+            )
+            featIds.append(feat.id())
+            values.append(
+                (
+                    feat["x"],
+                    feat["y"],
+                    feat["width"],
+                    feat["height"],
+                    feat["offset_x"],
+                    feat["offset_y"],
+                    simb_rot,
+                )
+            )
+        if len(featIds) == 0:
+            return
+        if feedback is not None:
+            multiStepFeedback.setCurrentStep(1)
+        x, y, width, height, offset_x, offset_y, simb_rot = np.array(
+            values, dtype=float
+        ).T
+        # corners relative to the point, in the same order as QgsGeometry.fromRect
+        left, right = offset_x - width / 2, offset_x + width / 2
+        bottom, top = -offset_y - height / 2, -offset_y + height / 2
+        dx = np.stack([left, left, right, right, left], axis=1)
+        dy = np.stack([bottom, top, top, bottom, bottom], axis=1)
+        # clockwise rotation around the point, as done by QgsGeometry.rotate
+        theta = np.radians(simb_rot)[:, np.newaxis]
+        cornersX = x[:, np.newaxis] + dx * np.cos(theta) + dy * np.sin(theta)
+        cornersY = y[:, np.newaxis] - dx * np.sin(theta) + dy * np.cos(theta)
+        updateGeom = {
+            featId: QgsGeometry.fromMultiPolygonXY(
+                [[[QgsPointXY(px, py) for px, py in zip(ringX, ringY)]]]
             )
-            newGeom = QgsGeometry()
-            newGeom = newGeom.fromRect(rect)
-            newGeom.convertToMultiType()
-            if simbRotIndex != -1:
-                simb_rot = feat["simb_rot"] if feat["simb_rot"] != NULL else 0
-                pxy = QgsPointXY(x, y)
-                newGeom.rotate(simb_rot, pxy)
-            updateGeom[feat.id()] = newGeom
+            for featId, ringX, ringY in zip(
+                featIds, cornersX.tolist(), cornersY.tolist()
+            )
+        }
         layer.startEditing()
         dp = layer.dataProvider()
         dp.changeGeometryValues(updateGeom)
@@ -941,77 +1016,107 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
 
     def getIntersectionsFeats(
         self,
-        layer1: QgsVectorLayer,
-        layer1_pre: QgsVectorLayer,
-        layer2: QgsVectorLayer,
-        layer2_pre: QgsVectorLayer,
+        footprintCache,
+        layersList,
         fields,
-        context,
-        frameLyr=None,
         feedback=None,
     ) -> Set[QgsFeature]:
+        """
+        Finds the symbol overlaps of every verified layer pair in a single
+        sweep over one spatial index holding the footprints of all layers.
+        :param footprintCache: (dict) {layer: (prepared layer, footprint layer)};
+        :param layersList: (list) list of sets of layers to be verified;
+        :param fields: (QgsFields) output fields;
+        :param feedback: (QgsProcessingFeedback) processing feedback;
+        :returns: (set) set of overlap features;
+        """
         features = set()
         if feedback is not None:
-            multiStepFeedback = QgsProcessingMultiStepFeedback(6, feedback)
+            multiStepFeedback = QgsProcessingMultiStepFeedback(2, feedback)
             multiStepFeedback.setCurrentStep(0)
         else:
             multiStepFeedback = None
-        newlayer1 = self.addIdField(layer1.clone(), "id_pol", context, None)
-        if feedback is not None:
-            multiStepFeedback.setCurrentStep(1)
-        newlayer2 = self.addIdField(layer2.clone(), "id_pol", context, None)
-        if feedback is not None:
-            multiStepFeedback.setCurrentStep(2)
-        self.algRunner.runCreateSpatialIndex(newlayer1, context, None)
-        if feedback is not None:
-            multiStepFeedback.setCurrentStep(3)
-        self.algRunner.runCreateSpatialIndex(newlayer2, context, None)
-        if feedback is not None:
-            multiStepFeedback.setCurrentStep(4)
-        interLayer = self.algRunner.runJoinAttributesByLocation(
-            inputLyr=newlayer1, joinLyr=newlayer2, context=context
+        pairsToVerify = set(frozenset(layerSet) for layerSet in layersList)
+        spatialIdx, footprintDict = self.buildFootprintSpatialIndex(
+            footprintCache, feedback=multiStepFeedback
         )
+        if spatialIdx is None:
+            return
         if feedback is not None:
-            multiStepFeedback.setCurrentStep(5)
-            nSteps = interLayer.featureCount()
+            multiStepFeedback.setCurrentStep(1)
+            nSteps = len(footprintDict)
             progressStep = 100 / nSteps if nSteps != 0 else 0
-        alreadyVerify = []
-        for step, feat in enumerate(interLayer.getFeatures()):
+        alreadyVerify = set()
+        for step, (key, (lyr1, feat1)) in enumerate(footprintDict.items()):
             if feedback is not None and feedback.isCanceled():
                 return
-            if {feat["id"], feat["id_2"]} in alreadyVerify:
-                continue
-            alreadyVerify.append({feat["id"], feat["id_2"]})
-            if feat["id"] == feat["id_2"]:
-                continue
-            feat1_orig = layer1_pre.getFeature(feat["new_id"])
-            feat2_orig = layer2_pre.getFeature(feat["new_id_2"])
-            if feat1_orig.geometry().intersects(feat2_orig.geometry()):
-                continue
-            feat1 = layer1.getFeature(feat["id_pol"])
-            feat2 = layer2.getFeature(feat["id_pol_2"])
-            intersection = feat1.geometry().intersection(feat2.geometry())
-            if intersection.isEmpty() or (
-                not intersection.wkbType() == QgsWkbTypes.Polygon
-                and not intersection.wkbType() == QgsWkbTypes.MultiPolygon
-            ):
-                continue
-            if frameLyr is not None:
-                if not self.geomInLayer(intersection, frameLyr, multiStepFeedback):
+            geom1 = feat1.geometry()
+            for candidateKey in spatialIdx.intersects(geom1.boundingBox()):
+                lyr2, feat2 = footprintDict[candidateKey]
+                if frozenset({lyr1, lyr2}) not in pairsToVerify:
+                    continue
+                if candidateKey == key or (lyr1 == lyr2 and feat1["id"] == feat2["id"]):
+                    continue
+                pairKey = self.getPairKey(lyr1, feat1, lyr2, feat2)
+                if pairKey in alreadyVerify:
+                    continue
+                alreadyVerify.add(pairKey)
+                feat1_orig = footprintCache[lyr1][0].getFeature(feat1["new_id"])
+                feat2_orig = footprintCache[lyr2][0].getFeature(feat2["new_id"])
+                if feat1_orig.geometry().intersects(feat2_orig.geometry()):
                     continue
-            intersection.convertToMultiType()
-            newFeat = QgsFeature(fields)
-            newFeat.setGeometry(intersection)
-            id1 = feat["id"] if feat["id"] is not None else "NULL"
-            id2 = feat["id_2"] if feat["id_2"] is not None else "NULL"
-            newFeat["id"] = id1 + "_" + id2
-            newFeat["camada_1"] = feat1["nome_camada"]
-            newFeat["camada_2"] = feat2["nome_camada"]
-            features.add(newFeat)
+                intersection = geom1.intersection(feat2.geometry())
+                if intersection.isEmpty() or (
+                    not intersection.wkbType() == QgsWkbTypes.Polygon
+                    and not intersection.wkbType() == QgsWkbTypes.MultiPolygon
+                ):
+                    continue
+                intersection.convertToMultiType()
+                newFeat = QgsFeature(fields)
+                newFeat.setGeometry(intersection)
+                id1 = feat1["id"] if feat1["id"] is not None else "NULL"
+                id2 = feat2["id"] if feat2["id"] is not None else "NULL"
+                newFeat["id"] = id1 + "_" + id2
+                newFeat["camada_1"] = feat1["nome_camada"]
+                newFeat["camada_2"] = feat2["nome_camada"]
+                features.add(newFeat)
             if feedback is not None:
                 multiStepFeedback.setProgress(progressStep * step)
         return features
 
+    def getPairKey(self, lyr1, feat1, lyr2, feat2):
+        """
+        Returns an order independent hashable key for a pair of features.
+        :param lyr1: (QgsVectorLayer) source layer of the first feature;
+        :param feat1: (QgsFeature) first footprint feature;
+        :param lyr2: (QgsVectorLayer) source layer of the second feature;
+        :param feat2: (QgsFeature) second footprint feature;
+        :returns: (frozenset) pair key;
+        """
+        return frozenset({(lyr1.id(), feat1["id"]), (lyr2.id(), feat2["id"])})
+
+    def buildFootprintSpatialIndex(self, footprintCache, feedback=None):
+        """
+        Puts the symbol footprints of all layers into one spatial index.
+        :param footprintCache: (dict) {layer: (prepared layer, footprint layer)};
+        :param feedback: (QgsProcessingFeedback) processing feedback;
+        :returns: (tuple) spatial index and {key: (source layer, footprint)};
+        """
+        spatialIdx = QgsSpatialIndex()
+        footprintDict = dict()
+        nSteps = sum(lyr.featureCount() for _, lyr in footprintCache.values())
+        progressStep = 100 / nSteps if nSteps != 0 else 0
+        for lyr, (_, layer_footprint) in footprintCache.items():
+            for feat in layer_footprint.getFeatures():
+                if feedback is not None and feedback.isCanceled():
+                    return None, None
+                key = len(footprintDict)
+                footprintDict[key] = (lyr, feat)
+                spatialIdx.addFeature(key, feat.geometry().boundingBox())
+                if feedback is not None:
+                    feedback.setProgress(progressStep * key)
+        return spatialIdx, footprintDict
+
     def removeNullGeometries(
         self, inputLayer, context, feedback=None, outputLyr=None, removeEmpty=False
     ):
@@ -1029,27 +1134,34 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
         )
         return output["OUTPUT"]
 
-    def geomInLayer(
-        self, geom: QgsGeometry, lyr: QgsVectorLayer, feedback=None
-    ) -> bool:
-        for feat in lyr.getFeatures():
-            if feedback is not None and feedback.isCanceled():
-                return
-            if geom.within(feat.geometry()):
-                return True
-        return False
+    def getFrameGeometryEngine(self, frameLyr: QgsVectorLayer):
+        """
+        Loads the frame once as a prepared geometry engine.
+        :param frameLyr: (QgsVectorLayer) dissolved frame layer;
+        :returns: (QgsGeometryEngine) prepared engine or None if there is no
+            frame geometry;
+        """
+        if frameLyr is None:
+            return None
+        frameGeom = QgsGeometry.unaryUnion(
+            [feat.geometry() for feat in frameLyr.getFeatures()]
+        )
+        if frameGeom.isNull() or frameGeom.isEmpty():
+            return None
+        frameEngine = QgsGeometry.createGeometryEngine(frameGeom.constGet())
+        frameEngine.prepareGeometry()
+        return frameEngine
 
     def removeOutputFeatures(
         self,
         feats: Set[QgsFeature],
-        frameLyr: QgsVectorLayer,
+        frameEngine,
         areaInput,
-        context,
         feedback=None,
     ):
-        featsToRemove = set()
+        featsToKeep = set()
         if feedback is not None:
-            progressStep = 100 / len(feats)
+            progressStep = 100 / len(feats) if len(feats) != 0 else 0
         for step, feat in enumerate(feats):
             if feedback is not None and feedback.isCanceled():
                 return
@@ -1057,18 +1169,10 @@ class VerifySymbolOverlap(QgsProcessingAlgorithm):
                 feedback.setProgress(progressStep * step)
             geom = feat.geometry()
             if geom.area() < areaInput:
-                featsToRemove.add(feat)
-        featsToKeep = feats - featsToRemove
-        if frameLyr is None:
-            return featsToKeep
-        dissolvedFrame = self.algRunner.runDissolve(frameLyr, context)
-        for feat in dissolvedFrame.getFeatures():
-            dissolved_geom = feat.geometry()
-            break
-        for feat in featsToKeep:
-            feat_geom = feat.geometry()
-            if not feat_geom.intersects(dissolved_geom):
-                featsToKeep.remove(feat)
+                continue
+            if frameEngine is not None and not frameEngine.intersects(geom.constGet()):
+                continue
+            featsToKeep.add(feat)
         return featsToKeep
 
     def tr(self, string):
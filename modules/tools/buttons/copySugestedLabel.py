@@ -1,12 +1,9 @@
 # -*- coding: utf-8 -*-
 
 from pathlib import Path
-from PyQt5.QtCore import QVariant
 from qgis.core import (
     QgsProject,
     QgsFeature,
-    QgsFeatureIterator,
-    QgsFeatureRequest,
     QgsGeometry,
     QgsDistanceArea,
     QgsPoint,
@@ -16,8 +13,6 @@ from qgis.core import (
     QgsExpressionContextScope,
     QgsPalLayerSettings,
     QgsVectorLayerSimpleLabeling,
-    QgsFields,
-    QgsField,
     QgsCoordinateReferenceSystem,
     QgsCoordinateTransformContext,
     QgsSpatialIndex,
@@ -40,6 +35,9 @@ class CopySugestedLabel(QgsMapToolEmitPoint, BaseTools):
         self.productTypeSelector = productTypeSelector
         self.mapCanvas = iface.mapCanvas()
         self.box = ComboBox(self.iface.mainWindow())
+        # índices dos rótulos por camada, refeitos após cada renderização do canvas
+        self.labelIndexes = dict()
+        self.mapCanvas.renderComplete.connect(self.clearLabelIndexes)
         self.canvasClicked.connect(self.mouseClick)
 
     def setupUi(self):
@@ -222,45 +220,22 @@ class CopySugestedLabel(QgsMapToolEmitPoint, BaseTools):
             )
         else:
             self.tolerance = self.getScale() * 0.01
-        # Get letter features
-        self.letter_label_features = []
-        for label in self.iface.mapCanvas().labelingResults().allLabels():
-            if label.layerID != self.srcLyr.id():
-                continue
-            feat = QgsFeature()
-            featFields = QgsFields()
-            featFields.append(QgsField("labelText", QVariant.String))
-            feat.setFields(featFields)
-            feat.setGeometry(label.labelGeometry)
-            feat["labelText"] = label.labelText
-            feat.setId(label.featureId)
-            self.letter_label_features.append(feat)
-
-        # Make label index
-        self.labelSpatialIndex = QgsSpatialIndex(
-            flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-        )
-        feat_iterator = QgsFeatureIterator()
-        for letter_label_feat in self.letter_label_features:
-            self.labelSpatialIndex.addFeature(letter_label_feat)
-
         # Get closest label
         if not (self.isActive() and self.dstLyrP and self.dstLyrL):
             return
-        labelClosestSpatialID = self.labelSpatialIndex.nearestNeighbor(
-            pos, maxDistance=2 * self.tolerance
+        labelSpatialIndex, letterFeatIds, lettersByFeat = self.getLabelIndex(
+            self.srcLyr.id()
         )
-        label_request = QgsFeatureRequest().setFilterFids(labelClosestSpatialID)
-        closestSpatialID = (
-            False if len(labelClosestSpatialID) == 0 else labelClosestSpatialID[0]
+        closestLetterIds = labelSpatialIndex.nearestNeighbor(
+            pos, maxDistance=2 * self.tolerance
         )
-        closestFeat = self.srcLyr.getFeatures(label_request)
 
         # Copying label geometry to generic label layer
-        if not closestSpatialID:
+        if not closestLetterIds:
             self.displayErrorMessage("Não foram encontradas feições na camada ativa")
             return
-        feat = next(closestFeat)
+        closestSpatialID = letterFeatIds[closestLetterIds[0]]
+        feat = self.srcLyr.getFeature(closestSpatialID)
         if not self.checkFeature(feat):
             self.displayErrorMessage(
                 self.tr("Feição inválida. Verifique os atributos na camada ativa.")
@@ -268,11 +243,7 @@ class CopySugestedLabel(QgsMapToolEmitPoint, BaseTools):
             return
         nome = feat.attribute("texto_edicao")
         sugestedLabelGeometry, word_text, centroidGeom = self.getSugestedLabelGeometry(
-            [
-                (label_feature.geometry(), label_feature["labelText"])
-                for label_feature in self.letter_label_features
-                if label_feature.id() == closestSpatialID
-            ]
+            lettersByFeat[closestSpatialID]
         )
         sugestedLabelConfig = self.getSugestedLabelConfig(feat)
         if sugestedLabelConfig["found"]:
@@ -288,6 +259,44 @@ class CopySugestedLabel(QgsMapToolEmitPoint, BaseTools):
                 self.tr("Feição inválida. Verifique as configurações do rótulo.")
             )
 
+    def clearLabelIndexes(self, *args):
+        self.labelIndexes = dict()
+
+    def getLabelIndex(self, layerId):
+        """
+        Returns the label index of the layer, built from the labeling results of the
+        last canvas render: a QgsSpatialIndex of the letters, the feature id of each
+        letter and the (geometry, text) letters of each feature
+        """
+        if not self.labelIndexes:
+            self.buildLabelIndexes()
+        return self.labelIndexes.get(layerId, (QgsSpatialIndex(), dict(), dict()))
+
+    def buildLabelIndexes(self):
+        labelingResults = self.mapCanvas.labelingResults()
+        if labelingResults is None:
+            return
+        for label in labelingResults.allLabels():
+            if label.layerID not in self.labelIndexes:
+                self.labelIndexes[label.layerID] = (
+                    QgsSpatialIndex(flags=QgsSpatialIndex.FlagStoreFeatureGeometries),
+                    dict(),
+                    dict(),
+                )
+            labelSpatialIndex, letterFeatIds, lettersByFeat = self.labelIndexes[
+                label.layerID
+            ]
+            # um rótulo curvo tem várias letras da mesma feição, então cada letra
+            # recebe um id próprio no índice
+            letterId = len(letterFeatIds)
+            letterFeat = QgsFeature(letterId)
+            letterFeat.setGeometry(label.labelGeometry)
+            labelSpatialIndex.addFeature(letterFeat)
+            letterFeatIds[letterId] = label.featureId
+            lettersByFeat.setdefault(label.featureId, []).append(
+                (label.labelGeometry, label.labelText)
+            )
+
     @staticmethod
     def checkFeature(feat):
         return not not feat.attribute("texto_edicao")
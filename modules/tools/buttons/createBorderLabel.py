@@ -33,12 +33,12 @@ from qgis.core import (
     QgsProject,
     QgsLineString,
     QgsPoint,
-    QgsSpatialIndex,
     QgsUnitTypes,
     QgsPointXY,
 )
 
 from .baseTools import BaseTools
+from .utils.spatialIndexRegistry import getLayerSpatialIndex
 
 
 class CreateBorderLabel(gui.QgsMapTool, BaseTools):
@@ -382,13 +382,15 @@ class CreateBorderLabel(gui.QgsMapTool, BaseTools):
             )
         else:
             self.tolerance = self.getScale() * 0.005
-        self.spatialIndex = QgsSpatialIndex(
-            srcLyr[0].getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-        )
+        self.spatialIndex = getLayerSpatialIndex(self.srcLyr)
         return True
 
     def getIntersection(self, drawnLine: QgsGeometry) -> tuple[QgsFeature, QgsPoint]:
-        for feat in self.srcLyr.getFeatures():
+        candidateIds = self.spatialIndex.intersects(drawnLine.boundingBox())
+        if not candidateIds:
+            return None, None
+        request = QgsFeatureRequest().setFilterFids(candidateIds)
+        for feat in self.srcLyr.getFeatures(request):
             if feat.geometry().intersects(drawnLine):
                 # This is the feature we want!
                 intersectionPoint = feat.geometry().intersection(drawnLine).asPoint()
@@ -8,12 +8,12 @@ from qgis.core import (
     QgsFeatureRequest,
     QgsGeometry,
     QgsProject,
-    QgsSpatialIndex,
     QgsUnitTypes,
 )
 from qgis.gui import QgsMapToolEmitPoint
 
 from .baseTools import BaseTools
+from .utils.spatialIndexRegistry import getLayerSpatialIndex
 from .utils.comboBox import ComboBox
 from ...processings.processingUtils import ProcessingUtils
 
@@ -144,7 +144,5 @@ class CreateLakeLabel(QgsMapToolEmitPoint, BaseTools):
             )
         else:
             self.tolerance = self.getScale() * 0.01
-        self.spatialIndex = QgsSpatialIndex(
-            srcLyr[0].getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-        )
+        self.spatialIndex = getLayerSpatialIndex(self.srcLyr)
         return True
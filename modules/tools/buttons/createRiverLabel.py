@@ -11,13 +11,13 @@ from qgis.core import (
     QgsGeometry,
     QgsLineString,
     QgsProject,
-    QgsSpatialIndex,
     QgsUnitTypes,
     QgsPointXY,
 )
 from qgis.gui import QgsMapToolEmitPoint
 
 from .baseTools import BaseTools
+from .utils.spatialIndexRegistry import getLayerSpatialIndex
 from .utils.comboBox import ComboBox
 from PyQt5.QtCore import QVariant
 
@@ -249,7 +249,5 @@ class CreateRiverLabel(QgsMapToolEmitPoint, BaseTools):
             )
         else:
             self.tolerance = self.getScale() * 0.005
-        self.spatialIndex = QgsSpatialIndex(
-            srcLyr[0].getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-        )
+        self.spatialIndex = getLayerSpatialIndex(self.srcLyr)
         return True
@@ -6,7 +6,6 @@ from qgis.core import (
     QgsGeometry,
     QgsProject,
     QgsPoint,
-    QgsSpatialIndex,
     QgsDistanceArea,
     QgsCoordinateTransformContext,
     QgsCoordinateReferenceSystem,
@@ -16,6 +15,7 @@ from qgis.core import (
 from qgis.gui import QgsMapToolEmitPoint
 
 from .baseTools import BaseTools
+from .utils.spatialIndexRegistry import getLayerSpatialIndex
 from PyQt5.QtWidgets import QMenu
 from PyQt5.QtGui import QCursor
 
@@ -178,7 +178,5 @@ class CreateRoadIdentifierSymbol(QgsMapToolEmitPoint, BaseTools):
             )
         else:
             self.tolerance = self.getScale() * 0.01
-        self.spatialIndex = QgsSpatialIndex(
-            srcLyr[0].getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-        )
+        self.spatialIndex = getLayerSpatialIndex(self.srcLyr)
         return True
@@ -2,6 +2,7 @@ from math import sqrt
 import math
 from pathlib import Path
 from .baseTools import BaseTools
+from .utils.spatialIndexRegistry import getLayerSpatialIndex
 from .utils.comboBox import ComboBox
 from qgis.gui import QgsMapToolEmitPoint
 from qgis.core import (
@@ -13,7 +14,6 @@ from qgis.core import (
     QgsGeometry,
     QgsLineString,
     QgsProject,
-    QgsSpatialIndex,
     QgsUnitTypes,
 )
 
@@ -240,9 +240,7 @@ class CreateRoadLabel(QgsMapToolEmitPoint, BaseTools):
             )
         else:
             self.tolerance = self.getScale() * 0.003
-        self.spatialIndex = QgsSpatialIndex(
-            srcLyr[0].getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
-        )
+        self.spatialIndex = getLayerSpatialIndex(self.srcLyr)
         return True
 
     def getRoadLabelDisplacement(self, feat):
@@ -0,0 +1,193 @@
+import concurrent.futures
+
+from qgis.PyQt.QtCore import QCoreApplication, QThread
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsProject,
+    QgsSpatialIndex,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource,
+)
+
+# índices compartilhados entre as ferramentas, por id da camada
+layerIndexes = dict()
+# criado no primeiro uso e encerrado no unload do plugin
+indexPool = None
+
+
+def getLayerSpatialIndex(layer: QgsVectorLayer):
+    """
+    Returns the shared spatial index of the layer, starting to build it in the
+    background on the first request. Only project layers used from the main thread
+    are shared; temporary layers, such as processing outputs, get a local
+    QgsSpatialIndex, so they are not kept alive by the registry
+    """
+    if not isSharedLayer(layer):
+        return QgsSpatialIndex(
+            layer.getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
+        )
+    layerIndex = layerIndexes.get(layer.id())
+    if layerIndex is None:
+        layerIndex = LayerSpatialIndex(layer)
+        layerIndexes[layer.id()] = layerIndex
+        layer.willBeDeleted.connect(lambda layerId=layer.id(): dropIndex(layerId))
+    return layerIndex
+
+
+def isSharedLayer(layer: QgsVectorLayer):
+    app = QCoreApplication.instance()
+    return (
+        app is not None
+        and QThread.currentThread() == app.thread()
+        and layer.id() in QgsProject.instance().mapLayers()
+    )
+
+
+def dropIndex(layerId):
+    layerIndexes.pop(layerId, None)
+
+
+def getIndexPool() -> concurrent.futures.ThreadPoolExecutor:
+    global indexPool
+    if indexPool is None:
+        indexPool = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    return indexPool
+
+
+def shutdownIndexPool():
+    """
+    Drops the shared indexes and stops the threads that build them. Called when the
+    plugin is unloaded
+    """
+    global indexPool
+    for layerIndex in layerIndexes.values():
+        layerIndex.disconnectSignals()
+    layerIndexes.clear()
+    if indexPool is not None:
+        indexPool.shutdown(wait=True)
+        indexPool = None
+
+
+def buildIndex(source: QgsVectorLayerFeatureSource) -> QgsSpatialIndex:
+    return QgsSpatialIndex(
+        source.getFeatures(), flags=QgsSpatialIndex.FlagStoreFeatureGeometries
+    )
+
+
+class LayerSpatialIndex:
+    """
+    QgsSpatialIndex of a layer, holding its geometries. It is built once on a
+    worker thread from a QgsVectorLayerFeatureSource snapshot and is kept up to
+    date by the edit signals of the layer. The edits received while the index is
+    being built are replayed on the main thread when it is first used
+    """
+
+    def __init__(self, layer: QgsVectorLayer):
+        self.layer = layer
+        self.future = None
+        self.index = None
+        self.pendingEdits = []
+        # feições ainda no buffer de edição, que recebem um novo id no commit
+        self.tempIds = set()
+        self.startBuild()
+        for signal, slot in self.getSignalSlots():
+            signal.connect(slot)
+
+    def getSignalSlots(self):
+        return [
+            (self.layer.featureAdded, self.onFeatureAdded),
+            (self.layer.geometryChanged, self.onGeometryChanged),
+            (self.layer.featureDeleted, self.onFeatureDeleted),
+            (self.layer.committedFeaturesAdded, self.onCommittedFeaturesAdded),
+            (self.layer.afterRollBack, self.startBuild),
+            (self.layer.subsetStringChanged, self.startBuild),
+            # escritas direto no provedor não emitem os sinais de edição
+            (self.layer.dataProvider().dataChanged, self.startBuild),
+        ]
+
+    def disconnectSignals(self):
+        try:
+            for signal, slot in self.getSignalSlots():
+                signal.disconnect(slot)
+        except (TypeError, RuntimeError):
+            # camada já removida ou sinal já desconectado
+            pass
+
+    def startBuild(self):
+        self.index = None
+        self.pendingEdits = []
+        editBuffer = self.layer.editBuffer()
+        self.tempIds = (
+            set(editBuffer.addedFeatures().keys()) if editBuffer is not None else set()
+        )
+        self.future = getIndexPool().submit(
+            buildIndex, QgsVectorLayerFeatureSource(self.layer)
+        )
+
+    def getIndex(self) -> QgsSpatialIndex:
+        if self.index is None:
+            self.index = self.future.result()
+            for edit, args in self.pendingEdits:
+                edit(*args)
+            self.pendingEdits = []
+        return self.index
+
+    def nearestNeighbor(self, point, neighbors=1, maxDistance=0):
+        return self.getIndex().nearestNeighbor(point, neighbors, maxDistance)
+
+    def intersects(self, rectangle):
+        return self.getIndex().intersects(rectangle)
+
+    def geometry(self, featId) -> QgsGeometry:
+        return self.getIndex().geometry(featId)
+
+    def runEdit(self, edit, *args):
+        if self.index is None:
+            self.pendingEdits.append((edit, args))
+            return
+        edit(*args)
+
+    def onFeatureAdded(self, featId):
+        if featId < 0:
+            self.tempIds.add(featId)
+        self.runEdit(self.addFeature, featId)
+
+    def onGeometryChanged(self, featId, geometry):
+        self.runEdit(self.replaceGeometry, featId, QgsGeometry(geometry))
+
+    def onFeatureDeleted(self, featId):
+        self.tempIds.discard(featId)
+        self.runEdit(self.removeFeature, featId)
+
+    def onCommittedFeaturesAdded(self, layerId, features):
+        tempIds, self.tempIds = self.tempIds, set()
+        for featId in tempIds:
+            self.runEdit(self.removeFeature, featId)
+        for feat in features:
+            self.runEdit(self.addIndexedFeature, QgsFeature(feat))
+
+    def addFeature(self, featId):
+        feat = self.layer.getFeature(featId)
+        if feat.isValid():
+            self.addIndexedFeature(feat)
+
+    def addIndexedFeature(self, feat):
+        # no commit, a feição chega por committedFeaturesAdded e por featureAdded
+        if not feat.hasGeometry() or not self.index.geometry(feat.id()).isNull():
+            return
+        self.index.addFeature(feat)
+
+    def replaceGeometry(self, featId, geometry):
+        self.removeFeature(featId)
+        feat = QgsFeature(featId)
+        feat.setGeometry(geometry)
+        self.addIndexedFeature(feat)
+
+    def removeFeature(self, featId):
+        geometry = self.index.geometry(featId)
+        if geometry.isNull():
+            return
+        feat = QgsFeature(featId)
+        feat.setGeometry(geometry)
+        self.index.deleteFeature(feat)
@@ -26,6 +26,7 @@ from .buttons.alternateBuildingFlag import AlternateBuildingFlag
 from .buttons.cycleSideVisibility import CycleSideVisibility
 from .buttons.cycleTipVisibility import CycleTipVisibility
 from .buttons.toggleVisibility import ToggleVisibility
+from .buttons.utils.spatialIndexRegistry import shutdownIndexPool
 
 
 class SetupButtons:
@@ -247,6 +248,7 @@ class SetupButtons:
         self.iface.projectRead.disconnect(self.loadStateFromProject)
         self.toolBar.clear()
         self.iface.mainWindow().removeToolBar(self.toolBar)
+        shutdownIndexPool()
 
     def saveStateOnProject(self):
         comboBoxesStateDict = {
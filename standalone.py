@@ -1,4 +1,8 @@
 import argparse
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import multiprocessing.util
 from pathlib import Path
 import os
 import sys
@@ -13,13 +17,153 @@ from qgis.core import QgsApplication, QgsNetworkAccessManager, QgsExpression
 from qgis.PyQt.QtNetwork import QNetworkProxy
 from qgis import core, gui
 
+# objetos iniciados em cada processo do modo de exportação em paralelo
+workerQgis = None
+workerController = None
+# número de produtos exportados por processo antes de ele ser substituído, para que
+# o estado do projeto e das camadas não se acumule
+PRODUCTS_PER_WORKER = 10
+
 
 def exportMaps(args):
     from ferramentas_edicao.controllers.mapBuilderController import MapBuildController
 
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))
     controller = MapBuildController(args, None)
-    controller.run()
+    return controller.run()
+
+
+def exportMapsInParallel(args):
+    """Splits the json files among args.workers processes, each one running its own
+    QgsApplication, and gathers the export status of every product. If a worker
+    dies, the products that did not finish are reported as failed.
+    Args:
+        args: parsed command line arguments
+    Returns:
+        A list with the export status of each product
+    """
+    nWorkers = min(args.workers, len(args.json))
+    poolArgs = {
+        "max_workers": nWorkers,
+        "mp_context": multiprocessing.get_context("spawn"),
+        "initializer": initWorker,
+        "initargs": (args,),
+    }
+    if sys.version_info >= (3, 11):
+        poolArgs["max_tasks_per_child"] = PRODUCTS_PER_WORKER
+    productStatus = []
+    with concurrent.futures.ProcessPoolExecutor(**poolArgs) as executor:
+        futures = {
+            executor.submit(exportProductInWorker, jsonPath): jsonPath
+            for jsonPath in args.json
+        }
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                status = future.result()
+            except BrokenProcessPool as e:
+                status = [
+                    {
+                        "json": str(futures[future]),
+                        "success": False,
+                        "message": f"Processo de exportação encerrado: {e}",
+                    }
+                ]
+            productStatus.extend(status)
+            for record in status:
+                print(
+                    f"{record['json']}: "
+                    f"{'sucesso' if record['success'] else record['message']}"
+                )
+    return productStatus
+
+
+def initWorker(args):
+    """Starts the QgsApplication of a worker process. The started objects are held
+    in a module variable so they live as long as the worker.
+    Args:
+        args: parsed command line arguments
+    """
+    global workerQgis
+    workerQgis = startQgis(args)
+    startNetwork(args)
+    # os processos do pool não executam os handlers do atexit
+    multiprocessing.util.Finalize(None, exitWorker, exitpriority=10)
+
+
+def exitWorker():
+    """Releases the controller and exits the QgsApplication of a worker process"""
+    global workerQgis, workerController
+    workerController = None
+    if workerQgis is not None:
+        workerQgis["qgs"].exitQgis()
+        workerQgis = None
+
+
+def exportProductInWorker(jsonPath):
+    """Builds and exports a single product inside a worker process
+    Args:
+        jsonPath: path of the product json
+    Returns:
+        A list with the export status of the product
+    """
+    from ferramentas_edicao.controllers.mapBuilderController import MapBuildController
+
+    global workerController
+    sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+    args = workerQgis["args"]
+    productArgs = argparse.Namespace(**{**vars(args), "json": [jsonPath]})
+    if workerController is None:
+        workerController = MapBuildController(productArgs, None)
+    workerController.dlg = productArgs
+    try:
+        return workerController.run()
+    except Exception as e:
+        return [{"json": str(jsonPath), "success": False, "message": str(e)}]
+
+
+def startQgis(args):
+    """Starts QGIS, the processing providers and the custom expression functions
+    Args:
+        args: parsed command line arguments
+    Returns:
+        A dict holding the started objects, which must be kept alive while exporting
+    """
+    qgs = QgsApplication([], True, profileFolder="default")
+    qgs.initQgis()
+    p = Path(args.pathQgis)
+    prefixPath = p / "apps/qgis"
+    qgs.setPrefixPath(str(prefixPath), True)
+    pluginsFolder = Path(
+        "~\\AppData\\Roaming\\QGIS\\QGIS3\\profiles\\default\\python\\plugins"
+    ).expanduser()
+    qgs.setPluginPath(str(pluginsFolder))
+    sys.path.append(str(p / "apps/qgis/python/plugins"))
+    sys.path.append(str(pluginsFolder))
+
+    from ferramentas_edicao.modules.expressionFunctions.functions.createCustomGridNumbers import (
+        longNumber,
+        shortNumber,
+    )
+    from processing.core.Processing import Processing
+    from ferramentas_edicao.modules.processings.provider import Provider
+    from DsgTools.core.DSGToolsProcessingAlgs.dsgtoolsProcessingAlgorithmProvider import (
+        DSGToolsProcessingAlgorithmProvider,
+    )
+
+    Processing.initialize()
+    feProvider = Provider()
+    QgsApplication.processingRegistry().addProvider(feProvider)
+    dsgtoolsProvider = DSGToolsProcessingAlgorithmProvider()
+    QgsApplication.processingRegistry().addProvider(dsgtoolsProvider)
+    QgsExpression.registerFunction(longNumber)
+    QgsExpression.registerFunction(shortNumber)
+    # os providers e as funções deixam de existir se forem coletados pelo garbage collector
+    return {
+        "args": args,
+        "qgs": qgs,
+        "providers": (feProvider, dsgtoolsProvider),
+        "functions": (longNumber, shortNumber),
+    }
 
 
 def setupArgparser():
@@ -51,6 +195,13 @@ def setupArgparser():
     parser.add_argument("-ppass", "--proxyPassword")
     parser.add_argument("-ef", "--exportFolder", required=True)
     parser.add_argument("-et", "--exportTiff", action="store_true")
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Número de processos de exportação em paralelo",
+    )
     return parser.parse_args()
 
 
@@ -79,37 +230,13 @@ def startNetwork(args):
 if __name__ == "__main__":
     args = setupArgparser()
     print(f"Iniciando a exportação do produto {args.tipo} de json {args.json}")
-    qgs = QgsApplication([], True, profileFolder="default")
-    qgs.initQgis()
-    p = Path(args.pathQgis)
-    prefixPath = p / "apps/qgis"
-    qgs.setPrefixPath(str(prefixPath), True)
-    pluginsFolder = Path(
-        "~\\AppData\\Roaming\\QGIS\\QGIS3\\profiles\\default\\python\\plugins"
-    ).expanduser()
-    qgs.setPluginPath(str(pluginsFolder))
-    sys.path.append(str(p / "apps/qgis/python/plugins"))
-    sys.path.append(str(pluginsFolder))
-
-    # para funcionar tem que ser nesse escopo, nao pode encapsular numa funcao
-    from ferramentas_edicao.modules.expressionFunctions.functions.createCustomGridNumbers import (
-        longNumber,
-        shortNumber,
-    )
-    from processing.core.Processing import Processing
-    from ferramentas_edicao.modules.processings.provider import Provider
-    from DsgTools.core.DSGToolsProcessingAlgs.dsgtoolsProcessingAlgorithmProvider import (
-        DSGToolsProcessingAlgorithmProvider,
-    )
-
-    Processing.initialize()
-    feProvider = Provider()
-    QgsApplication.processingRegistry().addProvider(feProvider)
-    dsgtoolsProvider = DSGToolsProcessingAlgorithmProvider()
-    QgsApplication.processingRegistry().addProvider(dsgtoolsProvider)
-    QgsExpression.registerFunction(longNumber)
-    QgsExpression.registerFunction(shortNumber)
-
+    if args.workers > 1 and len(args.json) > 1:
+        productStatus = exportMapsInParallel(args)
+        nExported = sum(1 for record in productStatus if record["success"])
+        print(f"{nExported} de {len(productStatus)} produtos exportados com sucesso.")
+        sys.exit(0 if nExported == len(productStatus) else 1)
+    # as referências retornadas precisam existir até o fim da exportação
+    qgisHandles = startQgis(args)
     startNetwork(args)
     exportMaps(args)
-    qgs.exitQgis()
+    qgisHandles["qgs"].exitQgis()